@@ -18,9 +18,15 @@
 Currently only utilised to build the docs
 """
 
+import typing
+
 import click
 
+from ._cli import benchmark as _benchmark
 from ._cli import propagate as _propagate
+from .data import download as _download
+
+_EXAMPLE_NAMES = list(typing.get_args(_download.ExampleName))
 
 
 @click.group()
@@ -38,5 +44,66 @@ def propagate():
     _propagate.run()
 
 
+@cli.command()
+@click.option(
+    "--example",
+    "examples",
+    type=click.Choice(_EXAMPLE_NAMES),
+    multiple=True,
+    help="Only create the manifest of this example, may be repeated.",
+)
+def manifests(examples: tuple[str, ...]):
+    """Create the pinned manifest of each example dataset
+
+    Each example is downloaded afresh, and the SHA-256 of each of its
+    files recorded under `rai/data/manifests`, to be committed. Needs to
+    be rerun whenever the commit of an example is changed.
+    """
+
+    for example in examples or _EXAMPLE_NAMES:
+        path = _download.write_example_manifest(example)  # type: ignore
+        click.echo(f"{example:<10} {path}")
+
+
+@cli.command()
+@click.option(
+    "--filter",
+    "name_filter",
+    default="",
+    help="Only run the benchmarks which have this within their name.",
+)
+@click.option(
+    "--update-baseline",
+    is_flag=True,
+    help="Store the results as the baseline to compare future runs against.",
+)
+def benchmark(name_filter: str, update_baseline: bool):
+    """Benchmark the mask conversion round trip
+
+    Results are recorded under `records/benchmarks/python`, and the
+    command fails if any are worse than the stored baseline. The full
+    suite takes a considerable time, as the supersampled rasterisation
+    of large structures at high expansions is expensive. Use `--filter`
+    to run a subset.
+
+    The baseline is only compared against when run on the same platform,
+    with the same versions of Python and NumPy, as it was recorded
+    with. It needs to be re-recorded on each machine with
+    `--update-baseline`.
+    """
+
+    summary = _benchmark.run(name_filter=name_filter, update_baseline=update_baseline)
+
+    if summary.failures:
+        raise click.ClickException(
+            f"{len(summary.failures)} benchmark(s) failed to complete"
+        )
+
+    if summary.regressions and not update_baseline:
+        raise click.ClickException(
+            f"{len(summary.regressions)} benchmark regression(s) were found"
+        )
+
+
 if __name__ == "__main__":
     cli()
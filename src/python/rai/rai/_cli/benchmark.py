@@ -0,0 +1,519 @@
+# RAi, machine learning solutions in radiotherapy
+# Copyright (C) 2021-2022 Radiotherapy AI Holdings Pty Ltd
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+"""Benchmarks of the mask conversion round trip
+
+Each case is run within its own freshly spawned process so that the
+peak resident set size of one case is not inherited by the next.
+
+Timings and memory usage are only comparable on the same machine, with
+the same versions of Python and NumPy. The baseline records the
+environment that it was run within, and results are only compared
+against it when run within that same environment. Otherwise the
+baseline needs to be re-recorded on the machine in question with
+``--update-baseline``. As such, the baseline and results are kept local
+to each machine, and are not committed.
+"""
+
+import concurrent.futures
+import concurrent.futures.process
+import itertools
+import json
+import multiprocessing
+import pathlib
+import platform
+import sys
+import time
+import tracemalloc
+from typing import Callable, Iterator, Literal, NamedTuple, Optional
+
+import click
+import numpy as np
+
+from rai._paths import BENCHMARK_RECORDS_DIR
+from rai.mask.convert import (
+    Contours,
+    Grid,
+    RasteriseMethod,
+    contours_to_mask,
+    mask_to_contours,
+)
+
+Operation = Literal["contours_to_mask", "mask_to_contours"]
+
+RESULTS_PATH = BENCHMARK_RECORDS_DIR / "convert.json"
+BASELINE_PATH = BENCHMARK_RECORDS_DIR / "convert_baseline.json"
+
+# A typical CT field of view, in mm
+FIELD_OF_VIEW = 500.0
+
+SLICE_SIZES = (256, 512, 1024)
+EXPANSIONS = (4, 8, 16)
+
+# The (y, x) semi-axes, in mm, of an ellipse approximating each
+# structure on a single axial slice.
+STRUCTURES = {
+    "lens": (4.5, 5.0),
+    "parotid": (20.0, 15.0),
+    "lung": (125.0, 75.0),
+}
+
+# Relative increases beyond which a metric is considered to have
+# regressed.
+TIME_TOLERANCE = 0.25
+MEMORY_TOLERANCE = 0.1
+
+# Timings shorter than this are dominated by noise, and so are not
+# flagged as regressions.
+MINIMUM_TIME = 0.001
+
+METRICS = ("wall_time", "peak_rss", "allocated")
+
+BASELINE_NOTE = (
+    "Only comparable to results run on the same platform, with the same "
+    "versions of Python and NumPy. Re-record it per machine with "
+    "`python -m rai benchmark --update-baseline`."
+)
+
+
+class Environment(NamedTuple):
+    """The machine and versions that results were run within."""
+
+    platform: str
+    python: str
+    numpy: str
+
+    @classmethod
+    def current(cls) -> "Environment":
+        """The environment of the running process."""
+
+        return cls(
+            platform=platform.platform(),
+            python=platform.python_version(),
+            numpy=np.__version__,
+        )
+
+
+class Case(NamedTuple):
+    """A single benchmark within the suite."""
+
+    operation: Operation
+    size: int
+    structure: str
+    method: RasteriseMethod = "supersample"
+    expansion: Optional[int] = None
+
+    @property
+    def name(self):
+        """A unique, human readable, identifier of the case."""
+
+        items = [self.operation, str(self.size), self.structure]
+        if self.operation == "contours_to_mask":
+            items.append(self.method)
+            if self.method == "supersample":
+                items.append(f"e{self.expansion}")
+
+        return "/".join(items)
+
+
+class Result(NamedTuple):
+    """The measurements of a single case.
+
+    Attributes
+    ----------
+    wall_time : float
+        The fastest wall time of the repeated runs, in seconds.
+    runs : int
+        The number of timed runs.
+    peak_rss : float
+        The peak resident set size of the process running the case, in
+        MiB. Only comparable between results that were run in their own
+        process.
+    allocated : float
+        The peak memory allocated while running the case, as traced by
+        `tracemalloc`, in MiB.
+    """
+
+    wall_time: float
+    runs: int
+    peak_rss: float
+    allocated: float
+
+
+class Summary(NamedTuple):
+    """The outcome of running the benchmark suite.
+
+    Attributes
+    ----------
+    regressions : list[Regression]
+        The metrics that are worse than the baseline.
+    failures : list[str]
+        The names of the cases whose process was terminated before
+        completing, such as by running out of memory.
+    """
+
+    regressions: list["Regression"]
+    failures: list[str]
+
+
+class Regression(NamedTuple):
+    """A metric of a case that has increased beyond its tolerance."""
+
+    name: str
+    metric: str
+    baseline: float
+    current: float
+
+
+def run(name_filter: str = "", update_baseline: bool = False) -> Summary:
+    """Run the benchmark suite, record its results, and compare them to
+    the stored baseline.
+
+    Parameters
+    ----------
+    name_filter : str, optional
+        Only run the cases which have this within their name.
+    update_baseline : bool, optional
+        Store the results as the new baseline for the cases that were
+        run.
+
+    Returns
+    -------
+    Summary
+        The regressions against the baseline, and the cases that failed
+        to complete.
+    """
+
+    cases = [case for case in get_cases() if name_filter in case.name]
+    baseline_environment, baseline = _read_results(BASELINE_PATH)
+
+    environment = Environment.current()
+    comparable = baseline_environment == environment
+    if baseline and not comparable:
+        click.echo(
+            "The baseline was recorded on another platform, or with other "
+            "versions of Python or NumPy, so it is not compared against. "
+            "Re-record the baseline on this machine with --update-baseline.",
+            err=True,
+        )
+        baseline = {}
+
+    results: dict[str, Result] = {}
+    regressions: list[Regression] = []
+    failures: list[str] = []
+    for name, result in iter_results(cases):
+        if result is None:
+            failures.append(name)
+            click.echo(
+                f"{name:<50} failed, its process was terminated before completing",
+                err=True,
+            )
+            continue
+
+        results[name] = result
+        click.echo(
+            f"{name:<50} {result.wall_time:>10.4f} s "
+            f"{result.peak_rss:>8.1f} MiB RSS {result.allocated:>8.1f} MiB allocated"
+        )
+
+        for regression in compare_to_baseline({name: result}, baseline):
+            regressions.append(regression)
+            click.echo(
+                f"Regression in {regression.name} {regression.metric}: "
+                f"{regression.baseline:.4g} -> {regression.current:.4g}",
+                err=True,
+            )
+
+    _write_results(RESULTS_PATH, results)
+
+    if update_baseline:
+        # A baseline from another environment is replaced, rather than
+        # merged, so that it never mixes results from different machines
+        _write_results(BASELINE_PATH, {**baseline, **results}, note=BASELINE_NOTE)
+
+    return Summary(regressions=regressions, failures=failures)
+
+
+def get_cases() -> list[Case]:
+    """The full benchmark suite."""
+
+    cases: list[Case] = []
+    for size, structure in itertools.product(SLICE_SIZES, STRUCTURES):
+        for expansion in EXPANSIONS:
+            cases.append(
+                Case("contours_to_mask", size, structure, "supersample", expansion)
+            )
+
+        cases.append(Case("contours_to_mask", size, structure, "exact"))
+        cases.append(Case("mask_to_contours", size, structure))
+
+    return cases
+
+
+def run_cases(cases: list[Case], isolate: bool = True) -> dict[str, Optional[Result]]:
+    """Run each case, by default within its own spawned process."""
+
+    return dict(iter_results(cases, isolate=isolate))
+
+
+def iter_results(
+    cases: list[Case], isolate: bool = True
+) -> Iterator[tuple[str, Optional[Result]]]:
+    """Run each case, yielding its name and result as soon as it
+    completes.
+
+    The largest supersampled cases take minutes each, so results are
+    made available as they arrive rather than at the end of the suite.
+    When isolated, a case whose process is terminated, such as by the
+    out of memory killer, yields a result of None instead of stopping
+    the suite.
+    """
+
+    if not isolate:
+        for case in cases:
+            yield case.name, run_case(case)
+
+        return
+
+    context = multiprocessing.get_context("spawn")
+    for case in cases:
+        with concurrent.futures.ProcessPoolExecutor(
+            max_workers=1, mp_context=context
+        ) as executor:
+            try:
+                result = executor.submit(run_case, case).result()
+            except concurrent.futures.process.BrokenProcessPool:
+                result = None
+
+        yield case.name, result
+
+
+def run_case(case: Case, repeats: int = 5, min_time: float = 1.0) -> Result:
+    """Time and profile the memory of a single case.
+
+    The case is run until either ``repeats`` runs have been undergone or
+    ``min_time`` seconds have elapsed, whichever comes first, with at
+    least one timed run. A further run is then undergone with
+    `tracemalloc` enabled, as tracing slows down allocation.
+    """
+
+    x_grid, y_grid = _get_grids(case.size)
+    contours = _get_contours(case.structure, case.size)
+    func = _get_func(case, x_grid, y_grid, contours)
+
+    times: list[float] = []
+    while len(times) < repeats and sum(times) < min_time:
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+
+    peak_rss = _get_peak_rss()
+
+    tracemalloc.start()
+    try:
+        func()
+        _, allocated = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return Result(
+        wall_time=min(times),
+        runs=len(times),
+        peak_rss=peak_rss,
+        allocated=allocated / 2**20,
+    )
+
+
+def compare_to_baseline(
+    results: dict[str, Result],
+    baseline: dict[str, Result],
+    time_tolerance: float = TIME_TOLERANCE,
+    memory_tolerance: float = MEMORY_TOLERANCE,
+) -> list[Regression]:
+    """Find the metrics that have increased beyond their tolerance.
+
+    Cases that are not within the baseline are ignored. Both need to
+    have been run within the same `Environment`, which `run` checks.
+    """
+
+    tolerances = {
+        "wall_time": time_tolerance,
+        "peak_rss": memory_tolerance,
+        "allocated": memory_tolerance,
+    }
+
+    regressions: list[Regression] = []
+    for name, result in results.items():
+        try:
+            baseline_result = baseline[name]
+        except KeyError:
+            continue
+
+        for metric in METRICS:
+            current = getattr(result, metric)
+            previous = getattr(baseline_result, metric)
+
+            if metric == "wall_time" and current < MINIMUM_TIME:
+                continue
+
+            if current > previous * (1 + tolerances[metric]):
+                regressions.append(Regression(name, metric, previous, current))
+
+    return regressions
+
+
+def _get_func(
+    case: Case, x_grid: Grid, y_grid: Grid, contours: Contours
+) -> Callable[[], object]:
+    if case.operation == "contours_to_mask":
+        expansion = 16 if case.expansion is None else case.expansion
+
+        return lambda: contours_to_mask(
+            x_grid, y_grid, contours, expansion=expansion, method=case.method
+        )
+
+    # The exact method is utilised to create the mask so that its
+    # creation does not dominate the peak RSS of the case.
+    mask = contours_to_mask(x_grid, y_grid, contours, method="exact")
+
+    return lambda: mask_to_contours(x_grid, y_grid, mask)
+
+
+def _get_grids(size: int):
+    spacing = FIELD_OF_VIEW / size
+    grid = -FIELD_OF_VIEW / 2 + spacing / 2 + spacing * np.arange(size)
+
+    return grid, grid.copy()
+
+
+def _get_contours(structure: str, size: int) -> Contours:
+    """A lobulated ellipse, with its vertices approximately one pixel
+    apart, mimicking a contour drawn within a planning system."""
+
+    semi_y, semi_x = STRUCTURES[structure]
+    spacing = FIELD_OF_VIEW / size
+
+    perimeter = 2 * np.pi * np.sqrt((semi_y**2 + semi_x**2) / 2)
+    num_vertices = max(int(perimeter / spacing), 16)
+
+    theta = np.linspace(0, 2 * np.pi, num_vertices + 1)
+    radius = 1 + 0.05 * np.sin(7 * theta)
+
+    # Offset from the centre so that the structure does not align with
+    # the pixel boundaries.
+    y = semi_y * radius * np.sin(theta) + 10.3
+    x = semi_x * radius * np.cos(theta) - 20.7
+
+    return [np.stack([y, x], axis=-1)]
+
+
+def _get_peak_rss() -> float:
+    """The peak resident set size of the current process, in MiB."""
+
+    if sys.platform == "win32":
+        return _get_peak_working_set() / 2**20
+
+    # Not available on Windows
+    import resource  # pylint: disable = import-outside-toplevel
+
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    # macOS reports in bytes, Linux in KiB
+    if sys.platform == "darwin":
+        return max_rss / 2**20
+
+    return max_rss / 2**10
+
+
+def _get_peak_working_set() -> int:
+    """The Windows equivalent of the peak resident set size, in bytes."""
+
+    # pylint: disable = import-outside-toplevel
+    import ctypes
+    import ctypes.wintypes
+
+    # pylint: disable = too-few-public-methods
+    class _ProcessMemoryCounters(ctypes.Structure):
+        _fields_ = [
+            ("cb", ctypes.wintypes.DWORD),
+            ("PageFaultCount", ctypes.wintypes.DWORD),
+            ("PeakWorkingSetSize", ctypes.c_size_t),
+            ("WorkingSetSize", ctypes.c_size_t),
+            ("QuotaPeakPagedPoolUsage", ctypes.c_size_t),
+            ("QuotaPagedPoolUsage", ctypes.c_size_t),
+            ("QuotaPeakNonPagedPoolUsage", ctypes.c_size_t),
+            ("QuotaNonPagedPoolUsage", ctypes.c_size_t),
+            ("PagefileUsage", ctypes.c_size_t),
+            ("PeakPagefileUsage", ctypes.c_size_t),
+        ]
+
+    counters = _ProcessMemoryCounters(cb=ctypes.sizeof(_ProcessMemoryCounters))
+
+    # Private instances, so that the declared types do not leak into the
+    # shared ctypes.windll
+    win_dll = ctypes.WinDLL  # pyright: ignore [reportGeneralTypeIssues]
+    kernel32 = win_dll("kernel32", use_last_error=True)
+    psapi = win_dll("psapi", use_last_error=True)
+
+    kernel32.GetCurrentProcess.restype = ctypes.wintypes.HANDLE
+    psapi.GetProcessMemoryInfo.restype = ctypes.wintypes.BOOL
+    psapi.GetProcessMemoryInfo.argtypes = [
+        ctypes.wintypes.HANDLE,
+        ctypes.POINTER(_ProcessMemoryCounters),
+        ctypes.wintypes.DWORD,
+    ]
+
+    if not psapi.GetProcessMemoryInfo(
+        kernel32.GetCurrentProcess(), ctypes.byref(counters), counters.cb
+    ):
+        raise ctypes.WinError(  # pyright: ignore [reportGeneralTypeIssues]
+            ctypes.get_last_error()  # pyright: ignore [reportGeneralTypeIssues]
+        )
+
+    return counters.PeakWorkingSetSize
+
+
+def _write_results(
+    path: pathlib.Path, results: dict[str, Result], note: Optional[str] = None
+):
+    path.parent.mkdir(parents=True, exist_ok=True)
+
+    contents: dict[str, object] = {} if note is None else {"note": note}
+    contents.update(Environment.current()._asdict())
+    contents["results"] = {
+        name: result._asdict() for name, result in sorted(results.items())
+    }
+
+    with open(path, "w", encoding="utf8") as f:
+        json.dump(contents, f, indent=2)
+        f.write("\n")
+
+
+def _read_results(
+    path: pathlib.Path,
+) -> tuple[Optional[Environment], dict[str, Result]]:
+    try:
+        with open(path, encoding="utf8") as f:
+            contents = json.load(f)
+    except FileNotFoundError:
+        return None, {}
+
+    environment = Environment(
+        **{field: contents.get(field, "") for field in Environment._fields}
+    )
+    results = {name: Result(**result) for name, result in contents["results"].items()}
+
+    return environment, results
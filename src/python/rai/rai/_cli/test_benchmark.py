@@ -0,0 +1,98 @@
+# RAi, machine learning solutions in radiotherapy
+# Copyright (C) 2021-2022 Radiotherapy AI Holdings Pty Ltd
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+"""Test the mask conversion benchmarks"""
+
+import json
+import pathlib
+
+import pytest
+
+from . import benchmark
+from .benchmark import Case, Result, compare_to_baseline, get_cases, run_cases
+
+
+def test_benchmark_regressions():
+    """Run the smallest cases and confirm that only metrics beyond their
+    tolerance are flagged as regressions"""
+
+    cases = [
+        Case("contours_to_mask", 256, "lens", "supersample", 4),
+        Case("contours_to_mask", 256, "lens", "exact"),
+        Case("mask_to_contours", 256, "lens"),
+    ]
+    assert {case.name for case in cases} <= {case.name for case in get_cases()}
+
+    results = run_cases(cases, isolate=False)
+    assert set(results) == {case.name for case in cases}
+
+    for result in results.values():
+        assert result is not None
+        assert result.runs >= 1
+        assert result.peak_rss > 0
+
+    completed = {name: result for name, result in results.items() if result}
+    assert not compare_to_baseline(completed, completed)
+    assert not compare_to_baseline(completed, {})
+
+    current = {"case": Result(wall_time=1.2, runs=1, peak_rss=100, allocated=10)}
+    baseline = {"case": Result(wall_time=1.0, runs=1, peak_rss=100, allocated=5)}
+
+    regressions = compare_to_baseline(current, baseline)
+    assert [regression.metric for regression in regressions] == ["allocated"]
+
+
+def test_baseline_environment(
+    tmp_path: pathlib.Path,
+    monkeypatch: pytest.MonkeyPatch,
+    capsys: pytest.CaptureFixture[str],
+):
+    """Test that results are only compared against a baseline that was
+    recorded within the same environment"""
+
+    baseline_path = tmp_path / "baseline.json"
+    monkeypatch.setattr(benchmark, "RESULTS_PATH", tmp_path / "results.json")
+    monkeypatch.setattr(benchmark, "BASELINE_PATH", baseline_path)
+
+    name_filter = "mask_to_contours/256/lens"
+    # Timings are too noisy to rely upon, so only memory regresses
+    impossible = Result(wall_time=1e9, runs=1, peak_rss=0, allocated=0)
+
+    for environment, expected_metrics in (
+        (benchmark.Environment.current(), {"peak_rss", "allocated"}),
+        (benchmark.Environment("another", "3.0.0", "1.0.0"), set()),
+    ):
+        contents = {
+            **environment._asdict(),
+            "results": {name_filter: impossible._asdict()},
+        }
+        baseline_path.write_text(json.dumps(contents), encoding="utf8")
+
+        summary = benchmark.run(name_filter=name_filter)
+        assert not summary.failures
+
+        metrics = {regression.metric for regression in summary.regressions}
+        assert metrics == expected_metrics
+
+    assert "Re-record the baseline" in capsys.readouterr().err
+
+    benchmark.run(name_filter=name_filter, update_baseline=True)
+    with open(baseline_path, encoding="utf8") as f:
+        updated = json.load(f)
+
+    assert updated["note"] == benchmark.BASELINE_NOTE
+    assert updated["platform"] == benchmark.Environment.current().platform
+    assert updated["results"][name_filter]["peak_rss"] > 0
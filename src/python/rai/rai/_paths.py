@@ -36,3 +36,4 @@ RAI_DIR = PYTHON_PACKAGES_DIR / "rai"
 RAICONTOURS_DIR = PYTHON_PACKAGES_DIR / "raicontours"
 
 TEST_RECORDS_DIR = REPO_ROOT / "records" / "tests" / "python"
+BENCHMARK_RECORDS_DIR = REPO_ROOT / "records" / "benchmarks" / "python"
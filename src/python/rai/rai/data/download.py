@@ -14,16 +14,58 @@
 # You should have received a copy of the GNU Affero General Public License
 # along with this program.  If not, see <https://www.gnu.org/licenses/>.
 
-"""Example data download utilities"""
-
-import multiprocessing
+"""Example data download utilities
+
+Files are downloaded across a bounded thread pool, with each thread
+keeping one keep-alive HTTP connection open per host. Each file is
+first written to a ``.part`` file alongside it, which is resumed with an
+HTTP Range request should the download be interrupted, and only renamed
+to its final path once complete. A file that exists at its final path
+has therefore always been completely downloaded. Each download holds an
+exclusive lock on a ``.lock`` file alongside it, so that several
+processes downloading the same file never write to the same ``.part``
+file at once.
+
+Where a manifest of the dataset's hashes exists, each file is also
+verified against it, and kept within the content-addressed
+`rai.data.store.Store`. The manifest of each example is pinned to its
+commit, and is created by `write_example_manifest`, such as via
+``python -m rai manifests``.
+"""
+
+import concurrent.futures
+import contextlib
+import http.client
+import os
 import pathlib
+import re
+import sys
+import tempfile
+import threading
+import urllib.error
 import urllib.parse
-import urllib.request
-from typing import List, NamedTuple, Union
+from typing import Dict, Iterator, List, Literal, NamedTuple, Optional, Tuple, Union
 
 from rai._paths import RAI_DATA
 
+from .store import Manifest, Store, read_manifest, write_manifest
+
+if sys.platform == "win32":
+    import msvcrt  # pylint: disable = import-error
+else:
+    import fcntl
+
+DEFAULT_MAX_WORKERS = 8
+MAX_REDIRECTS = 5
+MAX_ATTEMPTS = 3
+CHUNK_SIZE = 2**20
+TIMEOUT = 60
+
+_REDIRECT_STATUSES = {301, 302, 303, 307, 308}
+_CONTENT_RANGE = re.compile(r"bytes (\d+)-\d+/(?:\d+|\*)")
+
+ExampleName = Literal["lctsc", "hnscc", "deepmind"]
+
 
 class DownloadedExamplePaths(NamedTuple):
     """The paths returned by each of the example download functions."""
@@ -35,6 +77,47 @@ class DownloadedExamplePaths(NamedTuple):
     rai_license_path: pathlib.Path
 
 
+class _GitHubExample(NamedTuple):
+    """An example dataset, as stored within a GitHub repository."""
+
+    repo: str
+    commit_hash: str
+    study_path: str
+    relative_structure_path: str
+    relative_image_paths: List[str]
+    license_filename: str
+    readme_filename: str
+
+
+_LCTSC = _GitHubExample(
+    repo="RadiotherapyAI/data-tcia-lctsc",
+    commit_hash="641f0a5d17e62e7a5fa63452d62aaeb22b91fc22",
+    study_path="LCTSC-Test-S3-102/11-08-2004-LEFT%20LUNG-11520",
+    relative_structure_path="1.000000-.simplified-02503/1-1.dcm",
+    relative_image_paths=[f"1.000000-95635/1-{item:03d}.dcm" for item in range(1, 211)],
+    license_filename="LICENSE",
+    readme_filename="README.md",
+)
+_HNSCC = _GitHubExample(
+    repo="RadiotherapyAI/data-tcia-hnscc-part-3",
+    commit_hash="9a78da8ff52d60bed629b55f1076338005732480",
+    study_path="HNSCC-01-0201/10-21-2002-RT%20SIMULATION-79781",
+    relative_structure_path="1.000000-91247/1-1.dcm",
+    relative_image_paths=[f"2.000000-47027/1-{item:03d}.dcm" for item in range(1, 177)],
+    license_filename="license.html",
+    readme_filename="README.md",
+)
+_DEEPMIND = _GitHubExample(
+    repo="RadiotherapyAI/data-tcia-deepmind",
+    commit_hash="61fd2525f9880c8b201758f43c773e515572be92",
+    study_path="0522c0659",
+    relative_structure_path="RS.dcm",
+    relative_image_paths=[f"CT-{item:03d}.dcm" for item in range(165)],
+    license_filename="LICENSE",
+    readme_filename="README.md",
+)
+
+
 def lctsc_example(
     data_dir: Union[str, pathlib.Path] = RAI_DATA / "LCTSC"
 ) -> DownloadedExamplePaths:
@@ -57,30 +140,7 @@ def lctsc_example(
     rai_license_path: pathlib.Path
 
     """
-    data_dir = pathlib.Path(data_dir)
-
-    repo = "RadiotherapyAI/data-tcia-lctsc"
-    commit_hash = "641f0a5d17e62e7a5fa63452d62aaeb22b91fc22"
-    study_path = "LCTSC-Test-S3-102/11-08-2004-LEFT%20LUNG-11520"
-
-    relative_structure_path = "1.000000-.simplified-02503/1-1.dcm"
-    relative_image_paths = [
-        f"1.000000-95635/1-{item:03d}.dcm" for item in range(1, 211)
-    ]
-
-    license_filename = "LICENSE"
-    readme_filename = "README.md"
-
-    return _github_images_and_structure_download(
-        data_dir,
-        repo,
-        commit_hash,
-        study_path,
-        relative_structure_path,
-        relative_image_paths,
-        license_filename,
-        readme_filename,
-    )
+    return _download_example(_LCTSC, pathlib.Path(data_dir))
 
 
 def hnscc_example(
@@ -104,30 +164,7 @@ def hnscc_example(
     rai_license_path: pathlib.Path
 
     """
-    data_dir = pathlib.Path(data_dir)
-
-    repo = "RadiotherapyAI/data-tcia-hnscc-part-3"
-    commit_hash = "9a78da8ff52d60bed629b55f1076338005732480"
-    study_path = "HNSCC-01-0201/10-21-2002-RT%20SIMULATION-79781"
-
-    relative_structure_path = "1.000000-91247/1-1.dcm"
-    relative_image_paths = [
-        f"2.000000-47027/1-{item:03d}.dcm" for item in range(1, 177)
-    ]
-
-    license_filename = "license.html"
-    readme_filename = "README.md"
-
-    return _github_images_and_structure_download(
-        data_dir,
-        repo,
-        commit_hash,
-        study_path,
-        relative_structure_path,
-        relative_image_paths,
-        license_filename,
-        readme_filename,
-    )
+    return _download_example(_HNSCC, pathlib.Path(data_dir))
 
 
 def deepmind_example(
@@ -151,56 +188,212 @@ def deepmind_example(
     rai_license_path: pathlib.Path
 
     """
-    data_dir = pathlib.Path(data_dir)
-
-    repo = "RadiotherapyAI/data-tcia-deepmind"
-    commit_hash = "61fd2525f9880c8b201758f43c773e515572be92"
-    study_path = "0522c0659"
-
-    relative_structure_path = "RS.dcm"
-    relative_image_paths = [f"CT-{item:03d}.dcm" for item in range(165)]
-
-    license_filename = "LICENSE"
-    readme_filename = "README.md"
-
-    return _github_images_and_structure_download(
-        data_dir,
-        repo,
-        commit_hash,
-        study_path,
-        relative_structure_path,
-        relative_image_paths,
-        license_filename,
-        readme_filename,
-    )
+    return _download_example(_DEEPMIND, pathlib.Path(data_dir))
+
+
+def iter_example_images(
+    example: ExampleName, data_dir: Optional[Union[str, pathlib.Path]] = None
+) -> Iterator[pathlib.Path]:
+    """Download an example dataset, yielding the path of each image as
+    soon as it has been downloaded.
+
+    Images are yielded in the order that their downloads complete, with
+    those already downloaded yielded first, so that reading them is able
+    to overlap with the remaining downloads. The structure set, license
+    and README are downloaded alongside the images, so that once
+    exhausted the matching example function, such as `lctsc_example`,
+    returns every path without downloading anything further.
+
+    >>> for path in iter_example_images("lctsc"):  # doctest: +SKIP
+    ...     headers.append(pydicom.dcmread(path, stop_before_pixels=True))
+
+    Parameters
+    ----------
+    example : {"lctsc", "hnscc", "deepmind"}
+        The example dataset to download.
+    data_dir : Union[str, pathlib.Path], optional
+        The directory used for downloading the data, by default the same
+        as that of the matching example function.
+
+    Yields
+    ------
+    pathlib.Path
+        The path of each downloaded image.
+    """
+
+    github_example, default_data_dir = _EXAMPLES[example]
+    if data_dir is None:
+        data_dir = default_data_dir
+
+    plan = _plan_download(github_example, pathlib.Path(data_dir))
+    image_paths = set(plan.example_paths.image_paths)
+
+    for path in iter_download_all(plan.urls, plan.paths, hashes=plan.hashes):
+        if path in image_paths:
+            yield path
 
 
-def _github_images_and_structure_download(
-    data_dir: pathlib.Path,
-    repo: str,
-    commit_hash: str,
-    study_path: str,
-    relative_structure_path: str,
-    relative_image_paths: List[str],
-    license_filename: str,
-    readme_filename: str,
+def write_example_manifest(example: ExampleName) -> pathlib.Path:
+    """Record the SHA-256 of every file of an example dataset, as the
+    manifest pinned to its commit.
+
+    The example is downloaded, without verification, into an empty
+    temporary directory, so that only the files at its commit are
+    hashed. Needs to be run, and the manifest committed, whenever the
+    commit of an example is changed.
+
+    Parameters
+    ----------
+    example : {"lctsc", "hnscc", "deepmind"}
+        The example dataset to create the manifest of.
+
+    Returns
+    -------
+    pathlib.Path
+        The path of the written manifest.
+    """
+
+    github_example, _ = _EXAMPLES[example]
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        data_dir = pathlib.Path(temp_dir)
+        plan = _plan_download(github_example, data_dir)
+
+        # Such as the rai LICENSE, which is not within the dataset
+        urls, paths = zip(
+            *(
+                (url, path)
+                for url, path in zip(plan.urls, plan.paths)
+                if data_dir in path.parents
+            )
+        )
+        download_all(list(urls), list(paths))
+
+        return write_manifest(github_example.repo, github_example.commit_hash, data_dir)
+
+
+def download_all(
+    urls_to_download: List[str],
+    paths_to_save_to: List[pathlib.Path],
+    hashes: Optional[List[Optional[str]]] = None,
+    max_workers: int = DEFAULT_MAX_WORKERS,
+    store: Optional[Store] = None,
 ):
-    repo_url = f"https://github.com/{repo}"
+    """Download several files across a bounded thread pool.
+
+    Files that already exist are not downloaded again, unless they fail
+    verification against their hash.
+
+    Parameters
+    ----------
+    urls_to_download : List[str]
+        The URL of each file.
+    paths_to_save_to : List[pathlib.Path]
+        The path that each file is saved to.
+    hashes : List[Optional[str]], optional
+        The SHA-256 of each file, or None for those that are not to be
+        verified.
+    max_workers : int, optional
+        The number of files downloaded at once.
+    store : rai.data.store.Store, optional
+        The store that verified files are kept within, by default
+        ``~/.rai/data``. Only utilised when hashes are provided.
+    """
+
+    for _ in iter_download_all(
+        urls_to_download,
+        paths_to_save_to,
+        hashes=hashes,
+        max_workers=max_workers,
+        store=store,
+    ):
+        pass
+
+
+def iter_download_all(
+    urls_to_download: List[str],
+    paths_to_save_to: List[pathlib.Path],
+    hashes: Optional[List[Optional[str]]] = None,
+    max_workers: int = DEFAULT_MAX_WORKERS,
+    store: Optional[Store] = None,
+) -> Iterator[pathlib.Path]:
+    """As for `download_all`, yielding each path as soon as its file is
+    in place.
+
+    Should iteration be stopped early, downloads that have not yet
+    started are cancelled, and those in progress are finished.
+
+    Yields
+    ------
+    pathlib.Path
+        The path of each file, in the order that they complete.
+    """
+
+    if hashes is None:
+        hashes = [None] * len(urls_to_download)
 
-    download_url_root = f"{repo_url}/raw/{commit_hash}"
-    license_url = f"{download_url_root}/{license_filename}"
-    readme_url = f"{download_url_root}/{readme_filename}"
-    data_license_path = data_dir / license_filename
-    data_readme_path = data_dir / readme_filename
+    if store is None and any(hashes):
+        store = Store()
 
-    study_url_root = f"{download_url_root}/{study_path}"
-    resolved_study_path = data_dir / urllib.parse.unquote(study_path)
+    connections = _ConnectionPool()
+    executor = concurrent.futures.ThreadPoolExecutor(max_workers=max_workers)
+    try:
+        futures = {
+            executor.submit(
+                _fetch, url, path, sha256, connections=connections, store=store
+            ): path
+            for url, path, sha256 in zip(urls_to_download, paths_to_save_to, hashes)
+        }
 
-    structure_url = f"{study_url_root}/{relative_structure_path}"
-    structure_path = resolved_study_path / relative_structure_path
+        for future in concurrent.futures.as_completed(futures):
+            # Propagates any raised errors
+            future.result()
+            yield futures[future]
+    finally:
+        executor.shutdown(wait=True, cancel_futures=True)
+        connections.close()
+        if store is not None:
+            store.save()
 
-    image_urls = [f"{study_url_root}/{path}" for path in relative_image_paths]
-    image_paths = [resolved_study_path / path for path in relative_image_paths]
+
+class _DownloadPlan(NamedTuple):
+    urls: List[str]
+    paths: List[pathlib.Path]
+    hashes: Optional[List[Optional[str]]]
+    example_paths: DownloadedExamplePaths
+
+
+_EXAMPLES: Dict[str, Tuple[_GitHubExample, pathlib.Path]] = {
+    "lctsc": (_LCTSC, RAI_DATA / "LCTSC"),
+    "hnscc": (_HNSCC, RAI_DATA / "HNSCC"),
+    "deepmind": (_DEEPMIND, RAI_DATA / "deepmind"),
+}
+
+
+def _download_example(example: _GitHubExample, data_dir: pathlib.Path):
+    plan = _plan_download(example, data_dir)
+    download_all(plan.urls, plan.paths, hashes=plan.hashes)
+
+    return plan.example_paths
+
+
+def _plan_download(example: _GitHubExample, data_dir: pathlib.Path) -> _DownloadPlan:
+    repo_url = f"https://github.com/{example.repo}"
+
+    download_url_root = f"{repo_url}/raw/{example.commit_hash}"
+    license_url = f"{download_url_root}/{example.license_filename}"
+    readme_url = f"{download_url_root}/{example.readme_filename}"
+    data_license_path = data_dir / example.license_filename
+    data_readme_path = data_dir / example.readme_filename
+
+    study_url_root = f"{download_url_root}/{example.study_path}"
+    resolved_study_path = data_dir / urllib.parse.unquote(example.study_path)
+
+    structure_url = f"{study_url_root}/{example.relative_structure_path}"
+    structure_path = resolved_study_path / example.relative_structure_path
+
+    image_urls = [f"{study_url_root}/{path}" for path in example.relative_image_paths]
+    image_paths = [resolved_study_path / path for path in example.relative_image_paths]
 
     rai_license_path = RAI_DATA / "LICENSE"
     rai_license_url = (
@@ -220,34 +413,261 @@ def _github_images_and_structure_download(
         rai_license_path,
     ] + image_paths
 
-    _multiprocess_download(urls_to_download, paths_to_save_to)
+    manifest = read_manifest(example.repo, example.commit_hash)
+    hashes = (
+        None
+        if manifest is None
+        else _manifest_hashes(manifest, data_dir, paths_to_save_to)
+    )
 
-    return DownloadedExamplePaths(
-        image_paths,
-        structure_path,
-        data_license_path,
-        data_readme_path,
-        rai_license_path,
+    return _DownloadPlan(
+        urls=urls_to_download,
+        paths=paths_to_save_to,
+        hashes=hashes,
+        example_paths=DownloadedExamplePaths(
+            image_paths,
+            structure_path,
+            data_license_path,
+            data_readme_path,
+            rai_license_path,
+        ),
     )
 
 
-def _multiprocess_download(
-    urls_to_download: List[str], paths_to_save_to: List[pathlib.Path]
+def _manifest_hashes(
+    manifest: Manifest, data_dir: pathlib.Path, paths: List[pathlib.Path]
+) -> List[Optional[str]]:
+    hashes: List[Optional[str]] = []
+    for path in paths:
+        try:
+            relative_path = path.relative_to(data_dir).as_posix()
+        except ValueError:
+            # Such as the rai LICENSE, which is not within the dataset
+            hashes.append(None)
+            continue
+
+        hashes.append(manifest.get(relative_path))
+
+    return hashes
+
+
+def _fetch(
+    url: str,
+    path: pathlib.Path,
+    sha256: Optional[str],
+    connections: "_ConnectionPool",
+    store: Optional[Store],
 ):
-    processes: List[multiprocessing.Process] = []
+    """Ensure a file exists at the path, verified against its hash when
+    one is known."""
 
-    for url, path in zip(urls_to_download, paths_to_save_to):
-        # TODO: Utilise stored hashes to verify
-        if path.exists():
-            continue
+    if sha256 is None or store is None:
+        if not path.exists():
+            _download(url, path, connections)
 
-        path.parent.mkdir(exist_ok=True, parents=True)
+        return
 
-        p = multiprocessing.Process(
-            target=urllib.request.urlretrieve, kwargs={"url": url, "filename": path}
+    if store.verify(path, sha256):
+        store.add(path, sha256)
+        return
+
+    if store.materialise(sha256, path):
+        return
+
+    # Any existing file failed verification, so is downloaded afresh
+    path.unlink(missing_ok=True)
+    _download(url, path, connections)
+
+    downloaded_sha256 = store.sha256(path)
+    if downloaded_sha256 != sha256:
+        path.unlink()
+        raise ValueError(
+            f"The SHA-256 of {url} was {downloaded_sha256}, "
+            f"however {sha256} was expected"
         )
-        p.start()
-        processes.append(p)
 
-    for p in processes:
-        p.join()
+    store.add(path, sha256)
+
+
+class _ConnectionPool:
+    """Keep-alive HTTP connections, one per host per thread."""
+
+    def __init__(self):
+        self._local = threading.local()
+        self._all: List[http.client.HTTPConnection] = []
+        self._lock = threading.Lock()
+
+    def get(self, scheme: str, netloc: str) -> http.client.HTTPConnection:
+        """The current thread's connection to a host, opening one if
+        needed."""
+
+        connections: Dict[
+            Tuple[str, str], http.client.HTTPConnection
+        ] = self._local.__dict__.setdefault("connections", {})
+
+        try:
+            return connections[(scheme, netloc)]
+        except KeyError:
+            pass
+
+        if scheme == "https":
+            connection = http.client.HTTPSConnection(netloc, timeout=TIMEOUT)
+        elif scheme == "http":
+            connection = http.client.HTTPConnection(netloc, timeout=TIMEOUT)
+        else:
+            raise ValueError(f"Unsupported URL scheme: {scheme}")
+
+        connections[(scheme, netloc)] = connection
+        with self._lock:
+            self._all.append(connection)
+
+        return connection
+
+    def discard(self, scheme: str, netloc: str):
+        """Close the current thread's connection to a host, such as after
+        it has failed part way through a response."""
+
+        connection = self._local.__dict__.get("connections", {}).pop(
+            (scheme, netloc), None
+        )
+        if connection is not None:
+            connection.close()
+
+    def close(self):
+        """Close every connection, across all threads."""
+
+        with self._lock:
+            for connection in self._all:
+                connection.close()
+
+            self._all.clear()
+
+
+def _download(url: str, path: pathlib.Path, connections: _ConnectionPool):
+    """Download a single file, resuming any previous partial download,
+    and retrying with a fresh connection should one fail."""
+
+    path.parent.mkdir(exist_ok=True, parents=True)
+    part_path = path.with_name(f"{path.name}.part")
+    lock_path = path.with_name(f"{path.name}.lock")
+
+    with _exclusive_lock(lock_path):
+        # Another process may have completed the download while waiting
+        if path.exists():
+            return
+
+        for attempt in range(MAX_ATTEMPTS):
+            try:
+                _download_to_part(url, part_path, connections)
+                break
+            except (http.client.HTTPException, OSError) as e:
+                if isinstance(e, urllib.error.HTTPError) or attempt == MAX_ATTEMPTS - 1:
+                    raise
+
+        os.replace(part_path, path)
+
+    # Any process that then acquires the lock finds the completed file,
+    # so it is safe to remove. On Windows it cannot be removed while
+    # another process has it open, in which case it is left behind.
+    with contextlib.suppress(OSError):
+        lock_path.unlink()
+
+
+@contextlib.contextmanager
+def _exclusive_lock(lock_path: pathlib.Path):
+    """Hold an exclusive lock on a file, waiting for any other process
+    or thread that holds it. The operating system releases the lock
+    should the process be killed, so it is never left stale."""
+
+    with open(lock_path, "ab") as f:
+        if sys.platform == "win32":
+            while True:
+                try:
+                    msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+                    break
+                except OSError:
+                    # LK_LOCK only retries for ten seconds before raising
+                    continue
+        else:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+
+        yield
+
+
+def _download_to_part(url: str, part_path: pathlib.Path, connections: _ConnectionPool):
+    for _ in range(MAX_REDIRECTS + 1):
+        try:
+            offset = part_path.stat().st_size
+        except FileNotFoundError:
+            offset = 0
+
+        parsed = urllib.parse.urlsplit(url)
+        target = urllib.parse.urlunsplit(("", "", parsed.path, parsed.query, ""))
+        headers = {"Range": f"bytes={offset}-"} if offset else {}
+
+        connection = connections.get(parsed.scheme, parsed.netloc)
+        try:
+            connection.request("GET", target, headers=headers)
+            response = connection.getresponse()
+
+            if response.status in _REDIRECT_STATUSES:
+                response.read()
+                url = urllib.parse.urljoin(url, response.headers["Location"])
+                continue
+
+            if response.status == 416:
+                # The partial file is not a prefix of this resource, such
+                # as from an unrelated earlier download, so start afresh.
+                response.read()
+                part_path.unlink()
+                continue
+
+            if response.status not in (200, 206):
+                response.read()
+                raise urllib.error.HTTPError(
+                    url, response.status, response.reason, response.headers, None
+                )
+
+            if response.status == 206 and _content_range_start(response) != offset:
+                # The returned range does not continue on from the partial
+                # file, and so cannot be appended to it. Start afresh.
+                response.read()
+                part_path.unlink()
+                continue
+
+            # A server that ignores the Range header sends the whole file
+            mode = "ab" if response.status == 206 else "wb"
+            expected = response.length
+            received = 0
+            with open(part_path, mode) as f:
+                while True:
+                    chunk = response.read(CHUNK_SIZE)
+                    if not chunk:
+                        break
+
+                    f.write(chunk)
+                    received += len(chunk)
+
+            # Reading in chunks does not raise when the connection is
+            # closed early, leaving the body silently truncated.
+            if expected is not None and received < expected:
+                raise http.client.IncompleteRead(b"", expected - received)
+
+            return
+        except (http.client.HTTPException, OSError):
+            connections.discard(parsed.scheme, parsed.netloc)
+            raise
+
+    raise RuntimeError(f"Exceeded {MAX_REDIRECTS} redirects downloading {url}")
+
+
+def _content_range_start(response: http.client.HTTPResponse) -> Optional[int]:
+    content_range = response.headers.get("Content-Range")
+    if content_range is None:
+        return None
+
+    match = _CONTENT_RANGE.fullmatch(content_range.strip())
+    if match is None:
+        return None
+
+    return int(match.group(1))
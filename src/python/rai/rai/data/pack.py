@@ -0,0 +1,306 @@
+# RAi, machine learning solutions in radiotherapy
+# Copyright (C) 2021-2022 Radiotherapy AI Holdings Pty Ltd
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+"""Packing each example dataset into a single memory mapped file
+
+A pack is an uncompressed (stored) zip file, so that it is still able to
+be opened by any zip tool. Its central directory is read once when the
+pack is opened, after which every file within it is a slice of a single
+memory map, without any further open or stat calls.
+
+>>> example = pack_example(lctsc_example())  # doctest: +SKIP
+>>> with Pack(example.pack_path) as pack:  # doctest: +SKIP
+...     image_series = rai.dicom.series.read_image_series(
+...         pack.open_many(example.image_names)
+...     )
+"""
+
+import io
+import mmap
+import os
+import pathlib
+import struct
+import zipfile
+from typing import Mapping, NamedTuple, Optional, Union
+
+from .download import DownloadedExamplePaths
+
+# The fixed size portion of a zip local file header, followed by the
+# file name and extra field, with their lengths at the given offsets.
+_LOCAL_HEADER_SIGNATURE = b"PK\x03\x04"
+_LOCAL_HEADER_SIZE = 30
+_LOCAL_HEADER_LENGTHS = struct.Struct("<2H")
+_LOCAL_HEADER_LENGTHS_OFFSET = 26
+
+
+class PackedExample(NamedTuple):
+    """The names, within a pack, of each of the files of an example
+    dataset, mirroring `DownloadedExamplePaths`."""
+
+    pack_path: pathlib.Path
+    image_names: list[str]
+    structure_name: str
+    data_license_name: str
+    data_readme_name: str
+    rai_license_name: str
+
+
+def build(pack_path: Union[str, pathlib.Path], files: Mapping[str, pathlib.Path]):
+    """Build a pack from local files.
+
+    The pack is written to a temporary file alongside it, and only
+    renamed into place once complete.
+
+    Parameters
+    ----------
+    pack_path : Union[str, pathlib.Path]
+        The path of the pack to create.
+    files : Mapping[str, pathlib.Path]
+        The path of each file, keyed by its name within the pack.
+    """
+
+    pack_path = pathlib.Path(pack_path)
+    pack_path.parent.mkdir(parents=True, exist_ok=True)
+
+    temp_path = pack_path.with_name(f"{pack_path.name}.part")
+    with zipfile.ZipFile(temp_path, "w", compression=zipfile.ZIP_STORED) as f:
+        for name, path in files.items():
+            f.write(path, name)
+
+    os.replace(temp_path, pack_path)
+
+
+def pack_example(
+    downloaded: DownloadedExamplePaths,
+    pack_path: Optional[Union[str, pathlib.Path]] = None,
+) -> PackedExample:
+    """Pack a downloaded example dataset, unless it has already been
+    packed.
+
+    Parameters
+    ----------
+    downloaded : DownloadedExamplePaths
+        As returned by one of the example download functions, such as
+        `rai.data.download.lctsc_example`.
+    pack_path : Union[str, pathlib.Path], optional
+        By default a zip file alongside the dataset's directory, such as
+        ``~/.rai/data/LCTSC.zip``.
+
+    Returns
+    -------
+    PackedExample
+    """
+
+    data_dir = downloaded.data_license_path.parent
+    if pack_path is None:
+        pack_path = data_dir.with_name(f"{data_dir.name}.zip")
+
+    pack_path = pathlib.Path(pack_path)
+
+    def _name(path: pathlib.Path):
+        return path.relative_to(data_dir).as_posix()
+
+    example = PackedExample(
+        pack_path=pack_path,
+        image_names=[_name(path) for path in downloaded.image_paths],
+        structure_name=_name(downloaded.structure_path),
+        data_license_name=_name(downloaded.data_license_path),
+        data_readme_name=_name(downloaded.data_readme_path),
+        rai_license_name="rai/LICENSE",
+    )
+
+    if not pack_path.exists():
+        files = dict(zip(example.image_names, downloaded.image_paths))
+        files[example.structure_name] = downloaded.structure_path
+        files[example.data_license_name] = downloaded.data_license_path
+        files[example.data_readme_name] = downloaded.data_readme_path
+        files[example.rai_license_name] = downloaded.rai_license_path
+
+        build(pack_path, files)
+
+    return example
+
+
+class Pack:
+    """A memory mapped pack of files.
+
+    Utilise as a context manager so that the file is closed once
+    finished with. Bytes returned from the pack remain valid after it
+    is closed.
+
+    Parameters
+    ----------
+    path : str or pathlib.Path
+        A pack, as created by `build`.
+
+    Raises
+    ------
+    ValueError
+        If any file within the pack is compressed.
+    """
+
+    def __init__(self, path: Union[str, pathlib.Path]):
+        self.path = pathlib.Path(path)
+        self._file = open(self.path, "rb")  # pylint: disable = consider-using-with
+
+        try:
+            self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        except BaseException:
+            self._file.close()
+            raise
+
+        try:
+            self._index = _index(self._file, self._mmap)
+        except BaseException:
+            self.close()
+            raise
+
+    @property
+    def names(self) -> list[str]:
+        """The name of every file within the pack, in the order that
+        they were packed."""
+
+        return list(self._index)
+
+    def read(self, name: str) -> bytes:
+        """The contents of a single file."""
+
+        start, size = self._index[name]
+
+        return self._mmap[start : start + size]
+
+    def open(self, name: str) -> "MappedFile":
+        """A single file, as a file-like object suitable for
+        `pydicom.dcmread`, without copying it out of the memory map."""
+
+        start, size = self._index[name]
+
+        return MappedFile(memoryview(self._mmap)[start : start + size])
+
+    def open_many(self, names: list[str]) -> list["MappedFile"]:
+        """Several files, such as the images of a series."""
+
+        return [self.open(name) for name in names]
+
+    def close(self):
+        """Close the underlying file.
+
+        While any file opened from the pack is still referenced, the
+        memory map itself is only released once they are garbage
+        collected.
+        """
+
+        try:
+            self._mmap.close()
+        except BufferError:
+            pass
+
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_):
+        self.close()
+
+
+class MappedFile(io.RawIOBase):
+    """A read only file-like view of a region of a memory map.
+
+    ``getbuffer`` exposes the view itself, as for `io.BytesIO`, so that
+    readers such as `rai.dicom.series` are able to access its contents
+    without copying them. When pickled, such as to be sent to another
+    process, it is copied into an `io.BytesIO`.
+    """
+
+    def __init__(self, view: memoryview):
+        super().__init__()
+        self._view = view
+        self._position = 0
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def read(self, size: Optional[int] = -1) -> bytes:
+        end = len(self._view)
+        if size is not None and size >= 0:
+            end = min(self._position + size, end)
+
+        data = self._view[self._position : end].tobytes()
+        self._position = max(self._position, end)
+
+        return data
+
+    def readinto(self, buffer: "memoryview | bytearray") -> int:  # type: ignore
+        target = memoryview(buffer).cast("B")
+        data = self._view[self._position : self._position + len(target)]
+        target[: len(data)] = data
+        self._position += len(data)
+
+        return len(data)
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        if whence == io.SEEK_CUR:
+            offset += self._position
+        elif whence == io.SEEK_END:
+            offset += len(self._view)
+
+        if offset < 0:
+            raise ValueError(f"Negative seek position {offset}")
+
+        self._position = offset
+
+        return offset
+
+    def tell(self) -> int:
+        return self._position
+
+    def getbuffer(self) -> memoryview:
+        """The contents of the file, without copying."""
+
+        return self._view
+
+    def __reduce__(self):
+        return io.BytesIO, (self._view.tobytes(),)
+
+
+def _index(file: io.BufferedReader, mapped: mmap.mmap) -> dict[str, tuple[int, int]]:
+    """The offset and size of the data of each file within the pack."""
+
+    index: dict[str, tuple[int, int]] = {}
+    with zipfile.ZipFile(file) as zip_file:
+        for info in zip_file.infolist():
+            if info.compress_type != zipfile.ZIP_STORED:
+                raise ValueError(
+                    f"{info.filename} is compressed, however every file within "
+                    "a pack needs to be stored uncompressed"
+                )
+
+            offset = info.header_offset
+            if mapped[offset : offset + 4] != _LOCAL_HEADER_SIGNATURE:
+                raise ValueError(f"Invalid local header for {info.filename}")
+
+            name_length, extra_length = _LOCAL_HEADER_LENGTHS.unpack_from(
+                mapped, offset + _LOCAL_HEADER_LENGTHS_OFFSET
+            )
+            start = offset + _LOCAL_HEADER_SIZE + name_length + extra_length
+
+            index[info.filename] = (start, info.file_size)
+
+    return index
@@ -0,0 +1,259 @@
+# RAi, machine learning solutions in radiotherapy
+# Copyright (C) 2021-2022 Radiotherapy AI Holdings Pty Ltd
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+"""A content-addressed, hash verified, store of downloaded data
+
+Each example dataset may have a manifest of the SHA-256 of every one of
+its files, pinned to the commit of the data repository that it was
+created from. Verified files are kept within the store under the name
+of their hash, and hard linked into each dataset directory, so that
+identical files are only stored, and downloaded, once.
+
+The hash of every file is recorded alongside its modification time and
+size, so that a file is only rehashed once it has changed.
+
+Manifests are created by downloading an example into an empty
+directory, checking the downloaded files, and then calling
+`write_manifest`.
+"""
+
+import concurrent.futures
+import hashlib
+import json
+import os
+import pathlib
+import shutil
+import tempfile
+import threading
+from typing import Dict, NamedTuple, Optional, Union
+
+from rai._paths import RAI_DATA
+
+MANIFESTS_DIR = pathlib.Path(__file__).parent / "manifests"
+CHUNK_SIZE = 2**20
+
+Manifest = Dict[str, str]
+
+
+class _HashRecord(NamedTuple):
+    mtime_ns: int
+    size: int
+    sha256: str
+
+
+def read_manifest(repo: str, commit_hash: str) -> Optional[Manifest]:
+    """The SHA-256 of each file of an example dataset, keyed by its path
+    relative to the dataset directory, or None if there is no manifest
+    for the given commit."""
+
+    try:
+        with open(_manifest_path(repo, commit_hash), encoding="utf8") as f:
+            contents = json.load(f)
+    except FileNotFoundError:
+        return None
+
+    return contents["files"]
+
+
+def write_manifest(
+    repo: str, commit_hash: str, data_dir: Union[str, pathlib.Path]
+) -> pathlib.Path:
+    """Record the SHA-256 of every file within a freshly downloaded
+    example dataset.
+
+    Parameters
+    ----------
+    repo : str
+        The GitHub repository of the dataset, such as
+        ``"RadiotherapyAI/data-tcia-deepmind"``.
+    commit_hash : str
+        The commit of that repository that was downloaded.
+    data_dir : Union[str, pathlib.Path]
+        The directory that the dataset was downloaded into.
+
+    Returns
+    -------
+    pathlib.Path
+        The path of the written manifest.
+    """
+
+    data_dir = pathlib.Path(data_dir)
+    paths = sorted(
+        path
+        for path in data_dir.rglob("*")
+        if path.is_file() and path.suffix not in (".part", ".lock")
+    )
+
+    with concurrent.futures.ThreadPoolExecutor() as executor:
+        hashes = list(executor.map(_sha256, paths))
+
+    contents = {
+        "repo": repo,
+        "commit_hash": commit_hash,
+        "files": {
+            path.relative_to(data_dir).as_posix(): sha256
+            for path, sha256 in zip(paths, hashes)
+        },
+    }
+
+    manifest_path = _manifest_path(repo, commit_hash)
+    manifest_path.parent.mkdir(parents=True, exist_ok=True)
+    with open(manifest_path, "w", encoding="utf8") as f:
+        json.dump(contents, f, indent=2)
+        f.write("\n")
+
+    return manifest_path
+
+
+class Store:
+    """Hash verified files, stored by their SHA-256.
+
+    Safe to be utilised across threads. Records of the hashed files are
+    only written to disk by `save`, and are written atomically, so that
+    several processes are able to share the same store.
+
+    Parameters
+    ----------
+    root : Union[str, pathlib.Path], optional
+        The directory of the store, by default ``~/.rai/data``.
+    """
+
+    def __init__(self, root: Union[str, pathlib.Path] = RAI_DATA):
+        self.root = pathlib.Path(root)
+        self._objects_dir = self.root / "objects"
+        self._records_path = self.root / "hashes.json"
+
+        self._lock = threading.Lock()
+        self._records = self._read_records()
+
+    def object_path(self, sha256: str) -> pathlib.Path:
+        """The path of the stored file with the given hash."""
+
+        return self._objects_dir / sha256[:2] / sha256[2:]
+
+    def sha256(self, path: pathlib.Path) -> str:
+        """The SHA-256 of a file, only hashing it if its modification
+        time or size has changed since it was last hashed."""
+
+        stat = path.stat()
+        key = str(path.absolute())
+
+        with self._lock:
+            record = self._records.get(key)
+
+        if (
+            record is not None
+            and record.mtime_ns == stat.st_mtime_ns
+            and record.size == stat.st_size
+        ):
+            return record.sha256
+
+        sha256 = _sha256(path)
+        with self._lock:
+            self._records[key] = _HashRecord(stat.st_mtime_ns, stat.st_size, sha256)
+
+        return sha256
+
+    def verify(self, path: pathlib.Path, sha256: str) -> bool:
+        """Whether or not a file exists and has the given hash."""
+
+        try:
+            return self.sha256(path) == sha256
+        except FileNotFoundError:
+            return False
+
+    def add(self, path: pathlib.Path, sha256: str):
+        """Store a file that has been verified to have the given hash,
+        replacing it with a link to the stored file."""
+
+        object_path = self.object_path(sha256)
+        if self.verify(object_path, sha256):
+            _link(object_path, path)
+            return
+
+        object_path.parent.mkdir(parents=True, exist_ok=True)
+        _link(path, object_path)
+
+    def materialise(self, sha256: str, path: pathlib.Path) -> bool:
+        """Link the stored file with the given hash to a path, returning
+        False if the store does not yet have a valid copy of it."""
+
+        object_path = self.object_path(sha256)
+        if not self.verify(object_path, sha256):
+            return False
+
+        path.parent.mkdir(parents=True, exist_ok=True)
+        _link(object_path, path)
+
+        return True
+
+    def save(self):
+        """Atomically write the records of every hashed file."""
+
+        with self._lock:
+            contents = {key: list(record) for key, record in self._records.items()}
+
+        self.root.mkdir(parents=True, exist_ok=True)
+        with tempfile.NamedTemporaryFile(
+            "w", dir=self.root, suffix=".tmp", delete=False, encoding="utf8"
+        ) as f:
+            json.dump(contents, f)
+
+        os.replace(f.name, self._records_path)
+
+    def _read_records(self) -> Dict[str, _HashRecord]:
+        try:
+            with open(self._records_path, encoding="utf8") as f:
+                contents = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {}
+
+        return {key: _HashRecord(*record) for key, record in contents.items()}
+
+
+def _manifest_path(repo: str, commit_hash: str):
+    return MANIFESTS_DIR / repo.replace("/", "__") / f"{commit_hash}.json"
+
+
+def _sha256(path: pathlib.Path) -> str:
+    sha256 = hashlib.sha256()
+    with open(path, "rb") as f:
+        while True:
+            chunk = f.read(CHUNK_SIZE)
+            if not chunk:
+                break
+
+            sha256.update(chunk)
+
+    return sha256.hexdigest()
+
+
+def _link(source: pathlib.Path, destination: pathlib.Path):
+    """Atomically replace the destination with a hard link to the
+    source, falling back to a copy where hard links are unsupported,
+    such as across file systems."""
+
+    # Unique to both the process and thread, so that concurrent links to
+    # the same destination never collide.
+    temp_path = destination.with_name(
+        f"{destination.name}.{os.getpid()}.{threading.get_ident()}.tmp"
+    )
+    try:
+        os.link(source, temp_path)
+    except OSError:
+        shutil.copy2(source, temp_path)
+
+    os.replace(temp_path, destination)
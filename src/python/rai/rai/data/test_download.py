@@ -0,0 +1,335 @@
+# RAi, machine learning solutions in radiotherapy
+# Copyright (C) 2021-2022 Radiotherapy AI Holdings Pty Ltd
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+"""Testing the example data downloader against a local HTTP server"""
+
+import hashlib
+import http.server
+import pathlib
+import re
+import threading
+import urllib.error
+from typing import Iterator
+
+import pytest
+
+from . import download, store
+
+FILES = {f"{index}.dcm": bytes([index]) * (1000 + 37 * index) for index in range(10)}
+
+
+class _Handler(http.server.BaseHTTPRequestHandler):
+    """Serves FILES at /files/, redirecting to them from /redirect/.
+    The first request for each file under /flaky/ is cut off half way
+    through its body, and ranges requested under /misranged/ are
+    answered from the start of the file."""
+
+    protocol_version = "HTTP/1.1"
+
+    connections = 0
+    ranges: list[str] = []
+    cut_off: set[str] = set()
+    lock = threading.Lock()
+
+    def setup(self):
+        """Count each new connection."""
+
+        super().setup()
+        with self.lock:
+            _Handler.connections += 1
+
+    def do_GET(self):  # pylint: disable = invalid-name
+        """Serve, redirect to, or cut off a file, as per its route."""
+
+        _, route, name = self.path.split("/")
+
+        if route == "redirect":
+            self.send_response(302)
+            self.send_header("Location", f"/files/{name}")
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+
+        if name not in FILES:
+            self.send_error(404)
+            return
+
+        content = FILES[name]
+        start = 0
+        range_header = self.headers.get("Range")
+        if range_header is not None:
+            with self.lock:
+                self.ranges.append(range_header)
+
+            match = re.fullmatch(r"bytes=(\d+)-", range_header)
+            assert match is not None
+            start = int(match.group(1))
+
+        status = 206 if start else 200
+        if route == "misranged":
+            start = 0
+
+        self.send_response(status)
+        if status == 206:
+            self.send_header(
+                "Content-Range", f"bytes {start}-{len(content) - 1}/{len(content)}"
+            )
+        self.send_header("Content-Length", str(len(content) - start))
+        self.end_headers()
+
+        with self.lock:
+            cut_off = route == "flaky" and name not in self.cut_off
+            self.cut_off.add(name)
+
+        if cut_off:
+            self.wfile.write(content[: len(content) // 2])
+            self.close_connection = True
+            return
+
+        self.wfile.write(content[start:])
+
+    def log_message(self, *args: object):
+        pass
+
+
+@pytest.fixture(name="server_url")
+def _server_url() -> Iterator[str]:
+    _Handler.connections = 0
+    _Handler.ranges = []
+    _Handler.cut_off = set()
+
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+
+    try:
+        yield f"http://127.0.0.1:{server.server_address[1]}"
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def test_download_all(tmp_path: pathlib.Path, server_url: str):
+    """Test that redirected downloads reuse a connection per thread"""
+
+    names = sorted(FILES)
+    paths = [tmp_path / "nested" / name for name in names]
+
+    download.download_all(
+        [f"{server_url}/redirect/{name}" for name in names], paths, max_workers=2
+    )
+
+    for name, path in zip(names, paths):
+        assert path.read_bytes() == FILES[name]
+
+    assert not list(tmp_path.glob("**/*.part"))
+    assert _Handler.connections <= 2
+
+
+def test_resume(tmp_path: pathlib.Path, server_url: str):
+    """Test that interrupted and partial downloads are resumed with a
+    Range request"""
+
+    partial_path = tmp_path / "1.dcm"
+    pathlib.Path(f"{partial_path}.part").write_bytes(FILES["1.dcm"][:100])
+
+    flaky_path = tmp_path / "2.dcm"
+
+    download.download_all(
+        [f"{server_url}/files/1.dcm", f"{server_url}/flaky/2.dcm"],
+        [partial_path, flaky_path],
+        max_workers=1,
+    )
+
+    assert partial_path.read_bytes() == FILES["1.dcm"]
+    assert flaky_path.read_bytes() == FILES["2.dcm"]
+    assert sorted(_Handler.ranges) == sorted(
+        ["bytes=100-", f"bytes={len(FILES['2.dcm']) // 2}-"]
+    )
+
+
+def test_mismatched_content_range(tmp_path: pathlib.Path, server_url: str):
+    """Test that a partial download is restarted, rather than appended
+    to, when the returned range does not continue on from it"""
+
+    path = tmp_path / "3.dcm"
+    pathlib.Path(f"{path}.part").write_bytes(FILES["3.dcm"][:100])
+
+    download.download_all([f"{server_url}/misranged/3.dcm"], [path])
+
+    assert path.read_bytes() == FILES["3.dcm"]
+    assert _Handler.ranges == ["bytes=100-"]
+
+
+def test_concurrent_download(tmp_path: pathlib.Path, server_url: str):
+    """Test that simultaneous downloads of the same file wait for one
+    another, rather than writing to the same partial file at once"""
+
+    path = tmp_path / "9.dcm"
+    download.download_all([f"{server_url}/files/9.dcm"] * 4, [path] * 4, max_workers=4)
+
+    assert path.read_bytes() == FILES["9.dcm"]
+    assert not _Handler.ranges
+    assert sorted(tmp_path.iterdir()) == [path]
+
+
+def test_not_found(tmp_path: pathlib.Path, server_url: str):
+    """Test that a failed download never leaves a file at its path"""
+
+    path = tmp_path / "missing.dcm"
+    with pytest.raises(urllib.error.HTTPError):
+        download.download_all([f"{server_url}/files/missing.dcm"], [path])
+
+    assert not path.exists()
+
+
+def test_verified_download(tmp_path: pathlib.Path, server_url: str):
+    """Test that downloads are verified against their hashes, with
+    stored files reused rather than downloaded again"""
+
+    data_store = store.Store(tmp_path / "store")
+    hashes = [hashlib.sha256(FILES[name]).hexdigest() for name in ("1.dcm", "2.dcm")]
+
+    first_paths = [tmp_path / "first" / name for name in ("1.dcm", "2.dcm")]
+    download.download_all(
+        [f"{server_url}/files/{path.name}" for path in first_paths],
+        first_paths,
+        hashes=list(hashes),
+        store=data_store,
+    )
+    connections = _Handler.connections
+
+    # Already within the store, so no further requests are needed
+    second_paths = [tmp_path / "second" / name for name in ("1.dcm", "2.dcm")]
+    download.download_all(
+        [f"{server_url}/missing/{path.name}" for path in second_paths],
+        second_paths,
+        hashes=list(hashes),
+        store=data_store,
+    )
+    assert _Handler.connections == connections
+    assert second_paths[0].read_bytes() == FILES["1.dcm"]
+
+    # A corrupted file is replaced without modifying the stored copy
+    first_paths[1].unlink()
+    first_paths[1].write_bytes(b"corrupted")
+    download.download_all(
+        [f"{server_url}/files/2.dcm"],
+        first_paths[1:],
+        hashes=hashes[1:],
+        store=data_store,
+    )
+    assert first_paths[1].read_bytes() == FILES["2.dcm"]
+
+    mismatched = tmp_path / "mismatched.dcm"
+    with pytest.raises(ValueError):
+        download.download_all(
+            [f"{server_url}/files/3.dcm"],
+            [mismatched],
+            hashes=["0" * 64],
+            store=data_store,
+        )
+
+    assert not mismatched.exists()
+
+
+def test_iter_download_all(tmp_path: pathlib.Path, server_url: str):
+    """Test that paths are yielded as they land, and that stopping
+    early cancels the remaining downloads"""
+
+    names = sorted(FILES)
+    paths = [tmp_path / name for name in names]
+    urls = [f"{server_url}/files/{name}" for name in names]
+
+    iterator = download.iter_download_all(urls, paths, max_workers=1)
+    first = next(iterator)
+    assert first.read_bytes() == FILES[first.name]
+
+    iterator.close()
+    assert len(list(tmp_path.glob("*.dcm"))) < len(names)
+    assert not list(tmp_path.glob("*.part"))
+
+    yielded = list(download.iter_download_all(urls, paths, max_workers=2))
+    assert sorted(yielded) == sorted(paths)
+    for path in paths:
+        assert path.read_bytes() == FILES[path.name]
+
+
+def test_write_example_manifest(
+    tmp_path: pathlib.Path, monkeypatch: pytest.MonkeyPatch
+):
+    """Test that a written example manifest covers every file that is
+    planned to be downloaded within the dataset"""
+
+    def fake_download_all(urls: list[str], paths: list[pathlib.Path]):
+        for url, path in zip(urls, paths):
+            path.parent.mkdir(parents=True, exist_ok=True)
+            path.write_text(url, encoding="utf8")
+
+    monkeypatch.setattr(store, "MANIFESTS_DIR", tmp_path / "manifests")
+    monkeypatch.setattr(download, "download_all", fake_download_all)
+
+    manifest_path = download.write_example_manifest("lctsc")
+    assert manifest_path.parent.parent == tmp_path / "manifests"
+
+    data_dir = tmp_path / "LCTSC"
+    plan = download._plan_download(  # pylint: disable = protected-access
+        download._LCTSC, data_dir  # pylint: disable = protected-access
+    )
+
+    assert plan.hashes is not None
+    for path, sha256 in zip(plan.paths, plan.hashes):
+        if data_dir in path.parents:
+            assert sha256 is not None
+        else:
+            assert sha256 is None
+
+
+_SHIPPED_EXAMPLES = {
+    name: download._EXAMPLES[name][0]  # pylint: disable = protected-access
+    for name in ["lctsc", "hnscc", "deepmind"]
+}
+
+
+@pytest.mark.parametrize(
+    "example",
+    [
+        pytest.param(
+            example,
+            marks=pytest.mark.xfail(
+                condition=store.read_manifest(example.repo, example.commit_hash)
+                is None,
+                reason=(
+                    f"No manifest has been generated for {name}, create it "
+                    f"with `python -m rai manifests --example {name}`"
+                ),
+                strict=True,
+            ),
+            id=name,
+        )
+        for name, example in _SHIPPED_EXAMPLES.items()
+    ],
+)
+def test_examples_resolve_to_a_manifest(example):
+    """Test that each shipped example is pinned to a manifest, so that
+    its files are verified"""
+
+    plan = download._plan_download(  # pylint: disable = protected-access
+        example, pathlib.Path("data")
+    )
+
+    assert plan.hashes is not None
+    assert any(sha256 is not None for sha256 in plan.hashes)
@@ -0,0 +1,74 @@
+# RAi, machine learning solutions in radiotherapy
+# Copyright (C) 2021-2022 Radiotherapy AI Holdings Pty Ltd
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+"""Testing the packing of example datasets"""
+
+import pathlib
+import zipfile
+
+import numpy as np
+import pytest
+
+from rai.dicom import series
+from rai.dicom._testing import write_series
+
+from . import pack
+from .download import DownloadedExamplePaths
+
+
+def test_pack_example(tmp_path: pathlib.Path):
+    """Test that a series read from a pack matches the loose files"""
+
+    data_dir = tmp_path / "LCTSC"
+    data_dir.mkdir()
+    image_paths, _, _ = write_series(data_dir)
+
+    other_paths: list[pathlib.Path] = []
+    for name in ("RS.dcm", "LICENSE", "README.md"):
+        path = data_dir / name
+        path.write_bytes(name.encode())
+        other_paths.append(path)
+
+    rai_license_path = tmp_path / "LICENSE"
+    rai_license_path.write_bytes(b"AGPL")
+
+    downloaded = DownloadedExamplePaths(image_paths, *other_paths, rai_license_path)
+    example = pack.pack_example(downloaded)
+
+    assert example.pack_path == tmp_path / "LCTSC.zip"
+    assert example.structure_name == "RS.dcm"
+
+    with pack.Pack(example.pack_path) as packed:
+        assert packed.read(example.rai_license_name) == b"AGPL"
+        assert packed.read(example.data_readme_name) == b"README.md"
+
+        from_pack = series.read_image_series(packed.open_many(example.image_names))
+
+    loose = series.read_image_series(image_paths)
+
+    assert np.array_equal(from_pack.image_stack, loose.image_stack)
+    assert np.array_equal(from_pack.positions, loose.positions)
+
+
+def test_compressed(tmp_path: pathlib.Path):
+    """Test that compressed zip files are rejected"""
+
+    path = tmp_path / "compressed.zip"
+    with zipfile.ZipFile(path, "w", compression=zipfile.ZIP_DEFLATED) as f:
+        f.writestr("CT.dcm", b"\x00" * 100)
+
+    with pytest.raises(ValueError):
+        pack.Pack(path)
@@ -0,0 +1,98 @@
+# RAi, machine learning solutions in radiotherapy
+# Copyright (C) 2021-2022 Radiotherapy AI Holdings Pty Ltd
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+"""Testing the hash verified data store"""
+
+import hashlib
+import os
+import pathlib
+
+import pytest
+
+from . import store
+
+
+def test_incremental_hashing(tmp_path: pathlib.Path, monkeypatch: pytest.MonkeyPatch):
+    """Test that files are only rehashed once they have changed, across
+    instances of the store"""
+
+    hashed: list[pathlib.Path] = []
+    # Counting the calls of the private hasher is what the test is of
+    sha256 = store._sha256  # pylint: disable = protected-access
+
+    def _counting_sha256(path: pathlib.Path):
+        hashed.append(path)
+        return sha256(path)
+
+    monkeypatch.setattr(store, "_sha256", _counting_sha256)
+
+    path = tmp_path / "CT.dcm"
+    path.write_bytes(b"contents")
+    expected = hashlib.sha256(b"contents").hexdigest()
+
+    data_store = store.Store(tmp_path / "store")
+    assert data_store.verify(path, expected)
+    assert not data_store.verify(tmp_path / "missing", expected)
+    data_store.save()
+
+    reloaded = store.Store(tmp_path / "store")
+    assert reloaded.verify(path, expected)
+    assert hashed == [path]
+
+    path.write_bytes(b"changed contents")
+    assert not reloaded.verify(path, expected)
+    assert hashed == [path, path]
+
+
+def test_deduplication(tmp_path: pathlib.Path):
+    """Test that identical files across datasets share a single stored
+    file"""
+
+    data_store = store.Store(tmp_path / "store")
+    sha256 = hashlib.sha256(b"LICENSE").hexdigest()
+
+    first = tmp_path / "LCTSC" / "LICENSE"
+    first.parent.mkdir()
+    first.write_bytes(b"LICENSE")
+    data_store.add(first, sha256)
+
+    second = tmp_path / "HNSCC" / "LICENSE"
+    assert data_store.materialise(sha256, second)
+    assert second.read_bytes() == b"LICENSE"
+    assert os.path.samefile(first, second)
+    assert os.path.samefile(second, data_store.object_path(sha256))
+
+    assert not data_store.materialise("0" * 64, tmp_path / "missing")
+
+
+def test_manifest(tmp_path: pathlib.Path, monkeypatch: pytest.MonkeyPatch):
+    """Test that a written manifest is read back for its commit only"""
+
+    monkeypatch.setattr(store, "MANIFESTS_DIR", tmp_path / "manifests")
+
+    data_dir = tmp_path / "data"
+    (data_dir / "study").mkdir(parents=True)
+    (data_dir / "README.md").write_bytes(b"README")
+    (data_dir / "study" / "CT-000.dcm").write_bytes(b"CT")
+    (data_dir / "study" / "CT-001.dcm.part").write_bytes(b"C")
+
+    store.write_manifest("RadiotherapyAI/data", "abc123", data_dir)
+
+    assert store.read_manifest("RadiotherapyAI/data", "abc123") == {
+        "README.md": hashlib.sha256(b"README").hexdigest(),
+        "study/CT-000.dcm": hashlib.sha256(b"CT").hexdigest(),
+    }
+    assert store.read_manifest("RadiotherapyAI/data", "def456") is None
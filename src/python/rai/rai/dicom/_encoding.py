@@ -0,0 +1,96 @@
+# RAi, machine learning solutions in radiotherapy
+# Copyright (C) 2021-2022 Radiotherapy AI Holdings Pty Ltd
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+"""Marking datasets created within memory as already being encoded
+
+pydicom only writes raw elements as they are when a dataset's original
+encoding matches the encoding it is written with. Otherwise it converts
+every raw element, such as the raw ContourData bytes created by
+`rai.dicom.append`, only to then encode them back again. Datasets
+created within memory have no original encoding, and so are marked as
+explicit VR little endian, within the character set that they are to be
+written with.
+"""
+
+from typing import Union
+
+import pydicom
+import pydicom.charset
+
+Encodings = Union[str, list[str]]
+
+
+def original_encoding(dataset: pydicom.Dataset):
+    """Whether a dataset was read as implicit VR, whether it was read as
+    little endian, and the character set it was read with. The first two
+    are None for datasets created within memory."""
+
+    # pydicom >= 3
+    if hasattr(dataset, "original_encoding"):
+        is_implicit_vr, is_little_endian = dataset.original_encoding
+
+        return is_implicit_vr, is_little_endian, dataset.original_character_set
+
+    return dataset.read_implicit_vr, dataset.read_little_endian, dataset.read_encoding
+
+
+def character_set(dataset: pydicom.Dataset, parent_encoding: Encodings) -> Encodings:
+    """The character set of a dataset, which, as for pydicom, is that of
+    its parent if it does not have its own."""
+
+    specific_character_set = dataset.get("SpecificCharacterSet")
+    if specific_character_set:
+        return pydicom.charset.convert_encodings(specific_character_set)
+
+    return parent_encoding
+
+
+def set_encoding(
+    dataset: pydicom.Dataset, source: pydicom.Dataset, encodings: Encodings
+):
+    """Set the original encoding of a dataset from that of its source,
+    which may be the dataset itself.
+
+    Sources created within memory, whose every element has a VR, are
+    marked as explicit VR little endian within the given character set.
+    Sources read from a file, or holding raw elements without a VR, keep
+    their original encoding, and so are left for pydicom to convert.
+    """
+
+    encoding = original_encoding(source)
+    if None in encoding[:2] and all(
+        source.get_item(tag).VR is not None for tag in source.keys()
+    ):
+        dataset.set_original_encoding(False, True, encodings)
+    else:
+        dataset.set_original_encoding(*encoding)
+
+
+def mark_encoded(
+    dataset: pydicom.Dataset,
+    parent_encoding: Encodings = pydicom.charset.default_encoding,
+):
+    """Mark a dataset, and the items of its sequences, as already being
+    encoded where they were created within memory."""
+
+    encodings = character_set(dataset, parent_encoding)
+    set_encoding(dataset, dataset, encodings)
+
+    for tag in dataset.keys():
+        element = dataset.get_item(tag)
+        if not element.is_raw and element.VR == "SQ":
+            for item in element.value:
+                mark_encoded(item, encodings)
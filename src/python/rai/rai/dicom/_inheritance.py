@@ -19,8 +19,13 @@
 """
 
 
+import copy
 import enum
-from typing import NamedTuple
+from typing import NamedTuple, Optional
+
+import pydicom
+import pydicom.datadict
+from pydicom.tag import BaseTag
 
 
 class AttributeType(enum.Enum):
@@ -95,3 +100,190 @@ RTSTRUCT_DICOM_MODULES = {
     "sop-common": ModuleOptions(Usage.MANDATORY, Inheritance.CREATE),
     "common-instance-reference": ModuleOptions(Usage.USER_OPTIONAL, Inheritance.CREATE),
 }
+
+# The top level attributes of each module that is inherited from the CT
+# series, transcribed from the module tables within PS3.3 Section C.7.
+INHERITED_MODULE_KEYWORDS = {
+    "patient": (
+        "PatientName",
+        "PatientID",
+        "IssuerOfPatientID",
+        "IssuerOfPatientIDQualifiersSequence",
+        "TypeOfPatientID",
+        "PatientBirthDate",
+        "PatientBirthTime",
+        "PatientBirthDateInAlternativeCalendar",
+        "PatientDeathDateInAlternativeCalendar",
+        "PatientAlternativeCalendar",
+        "PatientSex",
+        "ReferencedPatientPhotoSequence",
+        "QualityControlSubject",
+        "ReferencedPatientSequence",
+        "OtherPatientIDs",
+        "OtherPatientIDsSequence",
+        "OtherPatientNames",
+        "EthnicGroup",
+        "PatientComments",
+        "PatientSpeciesDescription",
+        "PatientSpeciesCodeSequence",
+        "PatientBreedDescription",
+        "PatientBreedCodeSequence",
+        "BreedRegistrationSequence",
+        "StrainDescription",
+        "StrainNomenclature",
+        "StrainStockSequence",
+        "StrainAdditionalInformation",
+        "StrainCodeSequence",
+        "GeneticModificationsSequence",
+        "ResponsiblePerson",
+        "ResponsiblePersonRole",
+        "ResponsibleOrganization",
+        "PatientIdentityRemoved",
+        "DeidentificationMethod",
+        "DeidentificationMethodCodeSequence",
+        "SourcePatientGroupIdentificationSequence",
+        "GroupOfPatientsIdentificationSequence",
+    ),
+    "clinical-trial-subject": (
+        "ClinicalTrialSponsorName",
+        "ClinicalTrialProtocolID",
+        "IssuerOfClinicalTrialProtocolID",
+        "OtherClinicalTrialProtocolIDsSequence",
+        "ClinicalTrialProtocolName",
+        "ClinicalTrialSiteID",
+        "IssuerOfClinicalTrialSiteID",
+        "ClinicalTrialSiteName",
+        "ClinicalTrialSubjectID",
+        "IssuerOfClinicalTrialSubjectID",
+        "ClinicalTrialSubjectReadingID",
+        "IssuerOfClinicalTrialSubjectReadingID",
+        "ClinicalTrialProtocolEthicsCommitteeName",
+        "ClinicalTrialProtocolEthicsCommitteeApprovalNumber",
+    ),
+    "general-study": (
+        "StudyInstanceUID",
+        "StudyDate",
+        "StudyTime",
+        "ReferringPhysicianName",
+        "ReferringPhysicianIdentificationSequence",
+        "ConsultingPhysicianName",
+        "ConsultingPhysicianIdentificationSequence",
+        "StudyID",
+        "AccessionNumber",
+        "IssuerOfAccessionNumberSequence",
+        "StudyDescription",
+        "PhysiciansOfRecord",
+        "PhysiciansOfRecordIdentificationSequence",
+        "NameOfPhysiciansReadingStudy",
+        "PhysiciansReadingStudyIdentificationSequence",
+        "RequestingServiceCodeSequence",
+        "ReferencedStudySequence",
+        "ProcedureCodeSequence",
+        "ReasonForPerformedProcedureCodeSequence",
+    ),
+    "patient-study": (
+        "AdmittingDiagnosesDescription",
+        "AdmittingDiagnosesCodeSequence",
+        "PatientAge",
+        "PatientSize",
+        "PatientSizeCodeSequence",
+        "PatientBodyMassIndex",
+        "MeasuredAPDimension",
+        "MeasuredLateralDimension",
+        "PatientWeight",
+        "MedicalAlerts",
+        "Allergies",
+        "Occupation",
+        "SmokingStatus",
+        "AdditionalPatientHistory",
+        "PregnancyStatus",
+        "LastMenstrualDate",
+        "PatientSexNeutered",
+        "ReasonForVisit",
+        "ReasonForVisitCodeSequence",
+        "AdmissionID",
+        "IssuerOfAdmissionIDSequence",
+        "ServiceEpisodeID",
+        "IssuerOfServiceEpisodeIDSequence",
+        "ServiceEpisodeDescription",
+        "PatientState",
+    ),
+    "clinical-trial-study": (
+        "ClinicalTrialTimePointID",
+        "IssuerOfClinicalTrialTimePointID",
+        "ClinicalTrialTimePointDescription",
+        "ClinicalTrialTimePointTypeCodeSequence",
+        "LongitudinalTemporalOffsetFromEvent",
+        "LongitudinalTemporalEventType",
+        "ConsentForClinicalTrialUseSequence",
+    ),
+    "frame-of-reference": (
+        "FrameOfReferenceUID",
+        "PositionReferenceIndicator",
+    ),
+}
+
+
+def _compile_inherited_tags(
+    modules: dict[str, ModuleOptions]
+) -> dict[str, frozenset[BaseTag]]:
+    """Compile the inherited modules down to the tags of their
+    attributes.
+
+    Keywords that are newer than the installed pydicom's data dictionary
+    are skipped, as no element with them is able to have been read.
+    """
+
+    tags_by_module: dict[str, frozenset[BaseTag]] = {}
+    for name, options in modules.items():
+        if options.inheritance != Inheritance.INHERIT:
+            continue
+
+        tags = (
+            pydicom.datadict.tag_for_keyword(keyword)
+            for keyword in INHERITED_MODULE_KEYWORDS[name]
+        )
+        tags_by_module[name] = frozenset(
+            BaseTag(tag) for tag in tags if tag is not None
+        )
+
+    return tags_by_module
+
+
+# The tags to copy from the CT series, compiled once at import
+INHERITED_TAGS_BY_MODULE = _compile_inherited_tags(RTSTRUCT_DICOM_MODULES)
+INHERITED_TAGS = frozenset().union(*INHERITED_TAGS_BY_MODULE.values())
+
+
+def copy_inherited(
+    source: pydicom.Dataset, target: Optional[pydicom.Dataset] = None
+) -> pydicom.Dataset:
+    """Copy the elements of every inherited module from a CT header into
+    an RT Structure Set, within a single pass.
+
+    Only the tags present within both the source and the compiled
+    `INHERITED_TAGS` are visited. Elements not yet decoded from the
+    file are copied as they are, without being decoded. The target
+    should utilise the same SpecificCharacterSet as the source.
+
+    Parameters
+    ----------
+    source : pydicom.Dataset
+        The header of a CT image within the series.
+    target : pydicom.Dataset, optional
+        The dataset to copy into, by default a new one.
+
+    Returns
+    -------
+    pydicom.Dataset
+        The target dataset.
+    """
+
+    if target is None:
+        target = pydicom.Dataset()
+
+    for tag in INHERITED_TAGS.intersection(source.keys()):
+        element = source.get_item(tag)
+        target[tag] = element if element.is_raw else copy.deepcopy(element)
+
+    return target
@@ -0,0 +1,80 @@
+# Copyright (C) 2022 Radiotherapy AI Holdings Pty Ltd
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+"""Utilities shared by the DICOM tests"""
+
+import pathlib
+
+import numpy as np
+import pydicom
+import pydicom.uid
+
+SHAPE = (6, 4)
+
+
+def write_series(
+    directory: pathlib.Path,
+    transfer_syntax: str = pydicom.uid.ExplicitVRLittleEndian,
+    signed: bool = False,
+):
+    """Write a small CT series, with its slices out of order.
+
+    Returns the paths written, the z position of each, and the stored
+    pixel values of each image.
+    """
+
+    rng = np.random.default_rng(42)
+    z_positions = [2.5 * z for z in rng.permutation(5)]
+    images = rng.integers(0, 3000, (len(z_positions), *SHAPE), dtype=np.uint16)
+
+    # 12 bits stored with their sign bit set, and the bits above it left
+    # clear, as some scanners do
+    if signed:
+        images = images - 2048 & 0x0FFF
+
+    paths: list[pathlib.Path] = []
+    for index, (z, image) in enumerate(zip(z_positions, images)):
+        dataset = pydicom.Dataset()
+        dataset.PatientName = "Lewis^Clive Staples"
+        dataset.StudyInstanceUID = "1.2.3"
+        dataset.SOPInstanceUID = f"1.2.3.{index}"
+        dataset.ImagePositionPatient = [-100.0, -100.0, z]
+        dataset.ImageOrientationPatient = [1.0, 0.0, 0.0, 0.0, 1.0, 0.0]
+        dataset.Rows, dataset.Columns = SHAPE
+        dataset.SamplesPerPixel = 1
+        dataset.PhotometricInterpretation = "MONOCHROME2"
+        dataset.BitsAllocated = 16
+        dataset.BitsStored = 12 if signed else 16
+        dataset.HighBit = dataset.BitsStored - 1
+        dataset.PixelRepresentation = int(signed)
+        dataset.RescaleSlope = 1
+        dataset.RescaleIntercept = -1024
+        dataset.PixelData = image.astype(
+            "<u2" if transfer_syntax != pydicom.uid.ExplicitVRBigEndian else ">u2"
+        ).tobytes()
+
+        file_meta = pydicom.dataset.FileMetaDataset()
+        file_meta.MediaStorageSOPClassUID = pydicom.uid.CTImageStorage
+        file_meta.MediaStorageSOPInstanceUID = dataset.SOPInstanceUID
+        file_meta.TransferSyntaxUID = transfer_syntax
+
+        dataset.file_meta = file_meta
+        dataset.preamble = b"\x00" * 128
+
+        path = directory / f"CT.{index}.dcm"
+        pydicom.dcmwrite(path, dataset)
+        paths.append(path)
+
+    return paths, z_positions, images.astype(np.int32)
@@ -15,12 +15,20 @@
 
 """Module for generating DICOM files from a dictionary format"""
 
-from typing import Any, Union, cast
+import functools
+from typing import Any, NamedTuple, Union, cast
 
 import numpy as np
 import pydicom
+import pydicom.config
 import pydicom.datadict
+import pydicom.valuerep
 from numpy.typing import NDArray
+from pydicom.dataelem import RawDataElement
+from pydicom.tag import BaseTag, Tag
+
+from . import _encoding
+from . import ds as ds_encoding
 
 DicomItem = Union[
     dict[str, "DicomItem"],
@@ -36,15 +44,28 @@ DicomItem = Union[
 def append_dict_to_dataset(
     ds: pydicom.Dataset,
     to_append: dict[str, DicomItem],
+    decimals: int = ds_encoding.DEFAULT_DECIMALS,
 ):
     """Append a dictionary to a given pydicom Dataset
 
+    Elements are created directly from a cached lookup of each
+    keyword's tag and VR. NumPy arrays of DS elements, such as
+    ContourData, are encoded straight to their raw bytes, all of them
+    together, by `rai.dicom.ds.encode_many`. Plain ASCII single values
+    are also stored as raw bytes, once validated as pydicom would.
+    Datasets created within memory are marked as already being encoded
+    as explicit VR little endian, so that `pydicom.dcmwrite` writes the
+    raw bytes as they are, rather than converting them back again.
+
     Parameters
     ----------
     ds : pydicom.Dataset
         The pydicom Dataset for which to append the dictionary to.
     to_append : dict[str, DicomItem]
         A dictionary in the structure of a DICOM header.
+    decimals : int, optional
+        The number of decimal places that NumPy arrays of DS elements
+        are rounded to.
 
     Returns
     -------
@@ -90,19 +111,67 @@ def append_dict_to_dataset(
 
     """
 
+    pending: list[_PendingDS] = []
+    _append(ds, to_append, pending)
+
+    # The DS arrays of the whole tree are encoded together
+    encoded_values = ds_encoding.encode_many(
+        [item.value for item in pending], decimals=decimals
+    )
+    for item, encoded in zip(pending, encoded_values):
+        item.dataset[item.tag] = _raw_element(item.tag, "DS", encoded)
+
+    _encoding.mark_encoded(ds)
+
+    return ds
+
+
+# VRs whose values are stored as strings
+_STRING_VRS = {
+    "AE",
+    "AS",
+    "CS",
+    "DA",
+    "DS",
+    "DT",
+    "IS",
+    "LO",
+    "LT",
+    "PN",
+    "SH",
+    "ST",
+    "TM",
+    "UC",
+    "UI",
+    "UR",
+    "UT",
+}
+
+
+class _PendingDS(NamedTuple):
+    """A DS array awaiting encoding straight to its raw bytes."""
+
+    dataset: pydicom.Dataset
+    tag: BaseTag
+    value: NDArray[Any]
+
+
+def _append(
+    ds: pydicom.Dataset,
+    to_append: dict[str, DicomItem],
+    pending: list[_PendingDS],
+):
     for key, value in to_append.items():
-        if key not in pydicom.datadict.keyword_dict.keys():
-            raise ValueError(f"{key} is not within the DICOM dictionary.")
+        tag, vr = _get_tag_and_vr(key)
 
         if isinstance(value, dict):
-            setattr(ds, key, append_dict_to_dataset(pydicom.Dataset(), value))
+            ds.add(pydicom.DataElement(tag, vr, _append_to_new(value, pending)))
 
         elif isinstance(value, list):
             if all(not isinstance(item, dict) for item in value):
-                _add_item_to_dataset(ds, key, value)
+                _add_item_to_dataset(ds, tag, vr, value, pending)
 
             elif all(isinstance(item, dict) for item in value):
-                vr = _get_vr(key)
                 if vr != "SQ":
                     raise ValueError(
                         "In order to provide a list of dictionaries to "
@@ -112,10 +181,10 @@ def append_dict_to_dataset(
 
                 value = cast(list[dict[str, DicomItem]], value)
 
-                setattr(
-                    ds,
-                    key,
-                    [append_dict_to_dataset(pydicom.Dataset(), item) for item in value],
+                ds.add(
+                    pydicom.DataElement(
+                        tag, vr, [_append_to_new(item, pending) for item in value]
+                    )
                 )
 
             else:
@@ -124,20 +193,73 @@ def append_dict_to_dataset(
                     "dictionaries"
                 )
         else:
-            _add_item_to_dataset(ds, key, value)
+            _add_item_to_dataset(ds, tag, vr, value, pending)
+
+
+def _append_to_new(to_append: dict[str, DicomItem], pending: list[_PendingDS]):
+    ds = pydicom.Dataset()
+    _append(ds, to_append, pending)
 
     return ds
 
 
-def _get_vr(key: str):
-    tag = pydicom.datadict.keyword_dict[key]
-    vr = pydicom.datadict.dictionary_VR(tag)
+@functools.lru_cache(maxsize=None)
+def _get_tag_and_vr(key: str) -> tuple[BaseTag, str]:
+    """The tag and VR of a DICOM keyword, looked up once per keyword."""
+
+    tag = pydicom.datadict.tag_for_keyword(key)
+    if tag is None:
+        raise ValueError(f"{key} is not within the DICOM dictionary.")
 
-    return vr
+    return Tag(tag), pydicom.datadict.dictionary_VR(tag)
 
 
-def _add_item_to_dataset(dataset: pydicom.Dataset, key: str, value: DicomItem):
+def _add_item_to_dataset(
+    dataset: pydicom.Dataset,
+    tag: BaseTag,
+    vr: str,
+    value: DicomItem,
+    pending: list[_PendingDS],
+):
     if isinstance(value, np.ndarray):
+        if vr == "DS":
+            pending.append(_PendingDS(dataset, tag, value))
+            return
+
         value = value.tolist()
 
-    setattr(dataset, key, value)
+    elif (
+        isinstance(value, str)
+        and vr in _STRING_VRS
+        and value.isascii()
+        and "\\" not in value
+    ):
+        # Plain ASCII single values are already in their encoded form,
+        # so pydicom's conversion of each element is skipped. They are
+        # still validated, as pydicom does when creating an element.
+        pydicom.valuerep.validate_value(
+            vr, value, pydicom.config.settings.reading_validation_mode
+        )
+
+        encoded = value.encode("ascii")
+        if len(encoded) % 2:
+            encoded += b"\x00" if vr == "UI" else b" "
+
+        dataset[tag] = _raw_element(tag, vr, encoded)
+        return
+
+    dataset.add(pydicom.DataElement(tag, vr, value))
+
+
+def _raw_element(tag: BaseTag, vr: str, value: bytes):
+    """An element holding its value as it is to be written to file."""
+
+    return RawDataElement(
+        tag=tag,
+        VR=vr,
+        length=len(value),
+        value=value,
+        value_tell=None,
+        is_implicit_VR=False,
+        is_little_endian=True,
+    )
@@ -0,0 +1,56 @@
+# Copyright (C) 2022 Radiotherapy AI Holdings Pty Ltd
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+"""Reading Contour Data into NumPy arrays"""
+
+import numpy as np
+import pydicom.datadict
+from numpy.typing import NDArray
+
+from . import ds
+from .typing import ContourSequenceItem
+
+_CONTOUR_DATA_TAG = pydicom.datadict.tag_for_keyword("ContourData")
+
+
+def to_array(item: ContourSequenceItem) -> NDArray[np.float64]:
+    """Read the ContourData of a Contour Sequence item.
+
+    When the item has been read from a file and its ContourData has not
+    yet been accessed, the raw bytes are decoded directly, skipping the
+    creation of a pydicom DSfloat per value. The raw element within the
+    item is left as is. Otherwise the already converted values are
+    utilised.
+
+    Parameters
+    ----------
+    item : pydicom.Dataset
+        An item of a ContourSequence.
+
+    Returns
+    -------
+    (n,3)-ndarray
+        The (x, y, z) coordinates of each of the contour's points.
+    """
+
+    element = item.get_item(_CONTOUR_DATA_TAG)
+    value = item.ContourData if element is None else element.value
+
+    if isinstance(value, bytes):
+        coords = ds.decode(value)
+    else:
+        coords = np.asarray(value, dtype=np.float64)
+
+    return coords.reshape((-1, 3))
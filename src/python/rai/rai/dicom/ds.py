@@ -0,0 +1,302 @@
+# Copyright (C) 2022 Radiotherapy AI Holdings Pty Ltd
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+"""Conversion of Decimal String (DS) values to and from NumPy arrays"""
+
+from typing import Sequence, Union
+
+import numpy as np
+from numpy.typing import ArrayLike, NDArray
+
+# The number of decimal places that values are rounded to when encoded.
+# For coordinates in mm this is a tenth of a micrometre.
+DEFAULT_DECIMALS = 4
+
+# The maximum length in bytes of a single DS value
+MAX_LENGTH = 16
+
+_POWERS_OF_TEN = 10 ** np.arange(20, dtype=np.uint64)
+
+# Digits are formatted four at a time, via a lookup table of every
+# group of four digits packed into a 32 bit word.
+_GROUP_DIGITS = 4
+_GROUP_STRINGS = [b"%04d" % i for i in range(10**_GROUP_DIGITS)]
+_GROUP_WORDS = np.frombuffer(b"".join(_GROUP_STRINGS), dtype=np.uint32)
+_GROUP_TRAILING_ZEROS = np.array(
+    [len(string) - len(string.rstrip(b"0")) for string in _GROUP_STRINGS]
+)
+
+_POINT, _MINUS, _SEPARATOR = b".-\\"
+
+_TOO_LARGE_MESSAGE = (
+    f"Values need to have at most {MAX_LENGTH} characters before their "
+    "decimal point, including any minus sign, in order to be encoded as a DS."
+)
+
+
+def decode(value: bytes) -> NDArray[np.float64]:
+    """Decode the raw bytes of a multi-valued DS element.
+
+    All values are parsed within a single vectorised pass, without
+    creating a Python float for each value.
+
+    Parameters
+    ----------
+    value : bytes
+        The backslash separated decimal strings, as stored within the
+        DICOM file.
+
+    Returns
+    -------
+    NDArray[np.float64]
+        The decoded values.
+
+    Raises
+    ------
+    ValueError
+        If any of the values is not a valid decimal string.
+    """
+
+    stripped = value.strip(b" \x00")
+    if not stripped:
+        return np.zeros(0)
+
+    items = np.array(stripped.split(b"\\"))
+    try:
+        return items.astype(np.float64)
+    except ValueError:
+        pass
+
+    for item in items:
+        try:
+            float(item)
+        except ValueError:
+            raise ValueError(
+                f"{item.decode(errors='replace')!r} is not a valid DS value."
+            ) from None
+
+    raise ValueError(f"{value!r} is not a valid DS.")
+
+
+def encode(values: ArrayLike, decimals: int = DEFAULT_DECIMALS) -> bytes:
+    """Encode values as the raw bytes of a multi-valued DS element.
+
+    Parameters
+    ----------
+    values : ArrayLike
+        The values to encode, of any shape. They are encoded in C
+        order.
+    decimals : int, optional
+        The number of decimal places to round each value to.
+
+    Returns
+    -------
+    bytes
+        The backslash separated decimal strings, padded to an even
+        length as required of a DICOM value.
+
+    Raises
+    ------
+    ValueError
+        If a value is not finite, or is too large to fit within the 16
+        bytes allowed of a DS.
+    """
+
+    return encode_many([values], decimals=decimals)[0]
+
+
+def encode_many(
+    arrays: Sequence[ArrayLike], decimals: int = DEFAULT_DECIMALS
+) -> list[bytes]:
+    """Encode many arrays, each as the raw bytes of its own DS element.
+
+    The values of all arrays are formatted together within a single set
+    of vectorised operations, rather than one set per array, as a
+    structure set has many thousands of small ContourData arrays.
+
+    Each value is rounded to ``decimals`` decimal places, with trailing
+    zeros removed, so ``12.5`` is encoded as ``b"12.5"`` and ``-3.0`` as
+    ``b"-3"``. Values whose integer part leaves too little room within
+    the 16 byte limit of a DS are rounded to fewer decimal places. The
+    output only depends upon the values and ``decimals``, so the same
+    values are always encoded to the same bytes.
+
+    Parameters
+    ----------
+    arrays : sequence of ArrayLike
+        The arrays to encode, each of any shape.
+    decimals : int, optional
+        The number of decimal places to round each value to.
+
+    Returns
+    -------
+    list of bytes
+        The backslash separated decimal strings of each array, padded
+        to an even length.
+
+    Raises
+    ------
+    ValueError
+        If a value is not finite, or is too large to fit within the 16
+        bytes allowed of a DS.
+    """
+
+    if not 0 <= decimals <= MAX_LENGTH - 2:
+        raise ValueError(
+            f"Decimals needs to be between 0 and {MAX_LENGTH - 2}, however "
+            f"{decimals} was provided."
+        )
+
+    flattened = [np.asarray(values, dtype=np.float64).ravel() for values in arrays]
+    counts = np.array([len(values) for values in flattened], dtype=np.int64)
+
+    if counts.sum() == 0:
+        return [b"" for _ in flattened]
+
+    characters, valid, lengths = _format(np.concatenate(flattened), decimals)
+
+    # Every value, except the first of each array, is preceded by a
+    # separator.
+    separators = np.ones(len(lengths), dtype=bool)
+    separators[(np.cumsum(counts) - counts)[counts > 0]] = False
+    valid[:, 0] = separators
+
+    encoded = characters[valid].tobytes()
+
+    value_ends = np.concatenate([[0], np.cumsum(lengths + separators)])
+    array_ends = value_ends[np.cumsum(counts)]
+    array_starts = np.concatenate([[0], array_ends[:-1]])
+
+    results: list[bytes] = []
+    for start, end in zip(array_starts, array_ends):
+        result = encoded[start:end]
+        if len(result) % 2:
+            result += b" "
+
+        results.append(result)
+
+    return results
+
+
+def _format(values: NDArray[np.float64], decimals: int):
+    """Format values as rows of characters.
+
+    Each row is laid out as a spare leading column, followed by the
+    sign and integer digits right aligned, the decimal point, and then
+    the fraction digits. Which of these make up each value is given by
+    ``valid``, so that unneeded leading and trailing zeros are dropped.
+
+    Returns
+    -------
+    characters : (n, m)-ndarray of uint8
+    valid : (n, m)-ndarray of bool
+    lengths : (n,)-ndarray of int
+        The number of valid characters of each value.
+    """
+
+    if not np.all(np.isfinite(values)):
+        raise ValueError("Only finite values are able to be encoded as a DS.")
+
+    absolute = np.abs(values)
+    if np.any(absolute >= 10.0 ** (MAX_LENGTH - (values < 0))):
+        raise ValueError(_TOO_LARGE_MESSAGE)
+
+    # Values with many integer digits are rounded to fewer decimal
+    # places, so as to fit within the DS length limit. This keeps every
+    # rounded value below 2**53, where float64 integers are exact.
+    value_decimals: Union[int, NDArray[np.int64]] = decimals
+    if np.any(absolute >= 10.0 ** (MAX_LENGTH - 2 - decimals)):
+        whole_digits = np.maximum(
+            np.searchsorted(
+                _POWERS_OF_TEN, np.floor(absolute).astype(np.uint64), side="right"
+            ),
+            1,
+        )
+        value_decimals = np.clip(
+            MAX_LENGTH - 1 - (values < 0) - whole_digits, 0, decimals
+        )
+
+    scaled = np.rint(absolute * 10.0**value_decimals).astype(np.uint64)
+    integers, fractions = np.divmod(scaled, _POWERS_OF_TEN[value_decimals])
+    fractions *= _POWERS_OF_TEN[decimals - value_decimals]
+
+    # Values that round to zero are not given a sign
+    negative = (values < 0) & (scaled > 0)
+
+    integer_lengths = negative + np.maximum(
+        np.searchsorted(_POWERS_OF_TEN, integers, side="right"), 1
+    )
+    integer_width = int(integer_lengths.max())
+
+    integer_digits, _ = _digits(integers, integer_width)
+    fraction_digits, trailing_zeros = _digits(fractions, decimals)
+    fraction_lengths = decimals - np.minimum(trailing_zeros, decimals)
+
+    lengths = integer_lengths + (fraction_lengths > 0) + fraction_lengths
+    if np.any(lengths > MAX_LENGTH):
+        # Only reachable when rounding carries into a further integer
+        # digit, such as 9999999999999999.6
+        raise ValueError(_TOO_LARGE_MESSAGE)
+
+    point = integer_width + 1
+    width = point + 1 + decimals
+
+    characters = np.empty((len(values), width), dtype=np.uint8)
+    characters[:, 0] = _SEPARATOR
+    characters[:, 1:point] = integer_digits
+    characters[:, point] = _POINT
+    characters[:, point + 1 :] = fraction_digits
+
+    rows = np.flatnonzero(negative)
+    characters[rows, point - integer_lengths[rows]] = _MINUS
+
+    # Which characters are valid only depends upon the integer and
+    # fraction lengths, so is looked up from a table of every pairing.
+    table = np.empty((integer_width + 1, decimals + 1, width), dtype=bool)
+    table[..., 0] = True
+    table[..., 1:point] = (
+        np.arange(1, point) >= point - np.arange(integer_width + 1)[:, None, None]
+    )
+    table[..., point] = np.arange(decimals + 1) > 0
+    table[..., point + 1 :] = np.arange(decimals) < np.arange(decimals + 1)[:, None]
+    valid = table[integer_lengths, fraction_lengths]
+
+    return characters, valid, lengths
+
+
+def _digits(numbers: NDArray[np.uint64], width: int):
+    """The digits of each number, right aligned and zero padded to the
+    given width, along with the number of trailing zeros of each.
+
+    Digits are looked up a group at a time, with each group's
+    characters packed into a single 32 bit word.
+    """
+
+    groups = -(-width // _GROUP_DIGITS)
+    words = np.empty((len(numbers), groups), dtype=np.uint32)
+    trailing_zeros = np.zeros(len(numbers), dtype=np.int64)
+    all_zero = np.ones(len(numbers), dtype=bool)
+
+    remaining = numbers
+    for group in range(groups - 1, -1, -1):
+        remaining, group_value = np.divmod(remaining, 10**_GROUP_DIGITS)
+        words[:, group] = _GROUP_WORDS[group_value]
+
+        trailing_zeros += all_zero * _GROUP_TRAILING_ZEROS[group_value]
+        all_zero &= group_value == 0
+
+    digits = words.view(np.uint8)
+
+    return digits[:, digits.shape[1] - width :], trailing_zeros
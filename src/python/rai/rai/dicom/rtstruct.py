@@ -0,0 +1,683 @@
+# Copyright (C) 2022 Radiotherapy AI Holdings Pty Ltd
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+"""Reading and writing RT Structure Set files one ROI at a time
+
+pydicom reads every element within a sequence, so loading an RT
+Structure Set reads, and holds within memory, the ContourData of every
+ROI. Instead, the file is scanned once, recording only the byte offset
+of each ContourData value, which is then decoded on demand.
+
+Similarly, writing with pydicom needs the whole dataset to be built
+within memory first. Instead, the ROIContourSequence is written with an
+undefined length, so that each of its items is able to be written as
+soon as it is ready.
+"""
+
+import collections
+import copy
+import mmap
+import pathlib
+import struct
+from typing import BinaryIO, NamedTuple, Optional, Union
+
+import numpy as np
+import pydicom
+import pydicom.charset
+import pydicom.datadict
+import pydicom.filebase
+import pydicom.filewriter
+import pydicom.uid
+from numpy.typing import NDArray
+
+from . import _encoding, _inheritance, append, ds, uid
+
+_ITEM_TAG = 0xFFFEE000
+_ITEM_DELIMITATION_TAG = 0xFFFEE00D
+_SEQUENCE_DELIMITATION_TAG = 0xFFFEE0DD
+_UNDEFINED_LENGTH = 0xFFFFFFFF
+
+# Explicit VRs that are followed by two reserved bytes and a four byte
+# length, rather than a two byte length.
+_LONG_LENGTH_VRS = {
+    b"OB",
+    b"OD",
+    b"OF",
+    b"OL",
+    b"OV",
+    b"OW",
+    b"SQ",
+    b"SV",
+    b"UC",
+    b"UN",
+    b"UR",
+    b"UT",
+    b"UV",
+}
+
+_TAGS = {
+    keyword: pydicom.datadict.tag_for_keyword(keyword)
+    for keyword in (
+        "SpecificCharacterSet",
+        "TransferSyntaxUID",
+        "StructureSetROISequence",
+        "ROINumber",
+        "ROIName",
+        "ROIContourSequence",
+        "ReferencedROINumber",
+        "ContourSequence",
+        "ContourImageSequence",
+        "ReferencedSOPInstanceUID",
+        "ContourGeometricType",
+        "ContourData",
+    )
+}
+
+# Only these sequences are descended into, all others are skipped over
+_INDEXED_SEQUENCES = {
+    _TAGS[keyword]
+    for keyword in (
+        "StructureSetROISequence",
+        "ROIContourSequence",
+        "ContourSequence",
+        "ContourImageSequence",
+    )
+}
+
+# The location of a value within the file, as an (offset, length) pair
+_Location = tuple[int, int]
+_Item = dict[int, Union[_Location, list["_Item"]]]
+
+
+class ContourIndex(NamedTuple):
+    """The location of a single contour's ContourData within the file.
+
+    Attributes
+    ----------
+    referenced_sop_instance_uid : str
+        The SOP Instance UID of the image that the contour is on.
+    geometric_type : str
+        The ContourGeometricType, such as "CLOSED_PLANAR".
+    offset : int
+        The byte offset of the ContourData value within the file.
+    length : int
+        The length in bytes of the ContourData value.
+    """
+
+    referenced_sop_instance_uid: str
+    geometric_type: str
+    offset: int
+    length: int
+
+
+class ROIIndex(NamedTuple):
+    """The contours of a single ROI within the file."""
+
+    number: int
+    name: str
+    contours: list[ContourIndex]
+
+
+class LazyStructureSet:
+    """An RT Structure Set file, indexed without decoding its contours.
+
+    Utilise as a context manager so that the file is closed once
+    finished with.
+
+    >>> with LazyStructureSet(path) as structure_set:  # doctest: +SKIP
+    ...     contours = structure_set.contour_data("Brainstem")
+
+    Parameters
+    ----------
+    path : str or pathlib.Path
+        The RT Structure Set file.
+    use_mmap : bool, optional
+        Memory map the file, rather than undergoing a seek and read per
+        contour. Defaults to True.
+
+    Raises
+    ------
+    ValueError
+        If the file is not a DICOM file, or if it is encoded with a
+        transfer syntax other than implicit or explicit VR little
+        endian.
+    """
+
+    def __init__(self, path: Union[str, pathlib.Path], use_mmap: bool = True):
+        self._file = open(path, "rb")  # pylint: disable = consider-using-with
+        self._fp: Union[BinaryIO, mmap.mmap] = self._file
+
+        try:
+            if use_mmap:
+                self._fp = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+
+            self.rois = _index(self._fp)
+        except BaseException:
+            self.close()
+            raise
+
+    @property
+    def roi_names(self) -> list[str]:
+        """The name of every ROI, in the order of the ROIContourSequence."""
+
+        return [roi.name for roi in self.rois]
+
+    def roi(self, name: str) -> ROIIndex:
+        """The index of the first ROI with the given name."""
+
+        for roi in self.rois:
+            if roi.name == name:
+                return roi
+
+        raise KeyError(f"No ROI named {name} within the structure set")
+
+    def contour_data(self, name: str) -> list[NDArray[np.float64]]:
+        """Decode the ContourData of a single ROI.
+
+        Returns
+        -------
+        list of (n,3)-ndarrays
+            The (x, y, z) coordinates of each contour of the ROI.
+        """
+
+        return [self._decode(contour) for contour in self.roi(name).contours]
+
+    def contours_by_image_uid(self, name: str) -> dict[str, list[NDArray[np.float64]]]:
+        """Decode the ContourData of a single ROI, grouped by the SOP
+        Instance UID of the image that each contour is on."""
+
+        contours: dict[str, list[NDArray[np.float64]]] = collections.defaultdict(list)
+        for contour in self.roi(name).contours:
+            contours[contour.referenced_sop_instance_uid].append(self._decode(contour))
+
+        return dict(contours)
+
+    def close(self):
+        """Close the underlying file."""
+
+        if isinstance(self._fp, mmap.mmap):
+            self._fp.close()
+
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_):
+        self.close()
+
+    def _decode(self, contour: ContourIndex) -> NDArray[np.float64]:
+        return ds.decode(_read(self._fp, (contour.offset, contour.length))).reshape(
+            (-1, 3)
+        )
+
+
+class StructureSetWriter:
+    """Write an RT Structure Set, streaming each ROIContourSequence item
+    to the file as soon as it is ready.
+
+    The header, being every element other than the ROIContourSequence,
+    is provided upfront. The elements that precede the
+    ROIContourSequence are written immediately, and those that follow
+    it, such as the RTROIObservationsSequence, once the writer is
+    closed. Only one ROI's contours need to be held within memory at a
+    time. The file is written as explicit VR little endian.
+
+    Utilise as a context manager, so that the file is completed once
+    finished with. Should an exception be raised within the context,
+    the partially written file is removed.
+
+    >>> with StructureSetWriter(path, header) as writer:  # doctest: +SKIP
+    ...     for roi_contour in roi_contours:
+    ...         writer.write_roi_contour(roi_contour)
+
+    Parameters
+    ----------
+    path : str or pathlib.Path
+        The RT Structure Set file to create.
+    header : pydicom.Dataset
+        All of the RT Structure Set's elements except for the
+        ROIContourSequence. Needs to include the SOPClassUID and
+        SOPInstanceUID.
+    ct_header : pydicom.Dataset, optional
+        The header of an image of the CT series that was contoured. The
+        elements of each inherited module, such as the patient, general
+        study, and frame of reference modules, are copied from it with
+        `rai.dicom._inheritance.copy_inherited`, other than those already
+        within the header.
+
+    Raises
+    ------
+    ValueError
+        If the header includes a ROIContourSequence.
+    """
+
+    def __init__(
+        self,
+        path: Union[str, pathlib.Path],
+        header: pydicom.Dataset,
+        ct_header: Optional[pydicom.Dataset] = None,
+    ):
+        if _TAGS["ROIContourSequence"] in header:
+            raise ValueError(
+                "The header cannot contain a ROIContourSequence, its items are "
+                "to be written with write_roi_contour"
+            )
+
+        if ct_header is not None:
+            header = _with_inherited(header, ct_header)
+
+        self._path = pathlib.Path(path)
+        self._encoding = header.get(
+            "SpecificCharacterSet", pydicom.charset.default_encoding
+        )
+
+        leading = pydicom.Dataset()
+        self._trailing = pydicom.Dataset()
+        for tag in header.keys():
+            if tag < _TAGS["ROIContourSequence"]:
+                leading[tag] = header.get_item(tag)
+            else:
+                self._trailing[tag] = header.get_item(tag)
+
+        # Both halves keep the header's original encoding, so that any of
+        # its raw elements read from a file are still correctly encoded.
+        encoding = _encoding.original_encoding(header)
+        for part in (leading, self._trailing):
+            part.set_original_encoding(*encoding)
+
+        self._file = open(self._path, "wb")  # pylint: disable = consider-using-with
+        self._fp = pydicom.filebase.DicomFileLike(self._file)
+        self._fp.is_little_endian = True
+        self._fp.is_implicit_VR = False
+
+        try:
+            self._fp.write(b"\x00" * 128 + b"DICM")
+            pydicom.filewriter.write_file_meta_info(self._fp, _file_meta(header))
+            self._write_dataset(leading)
+            self._write_element_header(
+                _TAGS["ROIContourSequence"], b"SQ", _UNDEFINED_LENGTH
+            )
+        except BaseException:
+            self._abort()
+            raise
+
+    def write_roi_contour(
+        self, roi_contour: Union[pydicom.Dataset, dict[str, append.DicomItem]]
+    ):
+        """Write a single item of the ROIContourSequence.
+
+        Parameters
+        ----------
+        roi_contour : pydicom.Dataset or dict
+            The item, including its ReferencedROINumber and
+            ContourSequence. A dictionary is built into a dataset with
+            `rai.dicom.append.append_dict_to_dataset`.
+        """
+
+        if isinstance(roi_contour, dict):
+            roi_contour = append.append_dict_to_dataset(pydicom.Dataset(), roi_contour)
+
+        self._write_element_header(_ITEM_TAG, None, _UNDEFINED_LENGTH)
+        self._write_dataset(roi_contour)
+        self._write_element_header(_ITEM_DELIMITATION_TAG, None, 0)
+
+    def close(self):
+        """Complete the ROIContourSequence, write the remainder of the
+        header, and close the file."""
+
+        if self._file.closed:
+            return
+
+        try:
+            self._write_element_header(_SEQUENCE_DELIMITATION_TAG, None, 0)
+            self._write_dataset(self._trailing)
+        except BaseException:
+            self._abort()
+            raise
+
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type: Optional[type], *_):
+        if exc_type is None:
+            self.close()
+        else:
+            self._abort()
+
+    def _abort(self):
+        self._file.close()
+        self._path.unlink(missing_ok=True)
+
+    def _write_dataset(self, dataset: pydicom.Dataset):
+        pydicom.filewriter.write_dataset(
+            self._fp, _encoded_copy(dataset), self._encoding
+        )
+
+    def _write_element_header(self, tag: int, vr: Optional[bytes], length: int):
+        self._fp.write(struct.pack("<HH", tag >> 16, tag & 0xFFFF))
+        if vr is not None:
+            self._fp.write(vr + b"\x00\x00")
+
+        self._fp.write(struct.pack("<L", length))
+
+
+def _with_inherited(header: pydicom.Dataset, ct_header: pydicom.Dataset):
+    """A copy of the header, along with the elements of every inherited
+    module that it does not already have, copied from the CT header.
+
+    The copied elements are decoded with the CT header's
+    SpecificCharacterSet, which is also utilised for the whole file
+    should the header not have one of its own.
+    """
+
+    inherited = _inheritance.copy_inherited(ct_header)
+    character_set = ct_header.get("SpecificCharacterSet")
+    if character_set is not None:
+        inherited.SpecificCharacterSet = character_set
+
+    merged = pydicom.Dataset()
+    for tag in header.keys():
+        merged[tag] = header.get_item(tag)
+
+    for tag in set(inherited.keys()).difference(merged.keys()):
+        merged[tag] = inherited[tag]
+
+    merged.set_original_encoding(*_encoding.original_encoding(header))
+
+    return merged
+
+
+def _file_meta(header: pydicom.Dataset):
+    file_meta = pydicom.dataset.FileMetaDataset()
+    file_meta.MediaStorageSOPClassUID = header.SOPClassUID
+    file_meta.MediaStorageSOPInstanceUID = header.SOPInstanceUID
+    file_meta.TransferSyntaxUID = pydicom.uid.ExplicitVRLittleEndian
+    file_meta.ImplementationClassUID = uid.RAI_CONTOURS_IMPLEMENTATION_CLASS_UID
+    file_meta.ImplementationVersionName = uid.RAI_IMPLEMENTATION_VERSION_NAME
+
+    return file_meta
+
+
+def _encoded_copy(
+    dataset: pydicom.Dataset,
+    parent_encoding: _encoding.Encodings = pydicom.charset.default_encoding,
+) -> pydicom.Dataset:
+    """A copy of a dataset, with those created within memory marked as
+    already being in the encoding that they are about to be written
+    with, by `rai.dicom._encoding.set_encoding`.
+
+    The items of sequences are copied likewise, and the elements
+    themselves are shallow copied, so that the given dataset is never
+    modified.
+    """
+
+    copied = pydicom.Dataset()
+    for tag in sorted(dataset.keys()):
+        element = dataset.get_item(tag)
+        if element.is_raw:
+            copied[tag] = element
+        elif element.VR == "SQ":
+            copied[tag] = pydicom.DataElement(tag, "SQ", [])
+        else:
+            copied.add(copy.copy(element))
+
+    encodings = _encoding.character_set(dataset, parent_encoding)
+
+    # Items are only added once their sequence is within the copy, so that
+    # they inherit its character set.
+    for tag in copied.keys():
+        element = copied.get_item(tag)
+        if not element.is_raw and element.VR == "SQ":
+            element.value.extend(
+                _encoded_copy(item, encodings) for item in dataset[tag].value
+            )
+
+    _encoding.set_encoding(copied, dataset, encodings)
+
+    return copied
+
+
+def _index(fp: Union[BinaryIO, mmap.mmap]) -> list[ROIIndex]:
+    is_implicit_vr, encodings = _read_file_meta(fp)
+    dataset = _read_dataset(fp, None, is_implicit_vr)
+
+    def read_string(item: _Item, keyword: str, default: str = "") -> str:
+        location = item.get(_TAGS[keyword])
+        if not isinstance(location, tuple):
+            return default
+
+        return pydicom.charset.decode_bytes(
+            _read(fp, location), encodings, set()
+        ).strip(" \x00")
+
+    def read_items(item: _Item, keyword: str) -> list[_Item]:
+        items = item.get(_TAGS[keyword], [])
+        return items if isinstance(items, list) else []
+
+    if _TAGS["SpecificCharacterSet"] in dataset:
+        encodings = pydicom.charset.convert_encodings(
+            read_string(dataset, "SpecificCharacterSet").split("\\")
+        )
+
+    roi_number_to_name = {
+        int(read_string(item, "ROINumber")): read_string(item, "ROIName")
+        for item in read_items(dataset, "StructureSetROISequence")
+    }
+
+    rois: list[ROIIndex] = []
+    for roi_item in read_items(dataset, "ROIContourSequence"):
+        number = int(read_string(roi_item, "ReferencedROINumber"))
+
+        contours: list[ContourIndex] = []
+        for contour_item in read_items(roi_item, "ContourSequence"):
+            contour_data = contour_item.get(_TAGS["ContourData"])
+            if not isinstance(contour_data, tuple):
+                continue
+
+            image_items = read_items(contour_item, "ContourImageSequence")
+            image_uid = (
+                read_string(image_items[0], "ReferencedSOPInstanceUID")
+                if image_items
+                else ""
+            )
+
+            contours.append(
+                ContourIndex(
+                    referenced_sop_instance_uid=image_uid,
+                    geometric_type=read_string(contour_item, "ContourGeometricType"),
+                    offset=contour_data[0],
+                    length=contour_data[1],
+                )
+            )
+
+        rois.append(ROIIndex(number, roi_number_to_name.get(number, ""), contours))
+
+    return rois
+
+
+def _read_file_meta(fp: Union[BinaryIO, mmap.mmap]):
+    """Read the File Meta Information, leaving the file positioned at the
+    start of the dataset."""
+
+    fp.seek(128)
+    if fp.read(4) != b"DICM":
+        raise ValueError("The file has no DICOM File Meta Information header")
+
+    file_meta: _Item = {}
+    while True:
+        start = fp.tell()
+        header = fp.read(4)
+        if len(header) < 4 or struct.unpack("<H", header[:2])[0] != 0x0002:
+            fp.seek(start)
+            break
+
+        fp.seek(start)
+        tag, _, length = _read_element_header(fp, is_implicit_vr=False)
+        file_meta[tag] = (fp.tell(), length)
+        fp.seek(length, 1)
+
+    location = file_meta.get(_TAGS["TransferSyntaxUID"])
+    if not isinstance(location, tuple):
+        raise ValueError("The File Meta Information has no TransferSyntaxUID")
+
+    dataset_start = fp.tell()
+    transfer_syntax = _read(fp, location).decode("ascii").strip(" \x00")
+    fp.seek(dataset_start)
+
+    if transfer_syntax == pydicom.uid.ImplicitVRLittleEndian:
+        is_implicit_vr = True
+    elif transfer_syntax == pydicom.uid.ExplicitVRLittleEndian:
+        is_implicit_vr = False
+    else:
+        raise ValueError(
+            "Only implicit or explicit VR little endian RT Structure Sets are "
+            f"able to be lazily read, however {transfer_syntax} was provided"
+        )
+
+    encodings = pydicom.charset.convert_encodings(["ISO_IR 6"])
+
+    return is_implicit_vr, encodings
+
+
+def _read_dataset(
+    fp: Union[BinaryIO, mmap.mmap], length: Optional[int], is_implicit_vr: bool
+) -> _Item:
+    """Record the location of each element within a dataset or sequence
+    item, descending into the indexed sequences.
+
+    A length of None reads until either an item delimiter or the end of
+    the file.
+    """
+
+    end = None if length is None else fp.tell() + length
+    item: _Item = {}
+
+    while end is None or fp.tell() < end:
+        header = _read_element_header(fp, is_implicit_vr)
+        if header is None:
+            break
+
+        tag, vr, value_length = header
+        if tag == _ITEM_DELIMITATION_TAG:
+            break
+
+        if vr == b"SQ":
+            items = _read_sequence(fp, value_length, is_implicit_vr, tag)
+            if tag in _INDEXED_SEQUENCES:
+                item[tag] = items
+        elif value_length == _UNDEFINED_LENGTH:
+            _skip_fragments(fp)
+        else:
+            item[tag] = (fp.tell(), value_length)
+            fp.seek(value_length, 1)
+
+    return item
+
+
+def _read_sequence(
+    fp: Union[BinaryIO, mmap.mmap], length: int, is_implicit_vr: bool, tag: int
+) -> list[_Item]:
+    if tag not in _INDEXED_SEQUENCES and length != _UNDEFINED_LENGTH:
+        fp.seek(length, 1)
+        return []
+
+    end = None if length == _UNDEFINED_LENGTH else fp.tell() + length
+    items: list[_Item] = []
+
+    while end is None or fp.tell() < end:
+        header = _read_element_header(fp, is_implicit_vr)
+        if header is None:
+            break
+
+        item_tag, _, item_length = header
+        if item_tag == _SEQUENCE_DELIMITATION_TAG:
+            break
+
+        if item_tag != _ITEM_TAG:
+            raise ValueError(f"Expected a sequence item at byte {fp.tell() - 8}")
+
+        items.append(
+            _read_dataset(
+                fp,
+                None if item_length == _UNDEFINED_LENGTH else item_length,
+                is_implicit_vr,
+            )
+        )
+
+    return items
+
+
+def _skip_fragments(fp: Union[BinaryIO, mmap.mmap]):
+    """Skip over an undefined length value that is not a sequence, such
+    as encapsulated pixel data, which is made up of defined length
+    items."""
+
+    while True:
+        header = fp.read(8)
+        if len(header) < 8:
+            return
+
+        group, element, length = struct.unpack("<HHL", header)
+        if (group << 16) | element == _SEQUENCE_DELIMITATION_TAG:
+            return
+
+        fp.seek(length, 1)
+
+
+def _read_element_header(fp: Union[BinaryIO, mmap.mmap], is_implicit_vr: bool):
+    header = fp.read(8)
+    if len(header) < 8:
+        return None
+
+    group, element = struct.unpack("<HH", header[:4])
+    tag = (group << 16) | element
+
+    # Items and delimiters never have a VR
+    if group == 0xFFFE or is_implicit_vr:
+        (length,) = struct.unpack("<L", header[4:])
+        return tag, _implicit_vr(tag, length), length
+
+    vr = header[4:6]
+    if vr in _LONG_LENGTH_VRS:
+        (length,) = struct.unpack("<L", fp.read(4))
+    else:
+        (length,) = struct.unpack("<H", header[6:])
+
+    return tag, vr, length
+
+
+def _implicit_vr(tag: int, length: int) -> Optional[bytes]:
+    if tag >> 16 == 0xFFFE:
+        return None
+
+    try:
+        return pydicom.datadict.dictionary_VR(tag).encode("ascii")
+    except KeyError:
+        # Private and unknown elements of undefined length are, within
+        # implicit VR, always sequences.
+        return b"SQ" if length == _UNDEFINED_LENGTH else b"UN"
+
+
+def _read(fp: Union[BinaryIO, mmap.mmap], location: _Location) -> bytes:
+    offset, length = location
+
+    if isinstance(fp, mmap.mmap):
+        return fp[offset : offset + length]
+
+    fp.seek(offset)
+    return fp.read(length)
@@ -0,0 +1,385 @@
+# Copyright (C) 2022 Radiotherapy AI Holdings Pty Ltd
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+"""Reading the files of a DICOM image series in parallel
+
+Each file is read only once. Its position along the slice normal is
+determined from the header that was read, and the series sorted by it
+afterwards, so that sorting never needs a second pass over the files.
+"""
+
+import concurrent.futures
+import contextlib
+import itertools
+import os
+import pathlib
+import struct
+from typing import BinaryIO, ContextManager, NamedTuple, Optional, Sequence, Union
+
+import numpy as np
+import pydicom
+import pydicom.uid
+from numpy.typing import NDArray
+
+PathLike = Union[str, os.PathLike[str]]
+Source = Union[pathlib.Path, BinaryIO]
+TagLike = Union[str, int]
+
+# Always read, so that the series is able to be sorted
+SORTING_KEYWORDS = ("ImagePositionPatient", "ImageOrientationPatient")
+
+# Whether or not each transfer syntax whose pixel data is able to be read
+# directly is implicit VR
+_NATIVE_TRANSFER_SYNTAXES = {
+    pydicom.uid.ExplicitVRLittleEndian: False,
+    pydicom.uid.ImplicitVRLittleEndian: True,
+}
+
+
+class HeaderSeries(NamedTuple):
+    """The headers of an image series, sorted by slice position.
+
+    Attributes
+    ----------
+    paths : list[pathlib.Path or file-like]
+        The path, or file-like object, of each header.
+    headers : list[pydicom.Dataset]
+        The headers, without their pixel data.
+    positions : NDArray[np.float64]
+        The position of each slice along the slice normal, ascending.
+    """
+
+    paths: list[Source]
+    headers: list[pydicom.Dataset]
+    positions: NDArray[np.float64]
+
+
+class ImageSeries(NamedTuple):
+    """The headers and images of an image series, sorted by slice
+    position.
+
+    Attributes
+    ----------
+    paths : list[pathlib.Path or file-like]
+        The path, or file-like object, of each slice.
+    headers : list[pydicom.Dataset]
+        The headers, read up to their pixel data.
+    positions : NDArray[np.float64]
+        The position of each slice along the slice normal, ascending.
+    image_stack : NDArray[np.int16]
+        A (z, y, x) volume of the rescaled pixel values, such as
+        Hounsfield units for CT.
+    """
+
+    paths: list[Source]
+    headers: list[pydicom.Dataset]
+    positions: NDArray[np.float64]
+    image_stack: NDArray[np.int16]
+
+
+def read_headers(
+    paths: Sequence[Union[PathLike, BinaryIO]],
+    specific_tags: Optional[Sequence[TagLike]] = None,
+    max_workers: Optional[int] = None,
+) -> HeaderSeries:
+    """Read the headers of an image series, sorted by slice position.
+
+    Each file is read up to, but not including, its pixel data. Paths
+    are distributed across a process pool. File-like objects, which
+    would otherwise need to be copied into each process, are instead
+    read across a thread pool.
+
+    Parameters
+    ----------
+    paths : sequence of path-like or file-like
+        The files of a single image series, in any order, such as those
+        opened from a `rai.data.pack.Pack`.
+    specific_tags : sequence of str or int, optional
+        Only read these elements, such as ``["StudyInstanceUID"]``,
+        along with those needed for sorting. Defaults to every element
+        before the pixel data.
+    max_workers : int, optional
+        The number of processes, or threads for file-like objects, used.
+        Defaults to the number of CPUs. When set to 1 the headers are
+        read within the current thread.
+
+    Returns
+    -------
+    HeaderSeries
+    """
+
+    tags = _with_sorting_tags(specific_tags)
+    resolved = _resolve(paths)
+
+    if max_workers is None:
+        max_workers = os.cpu_count() or 1
+
+    if max_workers == 1:
+        headers = [_read_header(path, tags) for path in resolved]
+    elif not all(isinstance(path, pathlib.Path) for path in resolved):
+        with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+            headers = list(executor.map(_read_header, resolved, itertools.repeat(tags)))
+    else:
+        with concurrent.futures.ProcessPoolExecutor(
+            max_workers=max_workers
+        ) as executor:
+            headers = list(
+                executor.map(
+                    _read_header,
+                    resolved,
+                    itertools.repeat(tags),
+                    chunksize=max(1, len(resolved) // (4 * max_workers)),
+                )
+            )
+
+    order, positions = _sort(headers)
+
+    return HeaderSeries(
+        paths=[resolved[i] for i in order],
+        headers=[headers[i] for i in order],
+        positions=positions,
+    )
+
+
+def read_image_series(
+    paths: Sequence[Union[PathLike, BinaryIO]], max_workers: Optional[int] = None
+) -> ImageSeries:
+    """Read the headers and images of an image series, sorted by slice
+    position.
+
+    Each file is read up to its pixel data, which for uncompressed
+    little endian files is then read directly, rather than through
+    pydicom. It is rescaled by its RescaleSlope and RescaleIntercept and
+    written straight into a single preallocated volume. Files are
+    distributed across a thread pool, with the volume reordered in place
+    once every slice position is known.
+
+    Any bits beyond BitsStored are cleared, or for signed pixels filled
+    with their sign, whichever the major version of pydicom.
+
+    Parameters
+    ----------
+    paths : sequence of path-like or file-like
+        The files of a single image series, in any order, such as those
+        opened from a `rai.data.pack.Pack`. Each needs to have the same
+        Rows and Columns.
+    max_workers : int, optional
+        The number of threads used to read and decode files, defaults
+        to the number of CPUs.
+
+    Returns
+    -------
+    ImageSeries
+    """
+
+    resolved = _resolve(paths)
+    if not resolved:
+        raise ValueError("At least one path needs to be provided")
+
+    image_stack = np.empty((0, 0, 0), dtype=np.int16)
+
+    def _read_slice(index: int):
+        nonlocal image_stack
+
+        with _open(resolved[index]) as fp:
+            header = pydicom.dcmread(fp, stop_before_pixels=True)
+
+            # The first file determines the shape of the volume
+            if index == 0:
+                image_stack = np.empty(
+                    (len(resolved), header.Rows, header.Columns), dtype=np.int16
+                )
+
+            _read_pixels_into(fp, header, image_stack[index], resolved[index])
+
+        return header
+
+    first = _read_slice(0)
+
+    if max_workers is None:
+        max_workers = os.cpu_count()
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+        headers = [first] + list(executor.map(_read_slice, range(1, len(resolved))))
+
+    order, positions = _sort(headers)
+    _permute_in_place(image_stack, order)
+
+    return ImageSeries(
+        paths=[resolved[i] for i in order],
+        headers=[headers[i] for i in order],
+        positions=positions,
+        image_stack=image_stack,
+    )
+
+
+def _resolve(paths: Sequence[Union[PathLike, BinaryIO]]) -> list[Source]:
+    return [
+        pathlib.Path(path) if isinstance(path, (str, os.PathLike)) else path
+        for path in paths
+    ]
+
+
+def _with_sorting_tags(specific_tags: Optional[Sequence[TagLike]]):
+    if specific_tags is None:
+        return None
+
+    return list(specific_tags) + [
+        keyword for keyword in SORTING_KEYWORDS if keyword not in specific_tags
+    ]
+
+
+def _read_header(path: Source, specific_tags: Optional[list[TagLike]]):
+    return pydicom.dcmread(path, stop_before_pixels=True, specific_tags=specific_tags)
+
+
+def _open(source: Source) -> ContextManager[BinaryIO]:
+    if isinstance(source, pathlib.Path):
+        return open(source, "rb")
+
+    return contextlib.nullcontext(source)
+
+
+def _read_pixels_into(
+    fp: BinaryIO, header: pydicom.Dataset, out: NDArray[np.int16], source: Source
+):
+    """Rescale the pixels of a file, read up to its pixel data, into
+    the given slice of the volume."""
+
+    if (header.Rows, header.Columns) != out.shape:
+        raise ValueError(
+            f"Each image needs to be {out.shape}, however {source} "
+            f"was {(header.Rows, header.Columns)}"
+        )
+
+    pixels = _read_native_pixels(fp, header)
+    if pixels is None:
+        fp.seek(0)
+        pixels = pydicom.dcmread(fp).pixel_array
+
+    pixels = _extend_stored_bits(pixels, header)
+
+    slope = float(header.get("RescaleSlope", 1))
+    intercept = float(header.get("RescaleIntercept", 0))
+
+    if slope == 1 and intercept.is_integer():
+        np.add(pixels, np.int32(intercept), out=out, casting="unsafe")
+    else:
+        np.rint(pixels * slope + intercept, out=out, casting="unsafe")
+
+
+def _read_native_pixels(
+    fp: BinaryIO, header: pydicom.Dataset
+) -> Optional[NDArray[np.integer]]:
+    """Read uncompressed, little endian, single frame 16 bit pixel data
+    directly, without pydicom creating an element for it.
+
+    Buffers that expose ``getbuffer``, such as files opened from a
+    `rai.data.pack.Pack`, are viewed without being copied. Returns None
+    for any other encoding, for which pydicom's decoding is needed.
+    """
+
+    file_meta = getattr(header, "file_meta", None)
+    transfer_syntax = None if file_meta is None else file_meta.get("TransferSyntaxUID")
+    if (
+        transfer_syntax not in _NATIVE_TRANSFER_SYNTAXES
+        or header.get("SamplesPerPixel", 1) != 1
+        or int(header.get("NumberOfFrames", 1)) != 1
+        or header.get("BitsAllocated") != 16
+    ):
+        return None
+
+    implicit = _NATIVE_TRANSFER_SYNTAXES[transfer_syntax]
+    element_header = fp.read(8 if implicit else 12)
+    if len(element_header) < 8:
+        return None
+
+    group, element = struct.unpack_from("<2H", element_header)
+    (length,) = struct.unpack_from("<L", element_header, 4 if implicit else 8)
+
+    count = header.Rows * header.Columns
+    if (group, element) != (0x7FE0, 0x0010) or length < 2 * count:
+        return None
+
+    dtype = np.dtype("<i2" if header.get("PixelRepresentation") == 1 else "<u2")
+    if hasattr(fp, "getbuffer"):
+        pixels = np.frombuffer(
+            fp.getbuffer(), dtype=dtype, count=count, offset=fp.tell()  # type: ignore
+        )
+    else:
+        pixels = np.empty(count, dtype=dtype)
+        if fp.readinto(pixels) != pixels.nbytes:  # type: ignore
+            return None
+
+    return pixels.reshape(header.Rows, header.Columns)
+
+
+def _extend_stored_bits(
+    pixels: NDArray[np.integer], header: pydicom.Dataset
+) -> NDArray[np.integer]:
+    """Clear any bits beyond those stored, or for signed pixels extend
+    the sign into them.
+
+    pydicom 3 does so when decoding, however pydicom 2 does not, so this
+    is applied to pixels from either, as well as those read directly.
+    """
+
+    unused_bits = pixels.dtype.itemsize * 8 - header.get("BitsStored", 16)
+    if unused_bits > 0:
+        pixels = (pixels << unused_bits) >> unused_bits
+
+    return pixels
+
+
+def _sort(headers: Sequence[pydicom.Dataset]):
+    """The order of the headers along the slice normal, and the
+    position of each slice along it once sorted."""
+
+    if not headers:
+        return np.zeros(0, dtype=int), np.zeros(0)
+
+    orientation = np.asarray(headers[0].ImageOrientationPatient, dtype=float)
+    normal = np.cross(orientation[:3], orientation[3:])
+
+    image_positions = np.array(
+        [header.ImagePositionPatient for header in headers], dtype=float
+    )
+    positions = image_positions @ normal
+    order = np.argsort(positions, kind="stable")
+
+    return order, positions[order]
+
+
+def _permute_in_place(volume: NDArray[np.int16], order: NDArray[np.int_]):
+    """Reorder the slices of a volume so that ``volume[k]`` becomes
+    ``volume[order[k]]``, following each cycle of the permutation with
+    only a single slice buffered."""
+
+    visited = np.zeros(len(order), dtype=bool)
+    for start, first_source in enumerate(order):
+        if visited[start] or first_source == start:
+            continue
+
+        buffer = volume[start].copy()
+        index = start
+        while True:
+            visited[index] = True
+            source = order[index]
+            if source == start:
+                volume[index] = buffer
+                break
+
+            volume[index] = volume[source]
+            index = source
@@ -0,0 +1,171 @@
+# Copyright (C) 2022 Radiotherapy AI Holdings Pty Ltd
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+"""Testing the reading of Contour Data"""
+
+import io
+
+import numpy as np
+import pydicom
+import pydicom.config
+import pydicom.dataelem
+import pydicom.filebase
+import pydicom.filereader
+import pydicom.filewriter
+import pytest
+
+from . import append, contour_data, ds
+from .typing import TypedDataset
+
+
+def test_decode_ds():
+    """Test the decoding of the various forms a DS is able to take"""
+
+    decoded = ds.decode(b"1.5\\-2e-3\\ 3 \\+4.0E1\\0 ")
+    assert np.array_equal(decoded, [1.5, -0.002, 3, 40, 0])
+
+    assert len(ds.decode(b"")) == 0
+
+    with pytest.raises(ValueError, match="'abc'"):
+        ds.decode(b"1\\abc\\2")
+
+
+def test_encode_ds():
+    """Test that encoded values round trip, and that each array is
+    encoded as its own element"""
+
+    encoded = ds.encode([1.5, -0.002, 3.0, 40, 0, -0.00001])
+    assert encoded == b"1.5\\-0.002\\3\\40\\0\\0 "
+
+    values = np.random.default_rng(42).uniform(-1e5, 1e5, (1000, 3)).round(4)
+    assert np.array_equal(ds.decode(ds.encode(values)), values.ravel())
+
+    assert ds.encode([np.pi, -np.e], decimals=2) == b"3.14\\-2.72"
+
+    # Every value is within the 16 byte limit, with large values
+    # rounded to fewer decimal places.
+    large = np.array([123456789.123456789, -98765432109.87654321, 1e-20])
+    encoded = ds.encode(large, decimals=10)
+    assert encoded == b"123456789.123457\\-98765432109.877\\0 "
+    assert encoded == ds.encode(large.copy(), decimals=10)
+
+    for invalid in (np.nan, np.inf, 1e16):
+        with pytest.raises(ValueError):
+            ds.encode([invalid])
+
+    # The minus sign takes up one of the 16 characters
+    assert ds.encode([-999999999999999.0]) == b"-999999999999999"
+    with pytest.raises(ValueError, match="including any minus sign"):
+        ds.encode([-1e15])
+
+    arrays = [values[:10], np.zeros((0, 3)), values[10:11], values[11:]]
+    encoded = ds.encode_many(arrays)
+
+    assert encoded[1] == b""
+    for array, item in zip(arrays, encoded):
+        assert len(item) % 2 == 0
+        assert np.array_equal(ds.decode(item), array.ravel())
+
+
+def test_contour_data_from_file():
+    """Test that ContourData read from a file matches pydicom's own
+    conversion, without converting the raw element"""
+
+    contour = np.random.default_rng(42).uniform(-300, 300, (100, 3))
+    contour[:, 2] = 12.5
+
+    dataset = TypedDataset()
+    append.append_dict_to_dataset(
+        ds=dataset,
+        to_append={
+            "ROIContourSequence": [
+                {"ContourSequence": [{"ContourData": contour.round(4).ravel()}]}
+            ]
+        },
+    )
+
+    in_memory_item = dataset.ROIContourSequence[0].ContourSequence[0]
+    assert np.array_equal(contour_data.to_array(in_memory_item), contour.round(4))
+
+    read_item = _write_and_read(dataset).ROIContourSequence[0].ContourSequence[0]
+
+    tag = pydicom.datadict.tag_for_keyword("ContourData")
+    assert isinstance(read_item.get_item(tag), pydicom.dataelem.RawDataElement)
+
+    parsed = contour_data.to_array(read_item)
+    assert isinstance(read_item.get_item(tag), pydicom.dataelem.RawDataElement)
+
+    assert parsed.shape == (100, 3)
+    assert np.array_equal(
+        parsed.ravel(), np.asarray(read_item.ContourData, dtype=float)
+    )
+
+
+def test_appended_raw_elements_are_written_unconverted(
+    monkeypatch: pytest.MonkeyPatch,
+):
+    """Test that the raw elements of an appended dataset are written as
+    they are, and that raw strings are still validated"""
+
+    dataset = TypedDataset()
+    append.append_dict_to_dataset(
+        ds=dataset,
+        to_append={
+            "ROIContourSequence": [
+                {
+                    "ContourSequence": [
+                        {
+                            "ContourGeometricType": "CLOSED_PLANAR",
+                            "ContourData": np.arange(9, dtype=float),
+                        }
+                    ]
+                }
+            ]
+        },
+    )
+
+    item = dataset.ROIContourSequence[0].ContourSequence[0]
+    tags = list(item.keys())
+
+    # pydicom converts raw elements in place when it needs to re-encode
+    # them
+    read = _write_and_read(dataset)
+    for tag in tags:
+        assert isinstance(item.get_item(tag), pydicom.dataelem.RawDataElement)
+
+    read_item = read.ROIContourSequence[0].ContourSequence[0]
+    assert read_item.ContourGeometricType == "CLOSED_PLANAR"
+    assert np.array_equal(contour_data.to_array(read_item).ravel(), np.arange(9))
+
+    monkeypatch.setattr(
+        pydicom.config.settings, "reading_validation_mode", pydicom.config.RAISE
+    )
+    with pytest.raises(ValueError):
+        append.append_dict_to_dataset(
+            pydicom.Dataset(), {"ContourGeometricType": "closed planar"}
+        )
+
+
+def _write_and_read(dataset: pydicom.Dataset) -> TypedDataset:
+    fp = pydicom.filebase.DicomBytesIO()
+    fp.is_little_endian = True
+    fp.is_implicit_VR = False
+    pydicom.filewriter.write_dataset(fp, dataset)
+
+    read = pydicom.filereader.read_dataset(
+        io.BytesIO(fp.getvalue()), is_implicit_VR=False, is_little_endian=True
+    )
+
+    return read  # pyright: ignore [reportGeneralTypeIssues]
@@ -0,0 +1,83 @@
+# Copyright (C) 2022 Radiotherapy AI Holdings Pty Ltd
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+"""Testing the copying of inherited modules"""
+
+import pydicom
+import pydicom.datadict
+
+from . import _inheritance, append
+
+
+def test_compiled_tags():
+    """Test that every inherited module, and only those, is compiled,
+    with every keyword known to the installed DICOM dictionary"""
+
+    inherited = {
+        name
+        for name, options in _inheritance.RTSTRUCT_DICOM_MODULES.items()
+        if options.inheritance == _inheritance.Inheritance.INHERIT
+    }
+    assert set(_inheritance.INHERITED_TAGS_BY_MODULE) == inherited
+
+    for name in inherited:
+        # Keywords newer than the installed pydicom are skipped
+        known_tags = {
+            pydicom.datadict.tag_for_keyword(keyword)
+            for keyword in _inheritance.INHERITED_MODULE_KEYWORDS[name]
+        } - {None}
+
+        assert known_tags
+        assert _inheritance.INHERITED_TAGS_BY_MODULE[name] == known_tags
+
+
+def test_copy_inherited():
+    """Test that only the inherited elements of a CT header are copied"""
+
+    ct_header = append.append_dict_to_dataset(
+        pydicom.Dataset(),
+        {
+            "PatientName": "Lewis^Clive Staples",
+            "PatientID": "123456",
+            "PatientAge": "064Y",
+            "StudyInstanceUID": "1.2.3.4",
+            "ReferencedStudySequence": [{"ReferencedSOPInstanceUID": "1.2.3.5"}],
+            "FrameOfReferenceUID": "1.2.3.6",
+            "SOPInstanceUID": "1.2.3.7",
+            "SeriesInstanceUID": "1.2.3.8",
+            "Modality": "CT",
+            "SliceThickness": "2.5",
+        },
+    )
+
+    copied = _inheritance.copy_inherited(ct_header)
+
+    assert set(copied.keys()) == {
+        pydicom.datadict.tag_for_keyword(keyword)
+        for keyword in (
+            "PatientName",
+            "PatientID",
+            "PatientAge",
+            "StudyInstanceUID",
+            "ReferencedStudySequence",
+            "FrameOfReferenceUID",
+        )
+    }
+    assert copied.PatientName == "Lewis^Clive Staples"
+    assert copied.ReferencedStudySequence == ct_header.ReferencedStudySequence
+
+    # Sequences are copied rather than shared
+    copied.ReferencedStudySequence[0].ReferencedSOPInstanceUID = "9.9"
+    assert ct_header.ReferencedStudySequence[0].ReferencedSOPInstanceUID == "1.2.3.5"
@@ -0,0 +1,249 @@
+# Copyright (C) 2022 Radiotherapy AI Holdings Pty Ltd
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+"""Testing the lazy reading of RT Structure Sets"""
+
+import pathlib
+
+import numpy as np
+import pydicom
+import pydicom.uid
+import pytest
+
+from . import append, contour_data
+from ._encoding import original_encoding
+from .rtstruct import LazyStructureSet, StructureSetWriter
+from .typing import TypedDataset
+
+ROI_NAMES = ["Brainstem", "Parotid_L", "Lens_R"]
+IMAGE_UIDS = ["1.2.3.4.1", "1.2.3.4.2", "1.2.3.4.3"]
+
+
+@pytest.mark.parametrize(
+    "transfer_syntax",
+    [pydicom.uid.ExplicitVRLittleEndian, pydicom.uid.ImplicitVRLittleEndian],
+)
+@pytest.mark.parametrize("use_mmap", [True, False])
+def test_lazy_structure_set(
+    tmp_path: pathlib.Path, transfer_syntax: str, use_mmap: bool
+):
+    """Test that the lazily indexed contours match those read by pydicom"""
+
+    path = tmp_path / "RS.dcm"
+    _write_structure_set(path, transfer_syntax)
+
+    read = pydicom.dcmread(path)
+    dataset: TypedDataset = read  # pyright: ignore [reportGeneralTypeIssues]
+
+    with LazyStructureSet(path, use_mmap=use_mmap) as structure_set:
+        assert structure_set.roi_names == ROI_NAMES
+
+        for name, roi_contour in zip(ROI_NAMES, dataset.ROIContourSequence):
+            expected = [
+                contour_data.to_array(item) for item in roi_contour.ContourSequence
+            ]
+            lazily_read = structure_set.contour_data(name)
+
+            assert len(lazily_read) == len(expected)
+            for lazy, full in zip(lazily_read, expected):
+                assert np.array_equal(lazy, full)
+
+            by_image_uid = structure_set.contours_by_image_uid(name)
+            assert sorted(by_image_uid) == IMAGE_UIDS
+
+        with pytest.raises(KeyError):
+            structure_set.roi("Not a structure")
+
+
+def test_not_dicom(tmp_path: pathlib.Path):
+    """Test that files without a DICOM preamble are rejected"""
+
+    path = tmp_path / "not_dicom.dcm"
+    path.write_bytes(b"\x00" * 256)
+
+    with pytest.raises(ValueError):
+        LazyStructureSet(path)
+
+
+def test_structure_set_writer(tmp_path: pathlib.Path):
+    """Test that streaming ROIs to file matches writing the whole
+    dataset at once"""
+
+    header, roi_contours = _create_structure_set()
+
+    # Datasets, as well as dictionaries, are able to be written
+    first_roi_contour = append.append_dict_to_dataset(
+        pydicom.Dataset(), roi_contours[0]
+    )
+
+    datasets = (header, first_roi_contour, first_roi_contour.ContourSequence[0])
+    encodings = [original_encoding(dataset) for dataset in datasets]
+
+    streamed_path = tmp_path / "RS-streamed.dcm"
+    with StructureSetWriter(streamed_path, header) as writer:
+        writer.write_roi_contour(first_roi_contour)
+        for roi_contour in roi_contours[1:]:
+            writer.write_roi_contour(roi_contour)
+
+    # Neither the header nor the written items are modified
+    assert [original_encoding(dataset) for dataset in datasets] == encodings
+
+    whole_path = tmp_path / "RS-whole.dcm"
+    _write_structure_set(whole_path, pydicom.uid.ExplicitVRLittleEndian)
+
+    streamed = pydicom.dcmread(streamed_path)
+    whole = pydicom.dcmread(whole_path)
+
+    for keyword in ("Modality", "StructureSetROISequence", "RTROIObservationsSequence"):
+        assert streamed[keyword] == whole[keyword]
+
+    for streamed_item, whole_item in zip(
+        streamed.ROIContourSequence, whole.ROIContourSequence
+    ):
+        assert streamed_item.ReferencedROINumber == whole_item.ReferencedROINumber
+        for streamed_contour, whole_contour in zip(
+            streamed_item.ContourSequence, whole_item.ContourSequence
+        ):
+            assert np.array_equal(
+                contour_data.to_array(streamed_contour),
+                contour_data.to_array(whole_contour),
+            )
+
+    with LazyStructureSet(streamed_path) as structure_set:
+        assert structure_set.roi_names == ROI_NAMES
+
+    # A failure part way through leaves no partially written file
+    failed_path = tmp_path / "RS-failed.dcm"
+    with pytest.raises(RuntimeError):
+        with StructureSetWriter(failed_path, header) as writer:
+            writer.write_roi_contour(roi_contours[0])
+            raise RuntimeError("Inference failed")
+
+    assert not failed_path.exists()
+
+
+def test_structure_set_writer_inheritance(tmp_path: pathlib.Path):
+    """Test that the inherited modules are copied from a CT header read
+    from file, other than those elements already within the header"""
+
+    ct_path = tmp_path / "CT.dcm"
+    ct_header = append.append_dict_to_dataset(
+        pydicom.Dataset(),
+        {
+            "SpecificCharacterSet": "ISO_IR 100",
+            "PatientName": "Müller^Hans",
+            "StudyInstanceUID": "1.2.3.4",
+            "StudyDescription": "CT",
+            "FrameOfReferenceUID": "1.2.3.6",
+            "SeriesInstanceUID": "1.2.3.8",
+            "Modality": "CT",
+        },
+    )
+    file_meta = pydicom.dataset.FileMetaDataset()
+    file_meta.MediaStorageSOPClassUID = pydicom.uid.CTImageStorage
+    file_meta.MediaStorageSOPInstanceUID = "1.2.3.7"
+    file_meta.TransferSyntaxUID = pydicom.uid.ImplicitVRLittleEndian
+
+    ct_header.file_meta = file_meta
+    ct_header.preamble = b"\x00" * 128
+    pydicom.dcmwrite(ct_path, ct_header)
+
+    header, roi_contours = _create_structure_set()
+    append.append_dict_to_dataset(header, {"StudyDescription": "Contoured"})
+
+    path = tmp_path / "RS.dcm"
+    with StructureSetWriter(path, header, ct_header=pydicom.dcmread(ct_path)) as writer:
+        for roi_contour in roi_contours:
+            writer.write_roi_contour(roi_contour)
+
+    written = pydicom.dcmread(path)
+    assert written.PatientName == "Müller^Hans"
+    assert written.StudyInstanceUID == "1.2.3.4"
+    assert written.FrameOfReferenceUID == "1.2.3.6"
+    assert written.StudyDescription == "Contoured"
+    assert written.Modality == "RTSTRUCT"
+    assert "SeriesInstanceUID" not in written
+
+    # The header itself is left unmodified
+    assert "PatientName" not in header
+
+
+def _create_structure_set():
+    rng = np.random.default_rng(42)
+
+    roi_contours: list[dict[str, append.DicomItem]] = []
+    for number, _ in enumerate(ROI_NAMES, start=1):
+        contours: list[append.DicomItem] = []
+        for z, image_uid in enumerate(IMAGE_UIDS):
+            for _ in range(2):
+                contour = rng.uniform(-200, 200, (rng.integers(3, 50), 3)).round(3)
+                contour[:, 2] = 2.5 * z
+
+                contours.append(
+                    {
+                        "ContourImageSequence": [
+                            {"ReferencedSOPInstanceUID": image_uid}
+                        ],
+                        "ContourGeometricType": "CLOSED_PLANAR",
+                        "NumberOfContourPoints": str(len(contour)),
+                        "ContourData": contour.ravel(),
+                    }
+                )
+
+        roi_contours.append(
+            {"ReferencedROINumber": str(number), "ContourSequence": contours}
+        )
+
+    header = TypedDataset()
+    append.append_dict_to_dataset(
+        ds=header,
+        to_append={
+            "SpecificCharacterSet": "ISO_IR 100",
+            "SOPClassUID": pydicom.uid.RTStructureSetStorage,
+            "SOPInstanceUID": "1.2.3.4.5",
+            "Modality": "RTSTRUCT",
+            "StructureSetROISequence": [
+                {"ROINumber": str(number), "ROIName": name}
+                for number, name in enumerate(ROI_NAMES, start=1)
+            ],
+            "RTROIObservationsSequence": [
+                {
+                    "ObservationNumber": str(number),
+                    "ReferencedROINumber": str(number),
+                    "RTROIInterpretedType": "ORGAN",
+                }
+                for number, _ in enumerate(ROI_NAMES, start=1)
+            ],
+        },
+    )
+
+    return header, roi_contours
+
+
+def _write_structure_set(path: pathlib.Path, transfer_syntax: str):
+    dataset, roi_contours = _create_structure_set()
+    append.append_dict_to_dataset(
+        ds=dataset, to_append={"ROIContourSequence": roi_contours}
+    )
+
+    file_meta = pydicom.dataset.FileMetaDataset()
+    file_meta.MediaStorageSOPClassUID = pydicom.uid.RTStructureSetStorage
+    file_meta.MediaStorageSOPInstanceUID = dataset.SOPInstanceUID
+    file_meta.TransferSyntaxUID = transfer_syntax
+
+    dataset.file_meta = file_meta
+    dataset.preamble = b"\x00" * 128
+
+    pydicom.dcmwrite(path, dataset)
@@ -0,0 +1,131 @@
+# Copyright (C) 2022 Radiotherapy AI Holdings Pty Ltd
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+"""Testing the parallel reading of image series"""
+
+import contextlib
+import pathlib
+
+import numpy as np
+import pydicom
+import pydicom.uid
+import pytest
+
+from . import series
+from ._testing import write_series
+from .series import _permute_in_place, _read_native_pixels
+
+
+def test_read_headers(tmp_path: pathlib.Path):
+    """Test that headers are sorted by slice position, with only the
+    requested elements read"""
+
+    paths, z_positions, _ = write_series(tmp_path)
+
+    for max_workers in (1, 2):
+        header_series = series.read_headers(
+            paths, specific_tags=["StudyInstanceUID"], max_workers=max_workers
+        )
+
+        assert np.allclose(header_series.positions, sorted(z_positions))
+        assert [header.ImagePositionPatient[2] for header in header_series.headers] == (
+            sorted(z_positions)
+        )
+
+        header = header_series.headers[0]
+        assert header.StudyInstanceUID == "1.2.3"
+        assert "PatientName" not in header
+        assert "PixelData" not in header
+
+    full = series.read_headers(paths, max_workers=1)
+    assert full.headers[0].PatientName == "Lewis^Clive Staples"
+    assert "PixelData" not in full.headers[0]
+
+    # Open files are unable to be sent to another process, and so are
+    # read across threads instead
+    with contextlib.ExitStack() as stack:
+        files = [stack.enter_context(open(path, "rb")) for path in paths]
+        from_files = series.read_headers(files, max_workers=2)
+
+    assert np.allclose(from_files.positions, sorted(z_positions))
+    assert from_files.paths == [files[i] for i in np.argsort(z_positions)]
+
+
+def test_read_image_series(tmp_path: pathlib.Path):
+    """Test that the rescaled images are sorted into a single volume"""
+
+    paths, z_positions, images = write_series(tmp_path)
+    order = np.argsort(z_positions)
+
+    for max_workers in (1, 2):
+        image_series = series.read_image_series(paths, max_workers=max_workers)
+
+        assert image_series.image_stack.dtype == np.int16
+        assert np.array_equal(image_series.image_stack, images[order] - 1024)
+        assert image_series.paths == [paths[i] for i in order]
+        assert "PixelData" not in image_series.headers[0]
+
+    with pytest.raises(ValueError):
+        series.read_image_series([])
+
+
+@pytest.mark.parametrize(
+    "transfer_syntax",
+    [pydicom.uid.ExplicitVRLittleEndian, pydicom.uid.ImplicitVRLittleEndian],
+)
+def test_native_pixels(tmp_path: pathlib.Path, transfer_syntax: str):
+    """Test that pixels are read directly for uncompressed little endian
+    transfer syntaxes"""
+
+    paths, _, images = write_series(tmp_path, transfer_syntax)
+
+    for path, image in zip(paths, images):
+        with open(path, "rb") as fp:
+            header = pydicom.dcmread(fp, stop_before_pixels=True)
+            pixels = _read_native_pixels(fp, header)
+
+        assert pixels is not None
+        assert np.array_equal(pixels, image)
+
+
+@pytest.mark.parametrize(
+    "transfer_syntax",
+    [pydicom.uid.ExplicitVRLittleEndian, pydicom.uid.ExplicitVRBigEndian],
+)
+def test_signed_stored_bits(tmp_path: pathlib.Path, transfer_syntax: str):
+    """Test that signed pixels with fewer bits stored than allocated
+    have their sign extended, both when read directly and when decoded
+    by pydicom"""
+
+    paths, z_positions, images = write_series(tmp_path, transfer_syntax, signed=True)
+    order = np.argsort(z_positions)
+
+    # The 12 bit two's complement value of each pixel
+    expected = np.where(images >= 2048, images - 4096, images)
+
+    image_series = series.read_image_series(paths, max_workers=1)
+    assert np.array_equal(image_series.image_stack, expected[order] - 1024)
+
+
+def test_permute_in_place():
+    """Test that reordering in place matches fancy indexing"""
+
+    volume = np.random.default_rng(42).integers(-1000, 1000, (20, 3, 3), dtype=np.int16)
+    order = np.random.default_rng(42).permutation(20)
+
+    expected = volume[order]
+    _permute_in_place(volume, order)
+
+    assert np.array_equal(volume, expected)
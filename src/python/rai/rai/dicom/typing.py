@@ -39,8 +39,15 @@ class ContourSequenceItem(pydicom.Dataset):
 
 
 class ROIContourSequenceItem(pydicom.Dataset):
+    ReferencedROINumber: int
     ContourSequence: list[ContourSequenceItem]
 
 
+class StructureSetROISequenceItem(pydicom.Dataset):
+    ROINumber: int
+    ROIName: str
+
+
 class TypedDataset(pydicom.Dataset):
+    StructureSetROISequence: list[StructureSetROISequenceItem]
     ROIContourSequence: list[ROIContourSequenceItem]
@@ -15,17 +15,121 @@
 
 """Mask conversion to and from contour lines"""
 
+import concurrent.futures
+import itertools
+import os
+from typing import Literal, NamedTuple, Optional, Sequence, Union
+
 import numpy as np
 import skimage.draw
 import skimage.measure
 from numpy.typing import NDArray
 
+from .sparse import AnyMask, SparseMask
+
 Contours = list[NDArray[np.float64]]
 Grid = NDArray[np.float64]
 Mask = NDArray[np.uint8]
 
+RasteriseMethod = Literal["supersample", "exact"]
+
+# The midpoint between 0 and 255
+DEFAULT_MASK_LEVEL = 127.5
+
+
+class GridTransform(NamedTuple):
+    """The uniformly spaced coordinates along one axis of a grid.
+
+    Build this once per series with `GridTransform.from_grid`, and then
+    provide it in place of the grid to any of the conversion functions
+    to avoid the grid being validated on every call.
+
+    Attributes
+    ----------
+    origin : float
+        The coordinate of the first pixel.
+    spacing : float
+        The distance between the coordinates of neighbouring pixels.
+    size : int
+        The number of pixels along the axis.
+    """
+
+    origin: float
+    spacing: float
+    size: int
+
+    @classmethod
+    def from_grid(cls, grid: Grid) -> "GridTransform":
+        """Create a transform from the coordinates of each pixel.
+
+        Raises
+        ------
+        ValueError
+            If the grid has fewer than two coordinates, or if its
+            coordinates are not uniformly spaced.
+        """
+
+        if len(grid) < 2:
+            raise ValueError(
+                "A grid needs at least two coordinates to determine its spacing"
+            )
+
+        all_spacings = np.diff(grid)  # pyright: ignore [reportUnknownMemberType]
+        spacing = float(all_spacings[0])
+
+        if not np.allclose(  # pyright: ignore [reportUnknownMemberType]
+            spacing, all_spacings
+        ):
+            raise ValueError(
+                "The grid needs to be uniformly spaced, however its spacing "
+                f"ranged from {np.min(all_spacings)} to {np.max(all_spacings)}"
+            )
+
+        return cls(origin=float(grid[0]), spacing=spacing, size=len(grid))
+
+    def to_grid(self) -> Grid:
+        """The coordinates of each pixel."""
+        return self.origin + self.spacing * np.arange(self.size)
+
+    def coords_to_indices(self, coords: NDArray[np.float64]) -> NDArray[np.float64]:
+        """Convert coordinates into (fractional) pixel indices."""
+        return (coords - self.origin) / self.spacing
+
+    def indices_to_coords(self, indices: NDArray[np.float64]) -> NDArray[np.float64]:
+        """Convert (fractional) pixel indices into coordinates."""
+        return indices * self.spacing + self.origin
+
+    def window(self, indices: slice) -> "GridTransform":
+        """The transform of the pixels within a contiguous slice."""
+        return GridTransform(
+            origin=self.origin + indices.start * self.spacing,
+            spacing=self.spacing,
+            size=indices.stop - indices.start,
+        )
 
-def mask_to_contours(x_grid: Grid, y_grid: Grid, mask: Mask) -> Contours:
+
+AnyGrid = Union[Grid, GridTransform]
+
+
+class CroppedMask(NamedTuple):
+    """A mask cropped to a bounding box within a larger mask."""
+
+    offset: tuple[int, int]
+    mask: Mask
+
+
+# Indexed by [structure][slice]
+ContoursStack = list[list[Contours]]
+# Of shape (structures, z, y, x)
+MaskStack = NDArray[np.uint8]
+
+
+def mask_to_contours(
+    x_grid: AnyGrid,
+    y_grid: AnyGrid,
+    mask: AnyMask,
+    level: float = DEFAULT_MASK_LEVEL,
+) -> Contours:
     """Converts a uint8 anti-aliased mask into a series of contours.
 
     This is a wrapper around `skimage.measure.find_contours` with the
@@ -38,14 +142,18 @@ def mask_to_contours(x_grid: Grid, y_grid: Grid, mask: Mask) -> Contours:
 
     Parameters
     ----------
-    x_grid : NDArray[np.float64]
+    x_grid : NDArray[np.float64] or GridTransform
         The x-coordinates of the mask
-    y_grid : NDArray[np.float64]
+    y_grid : NDArray[np.float64] or GridTransform
         The y-coordinates of the mask
-    mask : NDArray[np.uint8]
+    mask : NDArray[np.uint8] or SparseMask
         A mask between 0-255 where 0 is outside the contours, 255 inside
         the contours and 1-254 represents a pixel that is partially
-        encompassed by the contours.
+        encompassed by the contours. When a SparseMask is provided only
+        its stored window is searched for contours.
+    level : float, optional
+        The mask value at which the contours are drawn, see
+        `raicontours.config.get_mask_level`.
 
     Returns
     -------
@@ -56,24 +164,147 @@ def mask_to_contours(x_grid: Grid, y_grid: Grid, mask: Mask) -> Contours:
 
     """
 
+    return _mask_to_contours(_as_transform(x_grid), _as_transform(y_grid), mask, level)
+
+
+def mask_stack_to_contours_stack(
+    x_grid: AnyGrid,
+    y_grid: AnyGrid,
+    mask_stack: MaskStack,
+    levels: Union[float, Sequence[float]] = DEFAULT_MASK_LEVEL,
+    max_workers: Optional[int] = None,
+) -> Union[list[Contours], ContoursStack]:
+    """Converts a stack of uint8 anti-aliased masks into contours for
+    every slice.
+
+    Each slice is converted with the same algorithm as
+    `mask_to_contours`. Slices without any pixel above their
+    structure's contour level are skipped, every other slice is cropped
+    to the bounding box of its non-zero pixels, and the contour
+    extraction is distributed across a process pool.
+
+    Parameters
+    ----------
+    x_grid : NDArray[np.float64] or GridTransform
+        The x-coordinates of the masks
+    y_grid : NDArray[np.float64] or GridTransform
+        The y-coordinates of the masks
+    mask_stack : NDArray[np.uint8]
+        Either a (z, y, x) stack of masks for a single structure, or a
+        (structures, z, y, x) stack of masks.
+    levels : float or sequence of float, optional
+        Either a single mask level utilised for all structures, or one
+        mask level per structure. For a raicontours model these are
+        given by `raicontours.config.get_mask_levels`.
+    max_workers : int, optional
+        The number of processes used to extract contours, defaults to
+        the number of CPUs. When set to 1 the contours are extracted
+        within the current process.
+
+    Returns
+    -------
+    list of contours
+        Contours per slice, indexed by ``contours[slice]`` for a
+        (z, y, x) mask stack and ``contours[structure][slice]`` for a
+        (structures, z, y, x) mask stack.
+    """
+
+    if mask_stack.ndim == 3:
+        return mask_stack_to_contours_stack(
+            x_grid, y_grid, mask_stack[None, ...], levels, max_workers=max_workers
+        )[0]
+
+    if mask_stack.ndim != 4:
+        raise ValueError(
+            "The mask stack needs to be either (z, y, x) or "
+            f"(structures, z, y, x), however its shape was {mask_stack.shape}"
+        )
+
+    structure_levels = np.broadcast_to(levels, mask_stack.shape[:1])
+
+    x_transform = _as_transform(x_grid)
+    y_transform = _as_transform(y_grid)
+
+    # Contours only exist within slices that have a pixel above their
+    # structure's contour level. This is checked for every slice of
+    # every structure within a single vectorised pass.
+    slices_with_contours = np.argwhere(
+        np.max(mask_stack, axis=(-2, -1)) > structure_levels[:, None]
+    )
+
+    # Cropping prior to distributing the slices means only the
+    # non-zero window of each slice is sent to the workers.
+    sparse_masks = [
+        SparseMask.from_dense(mask_stack[structure_index, slice_index])
+        for structure_index, slice_index in slices_with_contours
+    ]
+    slice_levels = [
+        float(structure_levels[structure_index])
+        for structure_index, _ in slices_with_contours
+    ]
+
+    if max_workers is None:
+        max_workers = os.cpu_count() or 1
+
+    if max_workers == 1:
+        all_contours = [
+            _mask_to_contours(x_transform, y_transform, sparse_mask, level)
+            for sparse_mask, level in zip(sparse_masks, slice_levels)
+        ]
+    else:
+        with concurrent.futures.ProcessPoolExecutor(
+            max_workers=max_workers
+        ) as executor:
+            all_contours = list(
+                executor.map(
+                    _mask_to_contours,
+                    itertools.repeat(x_transform),
+                    itertools.repeat(y_transform),
+                    sparse_masks,
+                    slice_levels,
+                    chunksize=max(1, len(sparse_masks) // (4 * max_workers)),
+                )
+            )
+
+    contours_stack: ContoursStack = [
+        [[] for _ in range(mask_stack.shape[1])] for _ in range(mask_stack.shape[0])
+    ]
+    for (structure_index, slice_index), contours in zip(
+        slices_with_contours, all_contours
+    ):
+        contours_stack[structure_index][slice_index] = contours
+
+    return contours_stack
+
+
+def _mask_to_contours(
+    x_transform: GridTransform,
+    y_transform: GridTransform,
+    mask: AnyMask,
+    level: float,
+) -> Contours:
+    if isinstance(mask, SparseMask):
+        offset = np.array(mask.offset)
+        mask = mask.data
+    else:
+        offset = np.zeros(2)
+
     # The mask is padded so as to force contour closure around the mask
-    # edge
+    # edge. Given the pixels outside of a sparse mask's window are all
+    # zero, padding just the window results in the same contours.
     padded_mask = np.pad(mask, 1)  # pyright: ignore [reportUnknownMemberType]
 
     contours_coords_padded_image_frame = skimage.measure.find_contours(
-        padded_mask, level=127.5
+        padded_mask, level=level
     )
     contours_coords_image_frame = [
-        item - 1 for item in contours_coords_padded_image_frame
+        item - 1 + offset for item in contours_coords_padded_image_frame
     ]
 
-    x0, dx = _grid_to_transform(x_grid)
-    y0, dy = _grid_to_transform(y_grid)
-
     contours: list[NDArray[np.float64]] = []
     for yx_coords in contours_coords_image_frame:
-        yx_coords[:, 1] = yx_coords[:, 1] * dx + x0
-        yx_coords[:, 0] = yx_coords[:, 0] * dy + y0
+        yx_coords[:, 1] = x_transform.indices_to_coords(yx_coords[:, 1])
+        yx_coords[:, 0] = y_transform.indices_to_coords(yx_coords[:, 0])
 
         contours.append(yx_coords)
 
@@ -81,15 +312,19 @@ def mask_to_contours(x_grid: Grid, y_grid: Grid, mask: Mask) -> Contours:
 
 
 def contours_to_mask(
-    x_grid: Grid, y_grid: Grid, contours: Contours, expansion: int = 16
+    x_grid: AnyGrid,
+    y_grid: AnyGrid,
+    contours: Contours,
+    expansion: int = 16,
+    method: RasteriseMethod = "supersample",
 ) -> Mask:
     """Creates a uint8 anti-aliased mask from a list of contours.
 
     Parameters
     ----------
-    x_grid : NDArray[np.float64]
+    x_grid : NDArray[np.float64] or GridTransform
         The x-coordinates of the resulting mask
-    y_grid : NDArray[np.float64]
+    y_grid : NDArray[np.float64] or GridTransform
         The y-coordinates of the resulting mask
     contours : list of (n,2)-ndarrays in row column (y x) order
         A list of contours where each contour is an ndarray of shape
@@ -99,7 +334,18 @@ def contours_to_mask(
         default value results in 16 x 16 = 256 possible values for each
         pixel after it has been averaged back to the original size. This
         causes the least amount of information loss when storing the
-        resulting mask as a uint8.
+        resulting mask as a uint8. Only utilised by the "supersample"
+        method.
+    method : {"supersample", "exact"}, optional
+        How the partial coverage of edge pixels is determined. The
+        "supersample" method draws the contours on a grid that is
+        ``expansion`` times larger in each axis and then averages it
+        back down. The "exact" method instead analytically determines
+        the fraction of each pixel's area that is within the contours,
+        which only requires memory in proportion to the resulting
+        mask. The two closely agree, other than within pixels crossed
+        by the edges of overlapping contours, or by the crossing edges
+        of a self-intersecting contour.
 
     Returns
     -------
@@ -109,55 +355,481 @@ def contours_to_mask(
         encompassed by the contours.
     """
 
-    # By creating a binary mask on an expanded grid first, and then
-    # shrinking it back down with an np.mean function edge pixels end up
-    # being scaled between 0 and 1 based on how much a given pixel is
-    # within the contour.
-    expanded_mask = _contours_to_expanded_mask(x_grid, y_grid, contours, expansion)
-    float_mask = skimage.measure.block_reduce(
-        expanded_mask, block_size=(expansion, expansion), func=np.mean
-    )
+    x_transform = _as_transform(x_grid)
+    y_transform = _as_transform(y_grid)
 
-    mask = np.round(  # pyright: ignore [reportUnknownMemberType]
-        float_mask * 255
-    ).astype(np.uint8)
+    mask = np.zeros((y_transform.size, x_transform.size), dtype=np.uint8)
+    _contours_to_mask_in_place(
+        x_transform, y_transform, contours, expansion, method, out=mask
+    )
 
     return mask
 
 
-def _contours_to_expanded_mask(
-    x_grid: Grid, y_grid: Grid, contours: Contours, expansion: int
+def contours_to_cropped_mask(
+    x_grid: AnyGrid,
+    y_grid: AnyGrid,
+    contours: Contours,
+    expansion: int = 16,
+    method: RasteriseMethod = "supersample",
+) -> CroppedMask:
+    """Creates a uint8 anti-aliased mask that is cropped to the bounding
+    box of the contours.
+
+    Only the pixels within the bounding box are rasterised, so the cost
+    of small structures is governed by the number of pixels they touch
+    rather than by the size of the image.
+
+    Parameters
+    ----------
+    x_grid : NDArray[np.float64] or GridTransform
+        The x-coordinates of the full mask
+    y_grid : NDArray[np.float64] or GridTransform
+        The y-coordinates of the full mask
+    contours : list of (n,2)-ndarrays in row column (y x) order
+        A list of contours where each contour is an ndarray of shape
+        (n, 2)
+    expansion : int, optional
+        See `contours_to_mask`.
+    method : {"supersample", "exact"}, optional
+        See `contours_to_mask`.
+
+    Returns
+    -------
+    offset : tuple[int, int]
+        The (row, column) index within the full mask of the first pixel
+        of the cropped mask.
+    mask : NDArray[np.uint8]
+        The cropped mask, which is identical to
+        ``full_mask[row:row + mask.shape[0], column:column + mask.shape[1]]``
+        where ``full_mask`` is the result of `contours_to_mask`.
+    """
+
+    x_transform = _as_transform(x_grid)
+    y_transform = _as_transform(y_grid)
+
+    rows, columns = _contours_to_window(x_transform, y_transform, contours)
+
+    mask = np.zeros(
+        (rows.stop - rows.start, columns.stop - columns.start), dtype=np.uint8
+    )
+    _rasterise_window(
+        x_transform, y_transform, rows, columns, contours, expansion, method, out=mask
+    )
+
+    return CroppedMask(offset=(rows.start, columns.start), mask=mask)
+
+
+def contours_to_sparse_mask(
+    x_grid: AnyGrid,
+    y_grid: AnyGrid,
+    contours: Contours,
+    expansion: int = 16,
+    method: RasteriseMethod = "supersample",
+) -> SparseMask:
+    """Creates a uint8 anti-aliased SparseMask from a list of contours.
+
+    This is `contours_to_cropped_mask` with the result recorded as a
+    SparseMask of the full grid's shape.
+    """
+
+    x_transform = _as_transform(x_grid)
+    y_transform = _as_transform(y_grid)
+
+    offset, mask = contours_to_cropped_mask(
+        x_transform, y_transform, contours, expansion=expansion, method=method
+    )
+
+    return SparseMask(
+        shape=(y_transform.size, x_transform.size), offset=offset, data=mask
+    )
+
+
+def contours_stack_to_mask_stack(
+    x_grid: AnyGrid,
+    y_grid: AnyGrid,
+    contours_stack: ContoursStack,
+    expansion: int = 16,
+    method: RasteriseMethod = "supersample",
+    max_workers: Optional[int] = None,
+) -> MaskStack:
+    """Creates a stack of uint8 anti-aliased masks for every slice of
+    every structure within a series.
+
+    Each slice is rasterised with the same algorithm as
+    `contours_to_mask`, with only the bounding box of each slice's
+    contours written directly into a single preallocated output array.
+    Slices are distributed across a thread pool, and slices without any
+    contours are skipped entirely.
+
+    Parameters
+    ----------
+    x_grid : NDArray[np.float64] or GridTransform
+        The x-coordinates of the resulting masks
+    y_grid : NDArray[np.float64] or GridTransform
+        The y-coordinates of the resulting masks
+    contours_stack : list of list of contours
+        Indexed by ``contours_stack[structure][slice]``, where each
+        item is a list of (n,2)-ndarrays in row column (y x) order. All
+        structures must have the same number of slices.
+    expansion : int, optional
+        See `contours_to_mask`.
+    method : {"supersample", "exact"}, optional
+        See `contours_to_mask`.
+    max_workers : int, optional
+        The number of threads used to rasterise slices, defaults to
+        the number of CPUs.
+
+    Returns
+    -------
+    NDArray[np.uint8]
+        A (structures, z, y, x) stack of masks where each slice is as
+        returned by `contours_to_mask`.
+    """
+
+    num_slices = {len(contours_by_slice) for contours_by_slice in contours_stack}
+    if len(num_slices) > 1:
+        raise ValueError(
+            "Each structure needs to have the same number of slices, "
+            f"however the following slice counts were provided: {num_slices}"
+        )
+
+    x_transform = _as_transform(x_grid)
+    y_transform = _as_transform(y_grid)
+
+    shape = (
+        len(contours_stack),
+        num_slices.pop() if num_slices else 0,
+        y_transform.size,
+        x_transform.size,
+    )
+    mask_stack = np.zeros(shape, dtype=np.uint8)
+
+    def _rasterise_slice(index: tuple[int, int]):
+        structure_index, slice_index = index
+        _contours_to_mask_in_place(
+            x_transform,
+            y_transform,
+            contours_stack[structure_index][slice_index],
+            expansion,
+            method,
+            out=mask_stack[structure_index, slice_index],
+        )
+
+    indices_to_rasterise = [
+        (structure_index, slice_index)
+        for structure_index, contours_by_slice in enumerate(contours_stack)
+        for slice_index, contours in enumerate(contours_by_slice)
+        if len(contours) > 0
+    ]
+
+    if max_workers is None:
+        max_workers = os.cpu_count()
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+        # Consume the iterator so that any raised errors are propagated
+        for _ in executor.map(_rasterise_slice, indices_to_rasterise):
+            pass
+
+    return mask_stack
+
+
+def _contours_to_mask_in_place(
+    x_transform: GridTransform,
+    y_transform: GridTransform,
+    contours: Contours,
+    expansion: int,
+    method: RasteriseMethod,
+    out: Mask,
 ):
-    expanded_mask_size = (len(y_grid) * expansion, len(x_grid) * expansion)
+    rows, columns = _contours_to_window(x_transform, y_transform, contours)
+    _rasterise_window(
+        x_transform,
+        y_transform,
+        rows,
+        columns,
+        contours,
+        expansion,
+        method,
+        out=out[rows, columns],
+    )
+
+
+def _contours_to_window(
+    x_transform: GridTransform,
+    y_transform: GridTransform,
+    contours: Contours,
+):
+    """Determine the rows and columns of pixels that are able to be
+    touched by the contours.
+
+    Pixel ``i`` covers the index space from ``i - 0.5`` to ``i + 0.5``.
+    """
+
+    if not contours:
+        return slice(0, 0), slice(0, 0)
+
+    all_yx_coords = np.concatenate(  # pyright: ignore [reportUnknownMemberType]
+        contours
+    )
+    i = y_transform.coords_to_indices(all_yx_coords[:, 0])
+    j = x_transform.coords_to_indices(all_yx_coords[:, 1])
+
+    return _index_window(i, y_transform.size), _index_window(j, x_transform.size)
+
+
+def _index_window(index_coords: NDArray[np.float64], size: int):
+    """The pixels, clipped to the grid, that a range of index coordinates
+    spans along a single axis."""
+
+    start = int(np.clip(np.floor(np.min(index_coords) + 0.5), 0, size))
+    stop = int(np.clip(np.ceil(np.max(index_coords) + 0.5), start, size))
+
+    return slice(start, stop)
+
+
+def _rasterise_window(
+    x_transform: GridTransform,
+    y_transform: GridTransform,
+    rows: slice,
+    columns: slice,
+    contours: Contours,
+    expansion: int,
+    method: RasteriseMethod,
+    out: Mask,
+):
+    """Rasterise the contours into the window of the full grid given by
+    rows and columns, writing the result into out."""
+
+    window_x_transform = x_transform.window(columns)
+    window_y_transform = y_transform.window(rows)
+
+    if method == "supersample":
+        float_mask = _supersampled_coverage(
+            window_x_transform, window_y_transform, contours, expansion
+        )
+    elif method == "exact":
+        float_mask = _exact_coverage(window_x_transform, window_y_transform, contours)
+    else:
+        raise ValueError(f"Unknown rasterisation method: {method}")
 
-    x0, dx = _grid_to_transform(x_grid)
-    y0, dy = _grid_to_transform(y_grid)
+    out[...] = np.round(float_mask * 255)  # pyright: ignore [reportUnknownMemberType]
 
-    expanded_mask = np.zeros(expanded_mask_size)
+
+def _supersampled_coverage(
+    x_transform: GridTransform,
+    y_transform: GridTransform,
+    contours: Contours,
+    expansion: int,
+):
+    # By creating a binary mask on an expanded grid first, and then
+    # shrinking it back down with a mean over each block, edge pixels
+    # end up being scaled between 0 and 1 based on how much a given
+    # pixel is within the contour.
+    expanded_mask = _contours_to_expanded_mask(
+        x_transform, y_transform, contours, expansion
+    )
+
+    # Equivalent to `skimage.measure.block_reduce` with `np.mean`, but
+    # counting within a reshaped view avoids a float64 copy of the
+    # expanded mask.
+    blocks_shape = (y_transform.size, expansion, x_transform.size, expansion)
+    block_counts = expanded_mask.reshape(blocks_shape).sum(axis=(1, 3), dtype=np.uint32)
+
+    return block_counts / (expansion * expansion)
+
+
+def _exact_coverage(
+    x_transform: GridTransform,
+    y_transform: GridTransform,
+    contours: Contours,
+):
+    """Determine the exact fraction of each pixel's area that is within
+    the contours.
+
+    The coverage of each contour is accumulated within its own bounding
+    box, and its absolute value taken, so that every region that a
+    contour winds around is covered whichever its direction, as for the
+    nonzero fill rule. Both lobes of a self-intersecting figure of eight
+    are therefore covered. The coverage of all contours is then summed
+    and clipped at 1, so that overlapping contours are combined as a
+    union. This is exact everywhere except within pixels crossed by the
+    edges of two overlapping contours, or by two edges of the same
+    self-intersecting contour, where the coverage is an approximation.
+    """
+    shape = (y_transform.size, x_transform.size)
+    coverage = np.zeros(shape)
 
     for yx_coords in contours:
-        y = yx_coords[:, 0]
-        x = yx_coords[:, 1]
+        if len(yx_coords) < 3:
+            continue
+
+        # Shift by half a pixel so that pixel (r, c) spans the unit
+        # square from (r, c) to (r + 1, c + 1).
+        rc_coords = np.empty_like(yx_coords)
+        rc_coords[:, 0] = y_transform.coords_to_indices(yx_coords[:, 0]) + 0.5
+        rc_coords[:, 1] = x_transform.coords_to_indices(yx_coords[:, 1]) + 0.5
+
+        window = tuple(
+            slice(
+                max(int(np.floor(np.min(rc_coords[:, axis]))), 0),
+                min(int(np.ceil(np.max(rc_coords[:, axis]))), size),
+            )
+            for axis, size in enumerate(shape)
+        )
+        rows, columns = window
+        if rows.stop <= rows.start or columns.stop <= columns.start:
+            continue
 
-        i = ((y - y0) / dy) * expansion + (expansion - 1) * 0.5
-        j = ((x - x0) / dx) * expansion + (expansion - 1) * 0.5
+        rc_coords -= [rows.start, columns.start]
+        rc_next = np.roll(  # pyright: ignore [reportUnknownMemberType]
+            rc_coords, -1, axis=0
+        )
 
-        ij_points = np.concatenate(  # pyright: ignore [reportUnknownMemberType]
-            [i[:, None], j[:, None]], axis=-1
+        coverage[window] += np.abs(
+            _accumulate_signed_areas(
+                rc_coords,
+                rc_next,
+                (rows.stop - rows.start, columns.stop - columns.start),
+            )
         )
 
-        expanded_mask = np.logical_or(
-            expanded_mask,
-            skimage.draw.polygon2mask(expanded_mask_size, ij_points),
+    return np.clip(coverage, 0, 1)
+
+
+def _accumulate_signed_areas(
+    starts: NDArray[np.float64],
+    ends: NDArray[np.float64],
+    shape: tuple[int, int],
+):
+    """Accumulate the signed area to the right of every edge, in pixel
+    index space, into the pixels of the grid.
+
+    Every edge is split at each pixel boundary it crosses. Each
+    resulting piece then adds its signed height multiplied by the
+    fraction of its pixel that lies to its right into that pixel, and
+    its full signed height into every pixel further along the row.
+    Rather than writing into every pixel along the row, only the change
+    is recorded, and a cumulative sum along each row then produces the
+    coverage.
+    """
+
+    coverage_changes = np.zeros(shape[0] * (shape[1] + 1))
+    edge_indices, t = _split_edges_at_pixel_boundaries(starts, ends, shape)
+
+    deltas = ends - starts
+    piece_starts = starts[edge_indices[:-1]] + t[:-1, None] * deltas[edge_indices[:-1]]
+    piece_ends = starts[edge_indices[1:]] + t[1:, None] * deltas[edge_indices[1:]]
+
+    same_edge = edge_indices[:-1] == edge_indices[1:]
+    piece_starts = piece_starts[same_edge]
+    piece_ends = piece_ends[same_edge]
+
+    midpoints = (piece_starts + piece_ends) / 2
+    rows = np.floor(midpoints[:, 0]).astype(np.intp)
+    columns = np.floor(midpoints[:, 1]).astype(np.intp)
+    heights = piece_ends[:, 0] - piece_starts[:, 0]
+
+    within_rows = (rows >= 0) & (rows < shape[0]) & (columns < shape[1])
+    rows = rows[within_rows]
+    columns = columns[within_rows]
+    heights = heights[within_rows]
+    column_midpoints = midpoints[within_rows, 1]
+
+    # Pieces to the left of the grid contribute their full height to
+    # every pixel within the row.
+    left_of_grid = columns < 0
+    columns[left_of_grid] = 0
+    right_fraction = np.where(left_of_grid, 1, columns + 1 - column_midpoints)
+
+    row_starts = rows * (shape[1] + 1)
+    coverage_changes += np.bincount(
+        row_starts + columns,
+        weights=heights * right_fraction,
+        minlength=coverage_changes.size,
+    )
+    coverage_changes += np.bincount(
+        row_starts + columns + 1,
+        weights=heights * (1 - right_fraction),
+        minlength=coverage_changes.size,
+    )
+
+    return np.cumsum(  # pyright: ignore [reportUnknownMemberType]
+        coverage_changes.reshape(shape[0], shape[1] + 1)[:, :-1], axis=1
+    )
+
+
+def _split_edges_at_pixel_boundaries(
+    starts: NDArray[np.float64], ends: NDArray[np.float64], shape: tuple[int, int]
+):
+    """Find the parametric positions, t, along each edge at which the
+    edge crosses a pixel boundary within the grid.
+
+    Returns edge indices and t values, sorted by edge and then by t,
+    that include the start (t = 0) and end (t = 1) of every edge.
+    """
+    num_edges = len(starts)
+    all_edge_indices = [np.arange(num_edges), np.arange(num_edges)]
+    all_t = [np.zeros(num_edges), np.ones(num_edges)]
+
+    for axis, size in enumerate(shape):
+        a = starts[:, axis]
+        b = ends[:, axis]
+
+        # Only boundaries from 0 up to and including size are
+        # required, pieces outside of this range are either discarded
+        # or treated identically.
+        first = np.maximum(np.floor(np.minimum(a, b)) + 1, 0).astype(np.intp)
+        last = np.minimum(np.ceil(np.maximum(a, b)) - 1, size).astype(np.intp)
+        counts = np.maximum(last - first + 1, 0)
+
+        edge_indices = np.repeat(np.arange(num_edges), counts)
+        offsets = np.arange(counts.sum()) - np.repeat(
+            np.cumsum(counts) - counts, counts
         )
+        boundaries = first[edge_indices] + offsets
+
+        all_edge_indices.append(edge_indices)
+        all_t.append((boundaries - a[edge_indices]) / (b - a)[edge_indices])
+
+    edge_indices = np.concatenate(  # pyright: ignore [reportUnknownMemberType]
+        all_edge_indices
+    )
+    t = np.concatenate(all_t)  # pyright: ignore [reportUnknownMemberType]
+
+    order = np.lexsort((t, edge_indices))
+
+    return edge_indices[order], t[order]
+
+
+def _contours_to_expanded_mask(
+    x_transform: GridTransform,
+    y_transform: GridTransform,
+    contours: Contours,
+    expansion: int,
+):
+    expanded_mask_size = (y_transform.size * expansion, x_transform.size * expansion)
+
+    # Each contour is drawn directly into a single boolean canvas,
+    # which is equivalent to taking the logical or of a separate
+    # `skimage.draw.polygon2mask` per contour.
+    expanded_mask = np.zeros(expanded_mask_size, dtype=bool)
+
+    for yx_coords in contours:
+        i_coords = y_transform.coords_to_indices(yx_coords[:, 0])
+        j_coords = x_transform.coords_to_indices(yx_coords[:, 1])
+
+        i = i_coords * expansion + (expansion - 1) * 0.5
+        j = j_coords * expansion + (expansion - 1) * 0.5
+
+        rr, cc = skimage.draw.polygon(i, j, shape=expanded_mask_size)
+        expanded_mask[rr, cc] = True
 
     return expanded_mask
 
 
-def _grid_to_transform(grid: Grid) -> tuple[float, float]:
-    x0 = grid[0]
-    all_dx = np.diff(grid)  # pyright: ignore [reportUnknownMemberType]
-    dx = all_dx[0]
-    assert np.allclose(dx, all_dx)  # pyright: ignore [reportUnknownMemberType]
+def _as_transform(grid: AnyGrid) -> GridTransform:
+    if isinstance(grid, GridTransform):
+        return grid
 
-    return x0, dx
+    return GridTransform.from_grid(grid)
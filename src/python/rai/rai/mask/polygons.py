@@ -0,0 +1,81 @@
+# Copyright (C) 2022 Radiotherapy AI Holdings Pty Ltd
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+"""Converting contours into shapely polygons"""
+
+from typing import Sequence
+
+import numpy as np
+import shapely
+from numpy.typing import NDArray
+
+
+def contours_to_polygons(
+    contours: Sequence[NDArray[np.float64]],
+) -> NDArray[np.object_]:
+    """Create a polygon from each contour, all at once with shapely's
+    vectorised functions.
+
+    Contours that are not valid polygons, such as those that intersect
+    themselves, are repaired with `shapely.make_valid`. These may
+    therefore become a MultiPolygon, or a Polygon with interior rings.
+
+    Parameters
+    ----------
+    contours : sequence of (n,2)-ndarrays
+        The contours, each with at least three vertices. As only areas
+        are compared, either column row (x y) or row column (y x) order
+        is able to be utilised.
+
+    Returns
+    -------
+    NDArray[np.object_]
+        A shapely geometry for each contour.
+    """
+
+    polygons = _polygons(contours)
+
+    invalid = ~shapely.is_valid(polygons)
+    polygons[invalid] = shapely.make_valid(polygons[invalid])
+
+    return polygons
+
+
+def are_valid(contours: Sequence[NDArray[np.float64]]) -> NDArray[np.bool_]:
+    """Whether or not each contour is a valid polygon, and so would be
+    left unchanged by `contours_to_polygons`.
+
+    Parameters
+    ----------
+    contours : sequence of (n,2)-ndarrays
+        The contours, each with at least three vertices.
+
+    Returns
+    -------
+    NDArray[np.bool_]
+        False for each contour that intersects itself.
+    """
+
+    if not contours:
+        return np.zeros(0, dtype=bool)
+
+    return shapely.is_valid(_polygons(contours))
+
+
+def _polygons(contours: Sequence[NDArray[np.float64]]) -> NDArray[np.object_]:
+    coords = np.concatenate(contours)  # pyright: ignore [reportUnknownMemberType]
+    indices = np.repeat(np.arange(len(contours)), [len(item) for item in contours])
+
+    return shapely.polygons(shapely.linearrings(coords, indices=indices))
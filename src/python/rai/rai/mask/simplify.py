@@ -0,0 +1,156 @@
+# Copyright (C) 2022 Radiotherapy AI Holdings Pty Ltd
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+"""Contour vertex reduction"""
+
+from typing import NamedTuple
+
+import numpy as np
+import shapely
+from numpy.typing import NDArray
+
+from .convert import Contours
+from .polygons import contours_to_polygons
+
+# See `shapely.GeometryType`
+_POLYGON_TYPE_ID = 3
+
+
+class SimplifiedContours(NamedTuple):
+    """The result of `simplify_contours`."""
+
+    contours: Contours
+    vertex_count_before: int
+    vertex_count_after: int
+    minimum_dice: float
+
+
+def simplify_contours(
+    contours: Contours,
+    tolerance: float,
+    min_dice: float = 0.99,
+    max_iterations: int = 8,
+) -> SimplifiedContours:
+    """Reduce the number of vertices within a list of contours.
+
+    Utilises the Douglas-Peucker algorithm, preserving topology, applied
+    to all contours at once with shapely's vectorised functions.
+
+    Each contour is guaranteed to have a Dice of at least ``min_dice``
+    against its unsimplified self. Any contour that does not meet this
+    bound is simplified again with half the tolerance. If after
+    ``max_iterations`` halvings the bound is still not met, that
+    contour is returned unsimplified.
+
+    Self-intersecting contours are first repaired with
+    `shapely.make_valid`. Those that would become more than one polygon,
+    or a polygon with holes, are also returned unsimplified, so that no
+    part of their area is ever dropped.
+
+    Parameters
+    ----------
+    contours : list of (n,2)-ndarrays in row column (y x) order
+        A list of contours, such as those returned by
+        `rai.mask.convert.mask_to_contours`.
+    tolerance : float
+        The maximum distance, in the units of the contour coordinates
+        (mm for DICOM), that any removed vertex is from the simplified
+        contour.
+    min_dice : float, optional
+        The minimum Dice between each simplified and unsimplified
+        contour.
+    max_iterations : int, optional
+        The maximum number of times the tolerance is halved for
+        contours that do not meet ``min_dice``.
+
+    Returns
+    -------
+    contours : list of (n,2)-ndarrays in row column (y x) order
+        The simplified contours, each of which is closed, with its final
+        coordinate being equal to its first.
+    vertex_count_before : int
+        The total number of vertices within the provided contours.
+    vertex_count_after : int
+        The total number of vertices within the simplified contours.
+    minimum_dice : float
+        The lowest Dice between a simplified contour and its
+        unsimplified self.
+    """
+
+    vertex_count_before = sum(len(contour) for contour in contours)
+
+    # Contours with fewer than four vertices are unable to be reduced
+    # any further, and are passed through unchanged.
+    to_simplify = np.array([len(contour) >= 4 for contour in contours], dtype=bool)
+    simplified_contours = list(contours)
+    dice = np.ones(len(contours))
+
+    if np.any(to_simplify):
+        indices = np.flatnonzero(to_simplify)
+        original = contours_to_polygons([contours[i] for i in indices])
+
+        simplified = np.empty_like(original)
+        remaining = np.ones(len(original), dtype=bool)
+        current_tolerance = tolerance
+
+        for _ in range(max_iterations + 1):
+            simplified[remaining] = shapely.simplify(
+                original[remaining], current_tolerance, preserve_topology=True
+            )
+
+            dice[indices[remaining]] = _polygon_dice(
+                original[remaining], simplified[remaining]
+            )
+            remaining[remaining] = dice[indices[remaining]] < min_dice
+
+            if not np.any(remaining):
+                break
+
+            current_tolerance /= 2
+
+        # Contours that could not be repaired into a single polygon, or
+        # whose repair introduced holes, are unable to be represented by a
+        # single ring, and so are also passed through unchanged.
+        unchanged = (
+            remaining
+            | (shapely.get_type_id(simplified) != _POLYGON_TYPE_ID)
+            | (shapely.get_num_interior_rings(simplified) > 0)
+        )
+        dice[indices[unchanged]] = 1
+
+        exterior_coords = shapely.get_exterior_ring(simplified[~unchanged])
+        for i, ring in zip(indices[~unchanged], exterior_coords):
+            simplified_contours[i] = shapely.get_coordinates(ring)
+
+    vertex_count_after = sum(len(contour) for contour in simplified_contours)
+
+    return SimplifiedContours(
+        contours=simplified_contours,
+        vertex_count_before=vertex_count_before,
+        vertex_count_after=vertex_count_after,
+        minimum_dice=float(np.min(dice, initial=1)),
+    )
+
+
+def _polygon_dice(
+    a: NDArray[np.object_], b: NDArray[np.object_]
+) -> NDArray[np.float64]:
+    total_area = shapely.area(a) + shapely.area(b)
+    intersection_area = shapely.area(shapely.intersection(a, b))
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        dice = np.where(total_area > 0, 2 * intersection_area / total_area, 1)
+
+    return dice
@@ -0,0 +1,178 @@
+# Copyright (C) 2022 Radiotherapy AI Holdings Pty Ltd
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+"""A compact bounding box representation of anti-aliased masks"""
+
+from typing import NamedTuple, Union
+
+import numpy as np
+from numpy.typing import NDArray
+
+
+class SparseMask(NamedTuple):
+    """A uint8 anti-aliased mask stored as only the window of pixels
+    that are able to be non-zero.
+
+    Organ at risk masks are often almost entirely zero. Only the
+    ``data`` window is stored, with every pixel outside of it known to
+    be zero.
+
+    Union and intersection follow the anti-aliased convention of taking
+    the pixel-wise maximum and minimum respectively.
+
+    Attributes
+    ----------
+    shape : tuple[int, int]
+        The (rows, columns) shape of the full mask.
+    offset : tuple[int, int]
+        The (row, column) index within the full mask of ``data[0, 0]``.
+    data : NDArray[np.uint8]
+        The mask values within the window.
+    """
+
+    shape: tuple[int, int]
+    offset: tuple[int, int]
+    data: NDArray[np.uint8]
+
+    @classmethod
+    def from_dense(cls, mask: NDArray[np.uint8]) -> "SparseMask":
+        """Create a sparse mask cropped to the non-zero pixels of a dense
+        mask."""
+
+        non_zero_rows = np.flatnonzero(np.any(mask, axis=1))
+        non_zero_columns = np.flatnonzero(np.any(mask, axis=0))
+
+        if len(non_zero_rows) == 0:
+            return cls.empty(mask.shape)
+
+        rows = slice(int(non_zero_rows[0]), int(non_zero_rows[-1]) + 1)
+        columns = slice(int(non_zero_columns[0]), int(non_zero_columns[-1]) + 1)
+
+        return cls(
+            shape=(mask.shape[0], mask.shape[1]),
+            offset=(rows.start, columns.start),
+            data=mask[rows, columns].copy(),
+        )
+
+    @classmethod
+    def empty(cls, shape: tuple[int, int]) -> "SparseMask":
+        """Create a sparse mask with no non-zero pixels."""
+
+        return cls(shape=shape, offset=(0, 0), data=np.zeros((0, 0), dtype=np.uint8))
+
+    @property
+    def rows(self):
+        """The rows of the full mask covered by ``data``."""
+        return slice(self.offset[0], self.offset[0] + self.data.shape[0])
+
+    @property
+    def columns(self):
+        """The columns of the full mask covered by ``data``."""
+        return slice(self.offset[1], self.offset[1] + self.data.shape[1])
+
+    def to_dense(self) -> NDArray[np.uint8]:
+        """Expand into a full uint8 mask."""
+
+        mask = np.zeros(self.shape, dtype=np.uint8)
+        mask[self.rows, self.columns] = self.data
+
+        return mask
+
+    def area(self) -> float:
+        """The number of pixels within the mask, with partially
+        encompassed pixels contributing their fraction."""
+
+        return float(np.sum(self.data, dtype=np.uint64)) / 255
+
+    def union(self, other: "SparseMask") -> "SparseMask":
+        """The pixel-wise maximum of two sparse masks."""
+
+        self._check_shape(other)
+
+        if other.data.size == 0:
+            return self
+        if self.data.size == 0:
+            return other
+
+        rows = _slice_union(self.rows, other.rows)
+        columns = _slice_union(self.columns, other.columns)
+
+        data = np.zeros(
+            (rows.stop - rows.start, columns.stop - columns.start), dtype=np.uint8
+        )
+        for mask in (self, other):
+            window = data[
+                mask.rows.start - rows.start : mask.rows.stop - rows.start,
+                mask.columns.start - columns.start : mask.columns.stop - columns.start,
+            ]
+            np.maximum(window, mask.data, out=window)
+
+        return SparseMask(
+            shape=self.shape, offset=(rows.start, columns.start), data=data
+        )
+
+    def intersection(self, other: "SparseMask") -> "SparseMask":
+        """The pixel-wise minimum of two sparse masks."""
+
+        self._check_shape(other)
+
+        rows = _slice_intersection(self.rows, other.rows)
+        columns = _slice_intersection(self.columns, other.columns)
+
+        if rows.stop <= rows.start or columns.stop <= columns.start:
+            return SparseMask.empty(self.shape)
+
+        return SparseMask(
+            shape=self.shape,
+            offset=(rows.start, columns.start),
+            data=np.minimum(self.window(rows, columns), other.window(rows, columns)),
+        )
+
+    def window(self, rows: slice, columns: slice) -> NDArray[np.uint8]:
+        """The stored values within the given rows and columns of the
+        full mask, which need to be within the stored window."""
+
+        return self.data[
+            rows.start - self.offset[0] : rows.stop - self.offset[0],
+            columns.start - self.offset[1] : columns.stop - self.offset[1],
+        ]
+
+    def _check_shape(self, other: "SparseMask"):
+        if tuple(self.shape) != tuple(other.shape):
+            raise ValueError(
+                "Sparse masks need to have the same shape, however "
+                f"{self.shape} and {other.shape} were provided."
+            )
+
+
+AnyMask = Union[NDArray[np.uint8], SparseMask]
+
+
+def as_sparse(mask: AnyMask) -> SparseMask:
+    """Convert a dense mask into a sparse mask, passing sparse masks
+    through unchanged."""
+
+    if isinstance(mask, SparseMask):
+        return mask
+
+    return SparseMask.from_dense(mask)
+
+
+def _slice_union(a: slice, b: slice):
+    return slice(min(a.start, b.start), max(a.stop, b.stop))
+
+
+def _slice_intersection(a: slice, b: slice):
+    return slice(max(a.start, b.start), min(a.stop, b.stop))
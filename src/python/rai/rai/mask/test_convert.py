@@ -20,11 +20,22 @@ from typing import TypedDict
 
 import matplotlib.pyplot as plt  # pyright: ignore [reportMissingTypeStubs, reportUnknownVariableType]
 import numpy as np
+import pytest
+import shapely.geometry
 
 from rai._paths import TEST_RECORDS_DIR
 from rai.metrics import dice
 
-from .convert import Contours, Grid, contours_to_mask, mask_to_contours
+from .convert import (
+    Contours,
+    Grid,
+    GridTransform,
+    contours_stack_to_mask_stack,
+    contours_to_cropped_mask,
+    contours_to_mask,
+    mask_stack_to_contours_stack,
+    mask_to_contours,
+)
 
 FIGURE_DIR = TEST_RECORDS_DIR / "mask_test_figures"
 
@@ -144,6 +155,232 @@ def _run_round_trip_test(
     fig.savefig(FIGURE_DIR / f"{title}.png")  # type: ignore
 
 
+def test_grid_transform():
+    """Test that a prebuilt GridTransform gives identical results to
+    the grid itself, and that non-uniform grids are rejected"""
+
+    x_grid = np.linspace(-2, 2, 21)
+    y_grid = np.linspace(-2, 2, 31)
+
+    x_transform = GridTransform.from_grid(x_grid)
+    y_transform = GridTransform.from_grid(y_grid)
+
+    assert np.allclose(x_transform.to_grid(), x_grid)
+
+    t = np.linspace(0, 2 * np.pi)
+    contours = [
+        np.concatenate(  # pyright: ignore [reportUnknownMemberType]
+            [np.cos(t)[:, None], np.sin(t)[:, None]], axis=-1
+        )
+    ]
+
+    mask = contours_to_mask(x_grid, y_grid, contours)
+    assert np.array_equal(contours_to_mask(x_transform, y_transform, contours), mask)
+    _assert_contours_close(
+        mask_to_contours(x_transform, y_transform, mask),
+        mask_to_contours(x_grid, y_grid, mask),
+    )
+
+    with pytest.raises(ValueError):
+        GridTransform.from_grid(np.array([0, 1, 3]))
+
+    with pytest.raises(ValueError):
+        GridTransform.from_grid(np.array([0]))
+
+
+def test_mask_stack_matches_per_slice_conversion():
+    """Test that the batched stack conversion agrees with converting
+    each slice individually"""
+
+    x_grid = np.linspace(-2, 2, 21)
+    y_grid = np.linspace(-2, 2, 31)
+
+    t = np.linspace(0, 2 * np.pi)
+    circle = np.concatenate(  # pyright: ignore [reportUnknownMemberType]
+        [np.cos(t)[:, None], np.sin(t)[:, None]], axis=-1
+    )
+
+    contours_stack: list[list[Contours]] = [
+        [[circle], [], [circle * 0.5, circle * 0.5 + 1]],
+        [[], [circle * 1.5], []],
+    ]
+
+    mask_stack = contours_stack_to_mask_stack(x_grid, y_grid, contours_stack)
+    assert mask_stack.shape == (2, 3, len(y_grid), len(x_grid))
+
+    for structure_index, contours_by_slice in enumerate(contours_stack):
+        for slice_index, contours in enumerate(contours_by_slice):
+            expected = contours_to_mask(x_grid, y_grid, contours)
+            assert np.array_equal(mask_stack[structure_index, slice_index], expected)
+
+
+def test_contours_stack_matches_per_slice_conversion():
+    """Test that the volume contour extraction agrees with extracting
+    the contours of each slice individually"""
+
+    x_grid = np.linspace(-2, 2, 21)
+    y_grid = np.linspace(-2, 2, 31)
+
+    t = np.linspace(0, 2 * np.pi)
+    circle = np.concatenate(  # pyright: ignore [reportUnknownMemberType]
+        [np.cos(t)[:, None], np.sin(t)[:, None]], axis=-1
+    )
+
+    mask_stack = contours_stack_to_mask_stack(
+        x_grid,
+        y_grid,
+        [
+            [[circle], [], [circle * 0.5, circle * 0.5 + 1]],
+            [[], [circle * 1.5], [circle * 0.05]],
+        ],
+    )
+
+    for max_workers in (1, 2):
+        contours_stack = mask_stack_to_contours_stack(
+            x_grid, y_grid, mask_stack, max_workers=max_workers
+        )
+        single_structure_contours = mask_stack_to_contours_stack(
+            x_grid, y_grid, mask_stack[1], max_workers=max_workers
+        )
+
+        for slice_index, contours in enumerate(single_structure_contours):
+            _assert_contours_close(contours, contours_stack[1][slice_index])
+
+        for structure_index, masks in enumerate(mask_stack):
+            for slice_index, mask in enumerate(masks):
+                _assert_contours_close(
+                    contours_stack[structure_index][slice_index],
+                    mask_to_contours(x_grid, y_grid, mask),
+                )
+
+
+def test_contours_stack_per_structure_levels():
+    """Test that each structure is contoured at its own mask level"""
+
+    x_grid = np.linspace(-2, 2, 21)
+    y_grid = np.linspace(-2, 2, 31)
+
+    t = np.linspace(0, 2 * np.pi)
+    circle = np.concatenate(  # pyright: ignore [reportUnknownMemberType]
+        [np.cos(t)[:, None], np.sin(t)[:, None]], axis=-1
+    )
+
+    mask = contours_to_mask(x_grid, y_grid, [circle]) // 2
+    mask_stack = np.stack([mask[None, ...]] * 3)
+    levels = [50, 100, 200]
+
+    contours_stack = mask_stack_to_contours_stack(
+        x_grid, y_grid, mask_stack, levels=levels, max_workers=1
+    )
+
+    for structure_index, level in enumerate(levels):
+        _assert_contours_close(
+            contours_stack[structure_index][0],
+            mask_to_contours(x_grid, y_grid, mask, level=level),
+        )
+
+    # The halved mask never reaches the final structure's level
+    assert contours_stack[2][0] == []
+
+
+def _assert_contours_close(a: Contours, b: Contours):
+    assert len(a) == len(b)
+    for contour_a, contour_b in zip(a, b):
+        assert np.allclose(contour_a, contour_b)
+
+
+def test_cropped_mask_matches_full_mask():
+    """Test that a cropped mask is identical to the corresponding window
+    of the full mask"""
+
+    x_grid = np.linspace(-20, 20, 81)
+    y_grid = np.linspace(-10, 10, 41)
+
+    t = np.linspace(0, 2 * np.pi)
+    small_circle = np.concatenate(  # pyright: ignore [reportUnknownMemberType]
+        [(np.cos(t) + 3.2)[:, None], (np.sin(t) - 7.1)[:, None]], axis=-1
+    )
+    partially_outside = small_circle + [0, -15]
+
+    for contours in ([small_circle], [small_circle, partially_outside]):
+        for method in ("supersample", "exact"):
+            full_mask = contours_to_mask(x_grid, y_grid, contours, method=method)
+            (row, column), cropped_mask = contours_to_cropped_mask(
+                x_grid, y_grid, contours, method=method
+            )
+
+            assert cropped_mask.size < full_mask.size
+            assert np.sum(cropped_mask) == np.sum(full_mask)
+
+            window = full_mask[
+                row : row + cropped_mask.shape[0],
+                column : column + cropped_mask.shape[1],
+            ]
+            assert np.array_equal(window, cropped_mask)
+
+
+def test_exact_method_coverage():
+    """Test that the exact method agrees with the per pixel polygon
+    intersection area, and closely with the supersampled method"""
+
+    x_grid = np.linspace(-5, 5, 11)
+    y_grid = np.linspace(-4, 4, 17)
+
+    t = np.linspace(0, 2 * np.pi)
+    ellipse = np.concatenate(  # pyright: ignore [reportUnknownMemberType]
+        [(4 * np.sin(t) + 0.3)[:, None], (3 * np.cos(t))[:, None]], axis=-1
+    )
+    contours = [ellipse]
+
+    exact_mask = contours_to_mask(x_grid, y_grid, contours, method="exact")
+
+    polygon = shapely.geometry.Polygon(np.flip(ellipse, axis=1))
+    dx = x_grid[1] - x_grid[0]
+    dy = y_grid[1] - y_grid[0]
+    expected_coverage = np.array(
+        [
+            [
+                polygon.intersection(
+                    shapely.geometry.box(x - dx / 2, y - dy / 2, x + dx / 2, y + dy / 2)
+                ).area
+                / (dx * dy)
+                for x in x_grid
+            ]
+            for y in y_grid
+        ]
+    )
+
+    assert np.array_equal(exact_mask, np.round(expected_coverage * 255))
+
+    supersampled_mask = contours_to_mask(x_grid, y_grid, contours)
+    difference = np.abs(exact_mask.astype(int) - supersampled_mask.astype(int))
+
+    # Supersampling only approximates the coverage of each edge pixel
+    assert np.max(difference) <= 5
+
+
+def test_exact_method_self_intersecting():
+    """Test that the exact method, as for the supersampled method,
+    covers both lobes of a self-intersecting figure of eight"""
+
+    x_grid = np.linspace(-5, 5, 11)
+    y_grid = np.linspace(-4, 4, 17)
+
+    figure_of_eight = np.array([[-3, -4], [3, 4], [3, -4], [-3, 4]], dtype=float)
+
+    exact_mask = contours_to_mask(x_grid, y_grid, [figure_of_eight], method="exact")
+    supersampled_mask = contours_to_mask(x_grid, y_grid, [figure_of_eight])
+
+    # The two lobes are mirror images of one another
+    assert np.array_equal(exact_mask, exact_mask[::-1])
+
+    # Only the pixels about the crossing point are approximated
+    difference = np.abs(exact_mask.astype(int) - supersampled_mask)
+    crossing = len(y_grid) // 2
+    assert np.max(np.delete(difference, crossing, axis=0)) <= 5
+    assert np.sum(exact_mask) == pytest.approx(np.sum(supersampled_mask), rel=0.02)
+
+
 # For this test to pass, need to implement contour keyhole technique.
 # https://dicom.nema.org/medical/Dicom/2022b/output/chtml/part03/sect_C.8.8.6.3.html
 # I'll include that in a follow up PR, given this PR is getting large
@@ -0,0 +1,86 @@
+# Copyright (C) 2022 Radiotherapy AI Holdings Pty Ltd
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+"""Testing contour simplification"""
+
+import numpy as np
+
+from rai.metrics import dice
+
+from .convert import contours_to_mask, mask_to_contours
+from .simplify import simplify_contours
+
+
+def test_simplification_dice_bound():
+    """Test that simplification reduces vertices while keeping each
+    contour above the Dice bound"""
+
+    x_grid = np.linspace(-50, 50, 101)
+    y_grid = np.linspace(-50, 50, 101)
+
+    t = np.linspace(0, 2 * np.pi, 200)
+    wavy = np.concatenate(  # pyright: ignore [reportUnknownMemberType]
+        [
+            (30 * np.sin(t) * (1 + 0.1 * np.sin(7 * t)))[:, None],
+            (40 * np.cos(t))[:, None],
+        ],
+        axis=-1,
+    )
+    small = np.concatenate(  # pyright: ignore [reportUnknownMemberType]
+        [(3 * np.sin(t) + 40)[:, None], (3 * np.cos(t) - 40)[:, None]], axis=-1
+    )
+
+    mask = contours_to_mask(x_grid, y_grid, [wavy, small], method="exact")
+    contours = mask_to_contours(x_grid, y_grid, mask)
+
+    for tolerance in (0.1, 1, 10):
+        for min_dice in (0.95, 0.999):
+            result = simplify_contours(contours, tolerance, min_dice=min_dice)
+
+            assert result.vertex_count_before == sum(len(item) for item in contours)
+            assert result.vertex_count_after < result.vertex_count_before
+            assert result.minimum_dice >= min_dice
+
+            for original, simplified in zip(contours, result.contours):
+                assert dice.from_contours([original], [simplified]) >= min_dice
+
+
+def test_repaired_holes_are_kept():
+    """Test that a self-touching contour, which is repaired into a
+    polygon with a hole, is passed through unchanged rather than losing
+    its hole"""
+
+    square = np.array(
+        [[0, 0], [0, 10], [10, 10], [10, 0], [0, 0]], dtype=float
+    ) + np.array([20, 0])
+    inverted = np.array(
+        [
+            [0, 0],
+            [10, 0],
+            [10, 10],
+            [5, 10],
+            [7, 5],
+            [3, 5],
+            [5, 10],
+            [0, 10],
+            [0, 0],
+        ],
+        dtype=float,
+    )
+
+    result = simplify_contours([square, inverted], tolerance=1)
+
+    assert np.array_equal(result.contours[1], inverted)
+    assert result.minimum_dice == 1
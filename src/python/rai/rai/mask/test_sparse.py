@@ -0,0 +1,70 @@
+# Copyright (C) 2022 Radiotherapy AI Holdings Pty Ltd
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+"""Testing the sparse mask representation"""
+
+import numpy as np
+
+from rai.metrics import dice
+
+from .convert import contours_to_mask, contours_to_sparse_mask, mask_to_contours
+from .sparse import SparseMask
+
+
+def test_sparse_mask_operations():
+    """Test that sparse mask operations agree with their dense
+    equivalents"""
+
+    x_grid = np.linspace(-20, 20, 81)
+    y_grid = np.linspace(-10, 10, 41)
+
+    t = np.linspace(0, 2 * np.pi)
+    circle = np.concatenate(  # pyright: ignore [reportUnknownMemberType]
+        [np.cos(t)[:, None], np.sin(t)[:, None]], axis=-1
+    )
+
+    contours_a = [circle * 3 + [1, -4]]
+    contours_b = [circle * 2 + [2, -1]]
+    contours_c = [circle + [-6, 12]]
+
+    dense_a = contours_to_mask(x_grid, y_grid, contours_a)
+    dense_b = contours_to_mask(x_grid, y_grid, contours_b)
+    dense_c = contours_to_mask(x_grid, y_grid, contours_c)
+
+    sparse_a = contours_to_sparse_mask(x_grid, y_grid, contours_a)
+    sparse_b = SparseMask.from_dense(dense_b)
+    sparse_c = SparseMask.from_dense(dense_c)
+
+    assert np.array_equal(sparse_a.to_dense(), dense_a)
+    assert np.array_equal(sparse_b.to_dense(), dense_b)
+    assert sparse_b.data.size < dense_b.size
+
+    assert np.array_equal(
+        sparse_a.union(sparse_b).to_dense(), np.maximum(dense_a, dense_b)
+    )
+    assert np.array_equal(
+        sparse_a.intersection(sparse_b).to_dense(), np.minimum(dense_a, dense_b)
+    )
+    assert sparse_a.intersection(sparse_c).area() == 0
+    assert np.isclose(sparse_a.area(), np.sum(dense_a) / 255)
+
+    assert dice.from_masks(sparse_a, sparse_b) == dice.from_masks(dense_a, dense_b)
+
+    sparse_contours = mask_to_contours(x_grid, y_grid, sparse_a)
+    dense_contours = mask_to_contours(x_grid, y_grid, dense_a)
+
+    assert len(sparse_contours) == len(dense_contours)
+    for sparse_contour, dense_contour in zip(sparse_contours, dense_contours):
+        assert np.allclose(sparse_contour, dense_contour)
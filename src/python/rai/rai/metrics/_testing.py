@@ -0,0 +1,105 @@
+# Copyright (C) 2022 Radiotherapy AI Holdings Pty Ltd
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+"""Utilities shared by the metric tests"""
+
+import pydicom.uid
+
+from rai.dicom import append, uid
+from rai.dicom.typing import TypedDataset
+
+from . import dice
+
+ComparisonSlices = list[tuple[dice.ContoursXY, dice.ContoursXY]]
+
+
+def create_slice_aligned_dicom_files(slices: ComparisonSlices):
+    """Create two structure sets for aligned contour comparisons.
+
+    Take a list of aligned slice contour coordinates and create two
+    DICOM files where the aligned slices have the same
+    ReferencedSOPInstanceUID, and therefore the aligned slices within
+    the provided list are also aligned between the corresponding DICOM
+    pairs.
+
+    """
+
+    contour_sequence_a: list[append.DicomItem] = []
+    contour_sequence_b: list[append.DicomItem] = []
+
+    for i, (contours_on_a, contours_on_b) in enumerate(slices):
+        reference_sop_instance_uid = pydicom.uid.generate_uid(
+            prefix=uid.RAI_CLIENT_ROOT_UID_PREFIX
+        )
+
+        for contour in contours_on_a:
+            append_contour_sequence_item(
+                contour_sequence=contour_sequence_a,
+                reference_sop_instance_uid=reference_sop_instance_uid,
+                contour=contour,
+                z_value=i,
+            )
+
+        for contour in contours_on_b:
+            append_contour_sequence_item(
+                contour_sequence=contour_sequence_b,
+                reference_sop_instance_uid=reference_sop_instance_uid,
+                contour=contour,
+                z_value=i,
+            )
+
+    a = TypedDataset()
+    b = TypedDataset()
+
+    append.append_dict_to_dataset(
+        ds=a,
+        to_append={"ROIContourSequence": [{"ContourSequence": contour_sequence_a}]},
+    )
+    append.append_dict_to_dataset(
+        ds=b,
+        to_append={"ROIContourSequence": [{"ContourSequence": contour_sequence_b}]},
+    )
+
+    return a, b
+
+
+def append_contour_sequence_item(
+    contour_sequence: list[append.DicomItem],
+    reference_sop_instance_uid: str,
+    contour: dice.ContourXY,
+    z_value: float,
+):
+    """Append a closed planar contour, referencing the given image, to
+    a contour sequence."""
+
+    contour_sequence.append(
+        {
+            "ContourImageSequence": [
+                {
+                    "ReferencedSOPInstanceUID": reference_sop_instance_uid,
+                }
+            ],
+            "ContourData": _contour_to_dicom_format(contour, z_value=z_value),
+            "ContourGeometricType": "CLOSED_PLANAR",
+        }
+    )
+
+
+def _contour_to_dicom_format(contour: dice.ContourXY, z_value: float):
+    dicom_format_contour: list[float] = []
+    for x, y in contour:
+        dicom_format_contour.extend([x, y, z_value])
+
+    return dicom_format_contour
@@ -16,19 +16,116 @@
 """Determining the Dice metric"""
 
 import collections
+import concurrent.futures
+import itertools
+import os
+from typing import Literal, NamedTuple, Optional, Sequence
 
 import numpy as np
+import shapely
 import shapely.geometry
 import shapely.geometry.base
 from numpy.typing import NDArray
 
-from rai.dicom.typing import ContourSequenceItem
+from rai.dicom import contour_data
+from rai.dicom.typing import ContourSequenceItem, TypedDataset
+from rai.mask.convert import GridTransform, contours_to_mask
+from rai.mask.polygons import are_valid, contours_to_polygons
+from rai.mask.sparse import AnyMask, as_sparse
 
 ContourXY = list[tuple[float, float]]
 ContoursXY = list[ContourXY]
 
+ImageUIDToContoursMap = dict[str, list[NDArray[np.float64]]]
 
-def from_contour_sequence(a: list[ContourSequenceItem], b: list[ContourSequenceItem]):
+DiceMethod = Literal["polygon", "raster"]
+
+# The pixel spacing, in the units of the contour coordinates (mm for
+# DICOM), utilised by the raster method.
+DEFAULT_RESOLUTION = 0.5
+
+# The largest error within a pixel introduced by storing its coverage
+# as a uint8.
+_QUANTISATION_ERROR = 0.5 / 255
+
+
+class SliceOverlaps(NamedTuple):
+    """The per slice areas of two DICOM Contour Sequences, and of their
+    intersection.
+
+    Attributes
+    ----------
+    image_uids : list[str]
+        The ReferencedSOPInstanceUID of every slice contoured within
+        either of the sequences, sorted.
+    intersection_areas : NDArray[np.float64]
+        The area of the intersection of the two sequences on each
+        slice.
+    areas_a : NDArray[np.float64]
+        The area of the union of the first sequence's contours on each
+        slice, zero for slices only contoured within the second.
+    areas_b : NDArray[np.float64]
+        The area of the union of the second sequence's contours on each
+        slice, zero for slices only contoured within the first.
+    intersection_lower : NDArray[np.float64]
+        A lower bound of the exact polygon intersection area on each
+        slice.
+    intersection_upper : NDArray[np.float64]
+        An upper bound of the exact polygon intersection area on each
+        slice.
+    area_errors_a : NDArray[np.float64]
+        The largest difference between ``areas_a`` and the exact polygon
+        area on each slice.
+    area_errors_b : NDArray[np.float64]
+        The largest difference between ``areas_b`` and the exact polygon
+        area on each slice.
+    """
+
+    image_uids: list[str]
+    intersection_areas: NDArray[np.float64]
+    areas_a: NDArray[np.float64]
+    areas_b: NDArray[np.float64]
+    intersection_lower: NDArray[np.float64]
+    intersection_upper: NDArray[np.float64]
+    area_errors_a: NDArray[np.float64]
+    area_errors_b: NDArray[np.float64]
+
+    @property
+    def dice(self) -> float:
+        """The Dice score across all slices."""
+
+        intersection_area = float(np.sum(self.intersection_areas))
+        total_area = float(np.sum(self.areas_a) + np.sum(self.areas_b))
+
+        return 2 * intersection_area / total_area
+
+    @property
+    def dice_bounds(self) -> tuple[float, float]:
+        """The lower and upper bounds of the exact polygon Dice score.
+
+        Both bounds equal ``dice`` for the polygon method.
+        """
+
+        total_area = float(np.sum(self.areas_a) + np.sum(self.areas_b))
+        total_error = float(np.sum(self.area_errors_a) + np.sum(self.area_errors_b))
+
+        lower = 2 * float(np.sum(self.intersection_lower)) / (total_area + total_error)
+
+        upper_total_area = total_area - total_error
+        if upper_total_area <= 0:
+            return lower, 1.0
+
+        upper = 2 * float(np.sum(self.intersection_upper)) / upper_total_area
+
+        return lower, min(upper, 1.0)
+
+
+def from_contour_sequence(
+    a: list[ContourSequenceItem],
+    b: list[ContourSequenceItem],
+    method: DiceMethod = "polygon",
+    resolution: float = DEFAULT_RESOLUTION,
+):
     """Determine the Dice metric between two DICOM Contour Sequences.
 
     The Dice score is an overlap metric where a value of 1 indicates
@@ -41,43 +138,499 @@ def from_contour_sequence(a: list[ContourSequenceItem], b: list[ContourSequenceI
     ----------
     a : pydicom.Sequence
     b : pydicom.Sequence
+    method : "polygon" or "raster", optional
+        Either intersect the contours as polygons, or rasterise them
+        onto a grid and sum the pixel coverages. See
+        `from_contour_sequence_by_slice` for details.
+    resolution : float, optional
+        The pixel spacing of the grid utilised by the raster method.
 
     Returns
     -------
     float
         The Dice score
     """
+
+    return from_contour_sequence_by_slice(a, b, method, resolution).dice
+
+
+def from_contour_sequence_by_slice(
+    a: list[ContourSequenceItem],
+    b: list[ContourSequenceItem],
+    method: DiceMethod = "polygon",
+    resolution: float = DEFAULT_RESOLUTION,
+) -> SliceOverlaps:
+    """Determine the per slice overlap between two DICOM Contour
+    Sequences.
+
+    Slices are matched by their ReferencedSOPInstanceUID. Slices that
+    are only contoured within one of the sequences contribute to that
+    sequence's area alone.
+
+    The polygon method unions the contours on each slice, and
+    intersects the unions, for all slices at once with shapely's
+    vectorised functions. Its result is exact.
+
+    The raster method determines the exact coverage of each pixel of a
+    grid with the given resolution, utilising
+    `rai.mask.convert.contours_to_mask`, and then sums the uint8
+    coverages as integers. Its cost scales with the area of the slices
+    in pixels rather than with the number of vertices and their
+    crossings, which favours large, finely and irregularly contoured
+    structures. Within a pixel covered by both sequences the
+    intersection is taken as the smaller of the two coverages, which is
+    exact whenever one covers a subset of the other within that pixel,
+    as is the case along the boundaries of closely agreeing structures.
+    The returned bounds account for this as well as for the uint8
+    quantisation, assuming that the edges of separate contours on the
+    same slice do not cross within a pixel. Slices with a contour that
+    intersects itself, which the polygon method repairs with
+    `shapely.make_valid`, are instead determined with the polygon
+    method, so that both methods follow the same rules.
+
+    Parameters
+    ----------
+    a : pydicom.Sequence
+    b : pydicom.Sequence
+    method : "polygon" or "raster", optional
+        The method used to determine the areas.
+    resolution : float, optional
+        The pixel spacing of the grid utilised by the raster method, in
+        the units of the contour coordinates. Smaller values tighten
+        the bounds at the cost of speed.
+
+    Returns
+    -------
+    SliceOverlaps
+        The per slice areas, with the overall Dice score available as
+        its ``dice`` attribute.
+    """
+
     image_uids_to_contours_a = _get_image_uid_to_contours_map(a)
     image_uids_to_contours_b = _get_image_uid_to_contours_map(b)
 
-    all_image_uids = set(image_uids_to_contours_a.keys()).union(
-        image_uids_to_contours_b.keys()
+    image_uids = sorted(
+        set(image_uids_to_contours_a.keys()).union(image_uids_to_contours_b.keys())
+    )
+
+    if method == "polygon":
+        return _polygon_overlaps(
+            image_uids_to_contours_a, image_uids_to_contours_b, image_uids
+        )
+
+    if method == "raster":
+        return _raster_overlaps(
+            image_uids_to_contours_a, image_uids_to_contours_b, image_uids, resolution
+        )
+
+    raise ValueError(f"Unknown Dice method: {method}")
+
+
+def _polygon_overlaps(
+    image_uids_to_contours_a: ImageUIDToContoursMap,
+    image_uids_to_contours_b: ImageUIDToContoursMap,
+    image_uids: list[str],
+):
+    geoms_a = _union_per_slice(image_uids_to_contours_a, image_uids)
+    geoms_b = _union_per_slice(image_uids_to_contours_b, image_uids)
+
+    intersection_areas = _intersection_areas(geoms_a, geoms_b)
+    no_errors = np.zeros(len(image_uids))
+
+    return SliceOverlaps(
+        image_uids=image_uids,
+        intersection_areas=intersection_areas,
+        areas_a=shapely.area(geoms_a),
+        areas_b=shapely.area(geoms_b),
+        intersection_lower=intersection_areas,
+        intersection_upper=intersection_areas,
+        area_errors_a=no_errors,
+        area_errors_b=no_errors,
     )
 
-    intersection_area = 0
-    total_area = 0
-    for image_uid in all_image_uids:
-        shapley_a = _contours_xy_to_shapely(image_uids_to_contours_a[image_uid])
-        shapely_b = _contours_xy_to_shapely(image_uids_to_contours_b[image_uid])
 
-        intersection_area += shapley_a.intersection(shapely_b).area
-        total_area += shapley_a.area + shapely_b.area
+def _raster_overlaps(
+    image_uids_to_contours_a: ImageUIDToContoursMap,
+    image_uids_to_contours_b: ImageUIDToContoursMap,
+    image_uids: list[str],
+    resolution: float,
+):
+    # Columns of intersection, lower, upper, area a, error a, area b,
+    # error b, all in pixels
+    pixel_sums = np.zeros((len(image_uids), 7))
+
+    self_intersecting = _self_intersecting_slices(
+        image_uids_to_contours_a, image_uids
+    ) | _self_intersecting_slices(image_uids_to_contours_b, image_uids)
+
+    for i in np.flatnonzero(~self_intersecting):
+        pixel_sums[i] = _raster_slice_overlap(
+            image_uids_to_contours_a.get(image_uids[i], []),
+            image_uids_to_contours_b.get(image_uids[i], []),
+            resolution,
+        )
 
-    return 2 * intersection_area / total_area
+    areas = pixel_sums * resolution**2
 
+    if np.any(self_intersecting):
+        polygon_overlaps = _polygon_overlaps(
+            image_uids_to_contours_a,
+            image_uids_to_contours_b,
+            [image_uids[i] for i in np.flatnonzero(self_intersecting)],
+        )
+        areas[self_intersecting] = np.stack(
+            [
+                polygon_overlaps.intersection_areas,
+                polygon_overlaps.intersection_lower,
+                polygon_overlaps.intersection_upper,
+                polygon_overlaps.areas_a,
+                polygon_overlaps.area_errors_a,
+                polygon_overlaps.areas_b,
+                polygon_overlaps.area_errors_b,
+            ],
+            axis=-1,
+        )
 
-def _contours_xy_to_shapely(contours: ContoursXY):
-    geom = shapely.geometry.Polygon()
+    return SliceOverlaps(
+        image_uids=image_uids,
+        intersection_areas=areas[:, 0],
+        intersection_lower=areas[:, 1],
+        intersection_upper=areas[:, 2],
+        areas_a=areas[:, 3],
+        area_errors_a=areas[:, 4],
+        areas_b=areas[:, 5],
+        area_errors_b=areas[:, 6],
+    )
+
+
+def _self_intersecting_slices(
+    image_uid_to_contours: ImageUIDToContoursMap, image_uids: list[str]
+) -> NDArray[np.bool_]:
+    """Whether or not each slice has a contour that intersects itself,
+    checking the contours of all slices at once."""
+
+    contours_per_slice = [image_uid_to_contours.get(uid, []) for uid in image_uids]
+    counts = [len(contours) for contours in contours_per_slice]
+
+    valid = are_valid(list(itertools.chain.from_iterable(contours_per_slice)))
+    slice_indices = np.repeat(np.arange(len(image_uids)), counts)
+
+    self_intersecting = np.zeros(len(image_uids), dtype=bool)
+    self_intersecting[slice_indices[~valid]] = True
+
+    return self_intersecting
+
+
+def _raster_slice_overlap(
+    contours_a: list[NDArray[np.float64]],
+    contours_b: list[NDArray[np.float64]],
+    resolution: float,
+):
+    """Rasterise both sides of a single slice onto a shared grid that
+    encompasses them, with a border of one pixel."""
+
+    all_xy_coords = np.concatenate(  # pyright: ignore [reportUnknownMemberType]
+        contours_a + contours_b
+    )
+    min_xy = np.min(all_xy_coords, axis=0) - resolution
+    max_xy = np.max(all_xy_coords, axis=0) + resolution
+    x_size, y_size = (np.ceil((max_xy - min_xy) / resolution) + 1).astype(int)
+
+    x_transform = GridTransform(float(min_xy[0]), resolution, int(x_size))
+    y_transform = GridTransform(float(min_xy[1]), resolution, int(y_size))
+
+    mask_a, error_a = _rasterise(contours_a, x_transform, y_transform, resolution)
+    mask_b, error_b = _rasterise(contours_b, x_transform, y_transform, resolution)
+
+    # The exact intersection within a pixel lies between these bounds
+    # for any placement of the two coverages within it.
+    upper = np.sum(np.minimum(mask_a, mask_b)) / 255
+    lower = np.sum(np.maximum(mask_a + mask_b - 255, 0)) / 255
+
+    return (
+        upper,
+        max(lower - error_a - error_b, 0),
+        upper + error_a + error_b,
+        np.sum(mask_a) / 255,
+        error_a,
+        np.sum(mask_b) / 255,
+        error_b,
+    )
+
+
+def _rasterise(
+    contours_xy: list[NDArray[np.float64]],
+    x_transform: GridTransform,
+    y_transform: GridTransform,
+    resolution: float,
+):
+    """The exact coverage of the contours within each pixel, scaled to
+    255, along with the largest error in their area from storing it
+    as a uint8."""
+
+    contours_yx = [
+        np.flip(xy_coords, axis=1)  # pyright: ignore [reportUnknownMemberType]
+        for xy_coords in contours_xy
+    ]
+    mask = contours_to_mask(x_transform, y_transform, contours_yx, method="exact")
+    error = _QUANTISATION_ERROR * _count_boundary_pixels(contours_xy, resolution)
+
+    return mask.astype(np.int32), error
+
+
+def _count_boundary_pixels(contours: list[NDArray[np.float64]], resolution: float):
+    """An upper bound of the number of pixels that the contours pass
+    through, being the only pixels that are able to be partially
+    covered.
+
+    A single edge passes through at most one pixel more than the number
+    of grid lines that it crosses along each axis.
+    """
+
+    count = 0.0
     for xy_coords in contours:
-        geom = geom.union(shapely.geometry.Polygon(xy_coords))
+        next_xy_coords = np.roll(  # pyright: ignore [reportUnknownMemberType]
+            xy_coords, -1, axis=0
+        )
+        edges = next_xy_coords - xy_coords
+        count += np.sum(np.abs(edges)) / resolution + 3 * len(edges)
 
-    return geom
+    return count
+
+
+def from_structure_sets(
+    a: Sequence[TypedDataset],
+    b: Optional[Sequence[TypedDataset]] = None,
+    structure_names: Optional[Sequence[str]] = None,
+    max_workers: Optional[int] = None,
+) -> dict[str, NDArray[np.float64]]:
+    """Determine the Dice metric between every pairing of the
+    structures within several DICOM RT Structure Sets.
+
+    Structures are matched by their ROIName. The contours of each
+    structure are parsed, and unioned per slice, only once per
+    structure set, with the resulting geometries reused across every
+    pairing. The structures are distributed across a process pool.
+
+    Parameters
+    ----------
+    a : sequence of pydicom.Dataset
+        The RT Structure Sets of the rows of each matrix, such as one
+        per predicting model or per observer.
+    b : sequence of pydicom.Dataset, optional
+        The RT Structure Sets of the columns of each matrix, such as one
+        per reference observer. Defaults to ``a``, giving a symmetric
+        inter-observer matrix.
+    structure_names : sequence of str, optional
+        The ROINames to compare, defaults to every ROIName found within
+        any of the structure sets.
+    max_workers : int, optional
+        The number of processes used, defaults to the number of CPUs.
+        When set to 1 the Dice scores are determined within the current
+        process.
+
+    Returns
+    -------
+    dict[str, NDArray[np.float64]]
+        A (len(a), len(b)) Dice matrix per structure name. Pairings
+        where either structure set is missing the structure, or where
+        neither has any contours, are NaN.
+    """
+
+    symmetric = b is None
+    if b is None:
+        b = a
+
+    contour_maps_a = [_get_structure_contour_maps(ds) for ds in a]
+    contour_maps_b = (
+        contour_maps_a if symmetric else [_get_structure_contour_maps(ds) for ds in b]
+    )
+
+    if structure_names is None:
+        all_names: set[str] = set()
+        for contour_maps in itertools.chain(contour_maps_a, contour_maps_b):
+            all_names.update(contour_maps.keys())
+
+        structure_names = sorted(all_names)
+
+    rows = [
+        [contour_maps.get(name) for contour_maps in contour_maps_a]
+        for name in structure_names
+    ]
+    columns = [
+        [contour_maps.get(name) for contour_maps in contour_maps_b]
+        for name in structure_names
+    ]
+
+    if max_workers is None:
+        max_workers = os.cpu_count() or 1
+
+    if max_workers == 1:
+        matrices = list(map(_dice_matrix, rows, columns, itertools.repeat(symmetric)))
+    else:
+        with concurrent.futures.ProcessPoolExecutor(
+            max_workers=max_workers
+        ) as executor:
+            matrices = list(
+                executor.map(_dice_matrix, rows, columns, itertools.repeat(symmetric))
+            )
+
+    return dict(zip(structure_names, matrices))
+
+
+class _StructureSlices(NamedTuple):
+    """The unioned geometry of a structure on each of its slices, with
+    the slices sorted by ReferencedSOPInstanceUID."""
+
+    image_uids: NDArray[np.str_]
+    geometries: NDArray[np.object_]
+    areas: NDArray[np.float64]
+
+    @classmethod
+    def from_contour_map(cls, image_uid_to_contours: ImageUIDToContoursMap):
+        """Union the contours of each slice of a structure."""
+
+        image_uids = sorted(image_uid_to_contours.keys())
+        geometries = _union_per_slice(image_uid_to_contours, image_uids)
+
+        return cls(
+            image_uids=np.array(image_uids, dtype=str),
+            geometries=geometries,
+            areas=shapely.area(geometries),
+        )
+
+    def dice(self, other: "_StructureSlices") -> float:
+        """The Dice against another structure, only intersecting the
+        slices that both have contours on, or NaN if neither has any
+        area."""
+
+        total_area = float(np.sum(self.areas) + np.sum(other.areas))
+        if total_area == 0:
+            return np.nan
+
+        _, indices, other_indices = np.intersect1d(
+            self.image_uids, other.image_uids, assume_unique=True, return_indices=True
+        )
+        intersection_area = float(
+            np.sum(
+                _intersection_areas(
+                    self.geometries[indices], other.geometries[other_indices]
+                )
+            )
+        )
+
+        return 2 * intersection_area / total_area
+
+
+def _dice_matrix(
+    rows: list[Optional[ImageUIDToContoursMap]],
+    columns: list[Optional[ImageUIDToContoursMap]],
+    symmetric: bool,
+) -> NDArray[np.float64]:
+    row_slices = [
+        None if contour_map is None else _StructureSlices.from_contour_map(contour_map)
+        for contour_map in rows
+    ]
+    column_slices = (
+        row_slices
+        if symmetric
+        else [
+            None
+            if contour_map is None
+            else _StructureSlices.from_contour_map(contour_map)
+            for contour_map in columns
+        ]
+    )
+
+    matrix = np.full((len(row_slices), len(column_slices)), np.nan)
+    for i, row in enumerate(row_slices):
+        for j, column in enumerate(column_slices):
+            if row is None or column is None:
+                continue
+
+            # The Dice is symmetric, so only the upper triangle needs
+            # to be determined when comparing a set against itself.
+            if symmetric and j < i:
+                matrix[i, j] = matrix[j, i]
+                continue
+
+            matrix[i, j] = row.dice(column)
+
+    return matrix
+
+
+def _get_structure_contour_maps(ds: TypedDataset) -> dict[str, ImageUIDToContoursMap]:
+    roi_number_to_name = {
+        int(item.ROINumber): item.ROIName for item in ds.StructureSetROISequence
+    }
+
+    structure_contour_maps: dict[str, ImageUIDToContoursMap] = {}
+    for item in ds.ROIContourSequence:
+        name = roi_number_to_name[int(item.ReferencedROINumber)]
+        structure_contour_maps[name] = _get_image_uid_to_contours_map(
+            getattr(item, "ContourSequence", [])
+        )
+
+    return structure_contour_maps
+
+
+def _union_per_slice(
+    image_uid_to_contours: ImageUIDToContoursMap,
+    image_uids: list[str],
+) -> NDArray[np.object_]:
+    """Union the contours on each slice, giving an empty geometry for
+    slices without contours."""
+
+    contours_per_slice = [image_uid_to_contours.get(uid, []) for uid in image_uids]
+    counts = np.array([len(contours) for contours in contours_per_slice], dtype=int)
+
+    # Padded with None, which union_all ignores, so that every slice is
+    # unioned within a single call.
+    grouped = np.full((len(image_uids), np.max(counts, initial=0)), None, dtype=object)
+
+    if np.sum(counts) > 0:
+        rows = np.repeat(np.arange(len(image_uids)), counts)
+        columns = np.concatenate(  # pyright: ignore [reportUnknownMemberType]
+            [np.arange(count) for count in counts]
+        )
+        grouped[rows, columns] = contours_to_polygons(
+            list(itertools.chain.from_iterable(contours_per_slice))
+        )
+
+    return shapely.union_all(grouped, axis=1)
+
+
+def _intersection_areas(
+    a: NDArray[np.object_], b: NDArray[np.object_]
+) -> NDArray[np.float64]:
+    """The area of the intersection of each pair of geometries, only
+    intersecting the pairs with overlapping bounding boxes."""
+
+    a_min_x, a_min_y, a_max_x, a_max_y = shapely.bounds(a).T
+    b_min_x, b_min_y, b_max_x, b_max_y = shapely.bounds(b).T
+
+    # Empty geometries have NaN bounds, and so never overlap
+    overlapping = (
+        (a_min_x <= b_max_x)
+        & (b_min_x <= a_max_x)
+        & (a_min_y <= b_max_y)
+        & (b_min_y <= a_max_y)
+    )
+
+    intersection_areas = np.zeros(len(a))
+    intersection_areas[overlapping] = shapely.area(
+        shapely.intersection(a[overlapping], b[overlapping])
+    )
+
+    return intersection_areas
 
 
 def _get_image_uid_to_contours_map(
     contour_sequence: list[ContourSequenceItem],
 ):
-    image_uid_to_contours_map: dict[str, ContoursXY] = collections.defaultdict(list)
+    image_uid_to_contours_map: dict[
+        str, list[NDArray[np.float64]]
+    ] = collections.defaultdict(list)
 
     for item in contour_sequence:
         contour_image_sequence = item.ContourImageSequence
@@ -90,26 +643,19 @@ def _get_image_uid_to_contours_map(
         assert item.ContourGeometricType == "CLOSED_PLANAR"
 
         image_uid_to_contours_map[referenced_image_uid].append(
-            _convert_dicom_contours(item.ContourData)
+            _convert_dicom_contours(item)
         )
 
     return image_uid_to_contours_map
 
 
-def _convert_dicom_contours(contour_data: list[float]):
-    x = contour_data[0::3]
-    y = contour_data[1::3]
-    z = contour_data[2::3]
-
-    assert len(x) == len(y)
-    assert len(x) == len(z)
+def _convert_dicom_contours(item: ContourSequenceItem) -> NDArray[np.float64]:
+    xyz = contour_data.to_array(item)
 
     # Co-planar
-    assert len(set(z)) == 1
-
-    contours = list(zip(x, y))
+    assert np.all(xyz[:, 2] == xyz[0, 2])
 
-    return contours
+    return xyz[:, :2]
 
 
 def from_shapely(
@@ -177,3 +723,30 @@ def _contours_yx_to_shapely(contours: ContoursYX):
         geom = geom.union(shapely.geometry.Polygon(xy_coords))
 
     return geom
+
+
+def from_masks(a: AnyMask, b: AnyMask) -> float:
+    """Determine the Dice metric from two uint8 anti-aliased masks.
+
+    Partially encompassed pixels contribute their fraction to the
+    areas, and the intersection is taken as the pixel-wise minimum.
+    Either dense masks or `rai.mask.sparse.SparseMask` may be provided,
+    sparse masks are never expanded to their full size.
+
+    Parameters
+    ----------
+    a : NDArray[np.uint8] or SparseMask
+    b : NDArray[np.uint8] or SparseMask
+
+    Returns
+    -------
+    float
+        The Dice score
+    """
+
+    sparse_a = as_sparse(a)
+    sparse_b = as_sparse(b)
+
+    intersection_area = sparse_a.intersection(sparse_b).area()
+
+    return 2 * intersection_area / (sparse_a.area() + sparse_b.area())
@@ -0,0 +1,408 @@
+# Copyright (C) 2022 Radiotherapy AI Holdings Pty Ltd
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+"""Determining surface distance metrics
+
+The surface of each structure is represented by points, each weighted
+by the length (or for masks, the voxel count) of the surface that it
+stands in for. The distance from every point of one surface to the
+nearest point of the other is then determined within a single
+vectorised query, using a KD-tree for contours and a Euclidean distance
+transform for masks.
+
+Further explanation of surface Dice is available at:
+<https://arxiv.org/abs/1809.04430>
+"""
+
+from typing import NamedTuple, Sequence
+
+import numpy as np
+import scipy.ndimage
+import scipy.spatial
+from numpy.typing import NDArray
+
+from rai.dicom import contour_data
+from rai.dicom.typing import ContourSequenceItem
+from rai.mask.convert import DEFAULT_MASK_LEVEL
+from rai.mask.sparse import AnyMask, SparseMask, as_sparse
+
+from .dice import ContoursYX
+
+# In the units of the coordinates, mm for DICOM
+DEFAULT_TOLERANCE = 2.0
+DEFAULT_POINT_SPACING = 0.5
+
+
+class SurfaceDistances(NamedTuple):
+    """The surface distance metrics between two structures.
+
+    Attributes
+    ----------
+    hausdorff_95 : float
+        The larger of the two directed 95th percentile surface
+        distances.
+    mean_surface_distance : float
+        The mean distance from each surface to the other, across both
+        surfaces.
+    surface_dice : float
+        The fraction of both surfaces that are within ``tolerance`` of
+        the other surface.
+    tolerance : float
+        The tolerance utilised for the surface Dice.
+    """
+
+    hausdorff_95: float
+    mean_surface_distance: float
+    surface_dice: float
+    tolerance: float
+
+
+def from_contour_sequence(
+    a: list[ContourSequenceItem],
+    b: list[ContourSequenceItem],
+    tolerance: float = DEFAULT_TOLERANCE,
+    point_spacing: float = DEFAULT_POINT_SPACING,
+) -> SurfaceDistances:
+    """Determine the surface distance metrics between two DICOM Contour
+    Sequences.
+
+    The surface of each structure is taken as its contour lines across
+    all slices, with distances determined in 3D. The contour lines are
+    resampled so that neighbouring points are no further apart than
+    ``point_spacing``.
+
+    Parameters
+    ----------
+    a : pydicom.Sequence
+    b : pydicom.Sequence
+    tolerance : float, optional
+        The distance within which surfaces are considered to agree for
+        the surface Dice.
+    point_spacing : float, optional
+        The largest distance between neighbouring points along a
+        contour line.
+
+    Returns
+    -------
+    SurfaceDistances
+    """
+
+    return _from_contours(
+        _contour_sequence_to_contours(a),
+        _contour_sequence_to_contours(b),
+        tolerance,
+        point_spacing,
+    )
+
+
+def from_contours(
+    a: ContoursYX,
+    b: ContoursYX,
+    tolerance: float = DEFAULT_TOLERANCE,
+    point_spacing: float = DEFAULT_POINT_SPACING,
+) -> SurfaceDistances:
+    """Determine the surface distance metrics between the contours of
+    two structures on a single slice.
+
+    Parameters
+    ----------
+    a : list of (n,2)-ndarrays in row column (y x) order
+    b : list of (n,2)-ndarrays in row column (y x) order
+    tolerance : float, optional
+        The distance within which surfaces are considered to agree for
+        the surface Dice.
+    point_spacing : float, optional
+        The largest distance between neighbouring points along a
+        contour line.
+
+    Returns
+    -------
+    SurfaceDistances
+    """
+
+    return _from_contours(a, b, tolerance, point_spacing)
+
+
+def from_masks(
+    a: AnyMask,
+    b: AnyMask,
+    spacing: Sequence[float],
+    tolerance: float = DEFAULT_TOLERANCE,
+    level: float = DEFAULT_MASK_LEVEL,
+) -> SurfaceDistances:
+    """Determine the surface distance metrics between two uint8
+    anti-aliased masks.
+
+    Each mask is binarised at ``level``, and its surface taken as the
+    voxels on its border. The distance transform is only undergone
+    within the bounding box of both masks, as no surface voxel lies
+    outside of it. Sparse masks are only ever expanded into this
+    bounding box, rather than into full masks.
+
+    Parameters
+    ----------
+    a : NDArray[np.uint8] or SparseMask
+        Either a single (y, x) slice or a (z, y, x) volume.
+    b : NDArray[np.uint8] or SparseMask
+        Of the same shape as ``a``.
+    spacing : sequence of float
+        The distance between neighbouring voxels along each axis of the
+        masks.
+    tolerance : float, optional
+        The distance within which surfaces are considered to agree for
+        the surface Dice.
+    level : float, optional
+        The mask value above which a voxel is within the structure.
+
+    Returns
+    -------
+    SurfaceDistances
+    """
+
+    shape_a, shape_b = tuple(a.shape), tuple(b.shape)
+    if shape_a != shape_b:
+        raise ValueError(
+            "Masks need to have the same shape, however "
+            f"{shape_a} and {shape_b} were provided."
+        )
+
+    if len(spacing) != len(shape_a):
+        raise ValueError(
+            f"A spacing is needed for each of the {len(shape_a)} mask axes, "
+            f"however {len(spacing)} were provided."
+        )
+
+    if isinstance(a, SparseMask) or isinstance(b, SparseMask):
+        values_a, values_b = _sparse_windows(as_sparse(a), as_sparse(b))
+    else:
+        values_a, values_b = a, b
+
+    binary_a = values_a > level
+    binary_b = values_b > level
+
+    window = _bounding_box(binary_a | binary_b)
+    surface_a = _mask_surface(binary_a[window])
+    surface_b = _mask_surface(binary_b[window])
+
+    distances_a = _distances_to_surface(surface_a, surface_b, spacing)
+    distances_b = _distances_to_surface(surface_b, surface_a, spacing)
+
+    return _summarise(
+        distances_a,
+        np.ones_like(distances_a),
+        distances_b,
+        np.ones_like(distances_b),
+        tolerance,
+    )
+
+
+def _from_contours(
+    a: list[NDArray[np.float64]],
+    b: list[NDArray[np.float64]],
+    tolerance: float,
+    point_spacing: float,
+):
+    points_a, weights_a = _resample_contours(a, point_spacing)
+    points_b, weights_b = _resample_contours(b, point_spacing)
+
+    distances_a = _distances_to_points(points_a, points_b)
+    distances_b = _distances_to_points(points_b, points_a)
+
+    return _summarise(distances_a, weights_a, distances_b, weights_b, tolerance)
+
+
+def _contour_sequence_to_contours(contour_sequence: list[ContourSequenceItem]):
+    contours: list[NDArray[np.float64]] = []
+    for item in contour_sequence:
+        assert item.ContourGeometricType == "CLOSED_PLANAR"
+
+        contours.append(contour_data.to_array(item))
+
+    return contours
+
+
+def _resample_contours(contours: list[NDArray[np.float64]], point_spacing: float):
+    """Resample closed contours so that no two neighbouring points are
+    further apart than the point spacing.
+
+    Each returned point is weighted by the length of contour line that
+    it stands in for, being the length of the edge segment that starts
+    at it. All edges of all contours are resampled in a single pass.
+    """
+
+    if not contours:
+        return np.zeros((0, 2)), np.zeros(0)
+
+    starts = np.concatenate(contours)  # pyright: ignore [reportUnknownMemberType]
+    ends = np.concatenate(  # pyright: ignore [reportUnknownMemberType]
+        [np.roll(contour, -1, axis=0) for contour in contours]
+    )
+
+    edges = ends - starts
+    edge_lengths = np.linalg.norm(edges, axis=-1)
+    segments_per_edge = np.maximum(np.ceil(edge_lengths / point_spacing), 1).astype(int)
+
+    edge_indices = np.repeat(np.arange(len(edges)), segments_per_edge)
+
+    # The position of each point along its edge, from 0 up to but not
+    # including 1, as the following edge's start covers 1.
+    first_point_of_edge = np.cumsum(segments_per_edge) - segments_per_edge
+    positions = (
+        np.arange(len(edge_indices)) - first_point_of_edge[edge_indices]
+    ) / segments_per_edge[edge_indices]
+
+    points = starts[edge_indices] + positions[:, None] * edges[edge_indices]
+    weights = (edge_lengths / segments_per_edge)[edge_indices]
+
+    return points, weights
+
+
+def _distances_to_points(
+    points: NDArray[np.float64], other_points: NDArray[np.float64]
+) -> NDArray[np.float64]:
+    if len(points) == 0:
+        return np.zeros(0)
+
+    if len(other_points) == 0:
+        return np.full(len(points), np.inf)
+
+    distances, _ = scipy.spatial.cKDTree(other_points).query(points)
+
+    return distances
+
+
+def _sparse_windows(a: SparseMask, b: SparseMask):
+    """The values of two sparse masks within the window that covers
+    both of their stored windows, padded by a pixel, so that neither
+    is expanded into a full mask."""
+
+    union = a.union(b)
+    rows = slice(max(union.rows.start - 1, 0), min(union.rows.stop + 1, a.shape[0]))
+    columns = slice(
+        max(union.columns.start - 1, 0), min(union.columns.stop + 1, a.shape[1])
+    )
+
+    windows: list[NDArray[np.uint8]] = []
+    for mask in (a, b):
+        window = np.zeros(
+            (rows.stop - rows.start, columns.stop - columns.start), dtype=np.uint8
+        )
+        if mask.data.size:
+            window[
+                mask.rows.start - rows.start : mask.rows.stop - rows.start,
+                mask.columns.start - columns.start : mask.columns.stop - columns.start,
+            ] = mask.data
+
+        windows.append(window)
+
+    return windows[0], windows[1]
+
+
+def _bounding_box(mask: NDArray[np.bool_]) -> tuple[slice, ...]:
+    """The bounding box of a mask, padded by a voxel so that the
+    borders of the mask are never on the edge of the window."""
+
+    window: list[slice] = []
+    for axis in range(mask.ndim):
+        other_axes = tuple(i for i in range(mask.ndim) if i != axis)
+        indices = np.flatnonzero(np.any(mask, axis=other_axes))
+
+        if len(indices) == 0:
+            return tuple(slice(0, 0) for _ in range(mask.ndim))
+
+        window.append(slice(max(indices[0] - 1, 0), indices[-1] + 2))
+
+    return tuple(window)
+
+
+def _mask_surface(mask: NDArray[np.bool_]) -> NDArray[np.bool_]:
+    if mask.size == 0:
+        return mask
+
+    return mask & ~scipy.ndimage.binary_erosion(mask, border_value=0)
+
+
+def _distances_to_surface(
+    surface: NDArray[np.bool_],
+    other_surface: NDArray[np.bool_],
+    spacing: Sequence[float],
+) -> NDArray[np.float64]:
+    if not np.any(surface):
+        return np.zeros(0)
+
+    if not np.any(other_surface):
+        return np.full(np.count_nonzero(surface), np.inf)
+
+    distance_map = scipy.ndimage.distance_transform_edt(
+        ~other_surface, sampling=spacing
+    )
+
+    return distance_map[surface]
+
+
+def _summarise(
+    distances_a: NDArray[np.float64],
+    weights_a: NDArray[np.float64],
+    distances_b: NDArray[np.float64],
+    weights_b: NDArray[np.float64],
+    tolerance: float,
+):
+    total_weight = np.sum(weights_a) + np.sum(weights_b)
+    if total_weight == 0:
+        return SurfaceDistances(np.nan, np.nan, np.nan, tolerance)
+
+    if len(distances_a) == 0 or len(distances_b) == 0:
+        return SurfaceDistances(np.inf, np.inf, 0.0, tolerance)
+
+    hausdorff_95 = max(
+        _weighted_percentile(distances_a, weights_a, 95),
+        _weighted_percentile(distances_b, weights_b, 95),
+    )
+
+    mean_surface_distance = float(
+        (np.sum(distances_a * weights_a) + np.sum(distances_b * weights_b))
+        / total_weight
+    )
+
+    surface_dice = float(
+        (
+            np.sum(weights_a[distances_a <= tolerance])
+            + np.sum(weights_b[distances_b <= tolerance])
+        )
+        / total_weight
+    )
+
+    return SurfaceDistances(
+        hausdorff_95=hausdorff_95,
+        mean_surface_distance=mean_surface_distance,
+        surface_dice=surface_dice,
+        tolerance=tolerance,
+    )
+
+
+def _weighted_percentile(
+    values: NDArray[np.float64], weights: NDArray[np.float64], percentile: float
+) -> float:
+    """The smallest value for which the weights of it and all smaller
+    values make up at least the given percentage of the total weight."""
+
+    order = np.argsort(values)
+    cumulative_weights = np.cumsum(weights[order])
+
+    index = np.searchsorted(
+        cumulative_weights, percentile / 100 * cumulative_weights[-1]
+    )
+
+    return float(values[order][min(index, len(values) - 1)])
@@ -25,15 +25,18 @@ from rai.dicom import append, uid
 from rai.dicom.typing import TypedDataset
 
 from . import dice
-
-_ComparisonSlices = list[tuple[dice.ContoursXY, dice.ContoursXY]]
+from ._testing import (
+    ComparisonSlices,
+    append_contour_sequence_item,
+    create_slice_aligned_dicom_files,
+)
 
 
 def test_dice_from_dicom():
     """Test the comparison of two DICOM files with the Dice metric"""
 
     # TODO: Create more test cases.
-    slices: _ComparisonSlices = [
+    slices: ComparisonSlices = [
         # Unit square with no overlap on first slice
         ([[(0, 0), (0, 1), (1, 1), (1, 0)]], []),
         # A Unit square for one, and a 0.5 x 0.5 square for the other,
@@ -46,7 +49,7 @@ def test_dice_from_dicom():
         ([[(0, 0), (0, 1), (1, 1), (1, 0)]], []),
     ]
 
-    ds_a, ds_b = _create_slice_aligned_dicom_files(slices)
+    ds_a, ds_b = create_slice_aligned_dicom_files(slices)
 
     a = ds_a.ROIContourSequence[0].ContourSequence
     b = ds_b.ROIContourSequence[0].ContourSequence
@@ -58,81 +61,219 @@ def test_dice_from_dicom():
     assert returned_dice == 2 * 0.5 * 0.5 / (0.5 * 0.5 + 1 * 3)
 
 
-def _create_slice_aligned_dicom_files(slices: _ComparisonSlices):
-    """Test utility for aligned contour comparisons.
+def test_dice_by_slice_from_dicom():
+    """Test the per slice areas, including slices contoured on only one
+    side and slices with overlapping contours"""
 
-    Take a list of aligned slice contour coordinates and create two
-    DICOM files where the aligned slices have the same
-    ReferencedSOPInstanceUID, and therefore the aligned slices within
-    the provided list are also aligned between the corresponding DICOM
-    pairs.
+    slices: ComparisonSlices = [
+        # Only contoured within a
+        ([[(0, 0), (0, 1), (1, 1), (1, 0)]], []),
+        # Two overlapping unit squares that union to an area of 1.5,
+        # against a unit square which intersects 1 of it.
+        (
+            [
+                [(0, 0), (0, 1), (1, 1), (1, 0)],
+                [(0.5, 0), (0.5, 1), (1.5, 1), (1.5, 0)],
+            ],
+            [[(0, 0), (0, 1), (1, 1), (1, 0)]],
+        ),
+        # Only contoured within b
+        ([], [[(0, 0), (0, 2), (2, 2), (2, 0)]]),
+        # Disjoint squares on the same slice
+        ([[(0, 0), (0, 1), (1, 1), (1, 0)]], [[(5, 5), (5, 6), (6, 6), (6, 5)]]),
+    ]
 
-    """
+    ds_a, ds_b = create_slice_aligned_dicom_files(slices)
+
+    a = ds_a.ROIContourSequence[0].ContourSequence
+    b = ds_b.ROIContourSequence[0].ContourSequence
+
+    overlaps = dice.from_contour_sequence_by_slice(a, b)
+    assert len(overlaps.image_uids) == len(slices)
+
+    areas = sorted(zip(overlaps.areas_a, overlaps.areas_b, overlaps.intersection_areas))
+    assert np.allclose(areas, [(0, 4, 0), (1, 0, 0), (1, 1, 0), (1.5, 1, 1)])
+
+    expected_dice = 2 * 1 / (1 + 1.5 + 1 + 4 + 1 + 1)
+    assert np.isclose(overlaps.dice, expected_dice)
+    assert np.isclose(dice.from_contour_sequence(a, b), expected_dice)
 
-    contour_sequence_a: list[append.DicomItem] = []
-    contour_sequence_b: list[append.DicomItem] = []
 
-    for i, (contours_on_a, contours_on_b) in enumerate(slices):
-        reference_sop_instance_uid = pydicom.uid.generate_uid(
-            prefix=uid.RAI_CLIENT_ROOT_UID_PREFIX
+def test_raster_dice_bounds():
+    """Test that the raster method's bounds contain the exact polygon
+    Dice, and that they tighten with resolution"""
+
+    theta = np.linspace(0, 2 * np.pi, 200, endpoint=False)
+
+    def circle(radius: float, x: float, y: float) -> dice.ContourXY:
+        return list(zip(radius * np.cos(theta) + x, radius * np.sin(theta) + y))
+
+    slices: ComparisonSlices = [
+        ([circle(10, 0, 0)], [circle(10.5, 0.3, -0.2)]),
+        ([circle(20, 5, 5), circle(3, 40, 40)], [circle(19, 4.2, 5.9)]),
+        ([], [circle(2, 0, 0)]),
+        ([circle(8, 0, 0)], [circle(8, 30, 0)]),
+    ]
+
+    ds_a, ds_b = create_slice_aligned_dicom_files(slices)
+
+    a = ds_a.ROIContourSequence[0].ContourSequence
+    b = ds_b.ROIContourSequence[0].ContourSequence
+
+    polygon = dice.from_contour_sequence_by_slice(a, b)
+    assert polygon.dice_bounds == (polygon.dice, polygon.dice)
+
+    previous_width = np.inf
+    for resolution in (1, 0.5, 0.25):
+        raster = dice.from_contour_sequence_by_slice(
+            a, b, method="raster", resolution=resolution
         )
+        assert raster.image_uids == polygon.image_uids
 
-        for contour in contours_on_a:
-            _append_contour_sequence_item(
-                contour_sequence=contour_sequence_a,
-                reference_sop_instance_uid=reference_sop_instance_uid,
-                contour=contour,
-                z_value=i,
-            )
-
-        for contour in contours_on_b:
-            _append_contour_sequence_item(
-                contour_sequence=contour_sequence_b,
-                reference_sop_instance_uid=reference_sop_instance_uid,
-                contour=contour,
-                z_value=i,
-            )
-
-    a = TypedDataset()
-    b = TypedDataset()
+        lower, upper = raster.dice_bounds
+        assert lower <= polygon.dice <= upper
+        assert lower <= raster.dice <= upper
 
-    append.append_dict_to_dataset(
-        ds=a,
-        to_append={"ROIContourSequence": [{"ContourSequence": contour_sequence_a}]},
-    )
-    append.append_dict_to_dataset(
-        ds=b,
-        to_append={"ROIContourSequence": [{"ContourSequence": contour_sequence_b}]},
+        assert np.all(np.abs(raster.areas_a - polygon.areas_a) <= raster.area_errors_a)
+        assert np.all(np.abs(raster.areas_b - polygon.areas_b) <= raster.area_errors_b)
+        assert np.all(raster.intersection_lower <= polygon.intersection_areas)
+        assert np.all(polygon.intersection_areas <= raster.intersection_upper)
+
+        assert upper - lower < previous_width
+        previous_width = upper - lower
+
+    assert abs(raster.dice - polygon.dice) < 0.005
+
+
+def test_raster_dice_self_intersecting():
+    """Test that a self-intersecting contour is treated as it is by the
+    polygon method, and that the bounds still contain its Dice"""
+
+    # Offset so that the crossing point lies within a pixel
+    figure_of_eight = [
+        (x + 0.13, y + 0.21) for x, y in ((-4, -3), (4, 3), (-4, 3), (4, -3))
+    ]
+    square = [(-4, 0), (-4, 3), (4, 3), (4, 0)]
+
+    slices: ComparisonSlices = [([figure_of_eight], [square])]
+
+    ds_a, ds_b = create_slice_aligned_dicom_files(slices)
+
+    a = ds_a.ROIContourSequence[0].ContourSequence
+    b = ds_b.ROIContourSequence[0].ContourSequence
+
+    polygon = dice.from_contour_sequence_by_slice(a, b)
+    raster = dice.from_contour_sequence_by_slice(a, b, method="raster")
+
+    # Both lobes are encompassed, each with an area of 12
+    assert np.allclose(polygon.areas_a, 24)
+    assert np.all(np.abs(raster.areas_a - polygon.areas_a) <= raster.area_errors_a)
+
+    lower, upper = raster.dice_bounds
+    assert lower <= polygon.dice <= upper
+    assert abs(raster.dice - polygon.dice) < 0.005
+
+
+def test_dice_matrix_from_structure_sets():
+    """Test that the Dice matrices match pairwise comparisons of the
+    contour sequences, including missing structures"""
+
+    image_uids = [
+        pydicom.uid.generate_uid(prefix=uid.RAI_CLIENT_ROOT_UID_PREFIX)
+        for _ in range(3)
+    ]
+
+    square: dice.ContourXY = [(0, 0), (0, 1), (1, 1), (1, 0)]
+    observers: list[dict[str, list[dice.ContoursXY]]] = [
+        {
+            "Lens_L": [[square], [square], []],
+            "Parotid_R": [[], [_scale(square, 2)], [_scale(square, 2)]],
+        },
+        {
+            "Lens_L": [[_scale(square, 0.5)], [square], [square]],
+            "Parotid_R": [[], [_scale(square, 3)], []],
+        },
+        {
+            "Lens_L": [[], [_scale(square, 0.75)], [square]],
+        },
+    ]
+
+    datasets = [
+        _create_structure_set(structures, image_uids) for structures in observers
+    ]
+
+    for max_workers in (1, 2):
+        matrices = dice.from_structure_sets(datasets, max_workers=max_workers)
+        assert set(matrices) == {"Lens_L", "Parotid_R"}
+
+        for name, matrix in matrices.items():
+            assert matrix.shape == (3, 3)
+
+            for i, ds_a in enumerate(datasets):
+                for j, ds_b in enumerate(datasets):
+                    if name not in observers[i] or name not in observers[j]:
+                        assert np.isnan(matrix[i, j])
+                        continue
+
+                    expected = dice.from_contour_sequence(
+                        _get_contour_sequence(ds_a, name),
+                        _get_contour_sequence(ds_b, name),
+                    )
+                    assert np.isclose(matrix[i, j], expected)
+
+    predicted_vs_references = dice.from_structure_sets(
+        datasets[:1], datasets[1:], structure_names=["Lens_L"], max_workers=1
     )
+    assert np.allclose(predicted_vs_references["Lens_L"], matrices["Lens_L"][:1, 1:])
 
-    return a, b
 
+def _scale(contour: dice.ContourXY, scale: float) -> dice.ContourXY:
+    return [(x * scale, y * scale) for x, y in contour]
 
-def _append_contour_sequence_item(
-    contour_sequence: list[append.DicomItem],
-    reference_sop_instance_uid: str,
-    contour: dice.ContourXY,
-    z_value: float,
+
+def _create_structure_set(
+    structures: dict[str, list[dice.ContoursXY]], image_uids: list[str]
 ):
-    contour_sequence.append(
-        {
-            "ContourImageSequence": [
-                {
-                    "ReferencedSOPInstanceUID": reference_sop_instance_uid,
-                }
-            ],
-            "ContourData": _contour_to_dicom_format(contour, z_value=z_value),
-            "ContourGeometricType": "CLOSED_PLANAR",
-        }
+    structure_set_roi_sequence: list[append.DicomItem] = []
+    roi_contour_sequence: list[append.DicomItem] = []
+
+    for roi_number, (name, slices) in enumerate(structures.items(), start=1):
+        contour_sequence: list[append.DicomItem] = []
+        for z_value, (image_uid, contours) in enumerate(zip(image_uids, slices)):
+            for contour in contours:
+                append_contour_sequence_item(
+                    contour_sequence=contour_sequence,
+                    reference_sop_instance_uid=image_uid,
+                    contour=contour,
+                    z_value=z_value,
+                )
+
+        structure_set_roi_sequence.append({"ROINumber": roi_number, "ROIName": name})
+        roi_contour_sequence.append(
+            {"ReferencedROINumber": roi_number, "ContourSequence": contour_sequence}
+        )
+
+    ds = TypedDataset()
+    append.append_dict_to_dataset(
+        ds=ds,
+        to_append={
+            "StructureSetROISequence": structure_set_roi_sequence,
+            "ROIContourSequence": roi_contour_sequence,
+        },
     )
 
+    return ds
+
 
-def _contour_to_dicom_format(contour: dice.ContourXY, z_value: float):
-    dicom_format_contour: list[float] = []
-    for x, y in contour:
-        dicom_format_contour.extend([x, y, z_value])
+def _get_contour_sequence(ds: TypedDataset, name: str):
+    (roi_number,) = [
+        item.ROINumber for item in ds.StructureSetROISequence if item.ROIName == name
+    ]
+    (roi_contour,) = [
+        item for item in ds.ROIContourSequence if item.ReferencedROINumber == roi_number
+    ]
 
-    return dicom_format_contour
+    return roi_contour.ContourSequence
 
 
 def test_dice_from_polygons():
@@ -0,0 +1,113 @@
+# Copyright (C) 2022 Radiotherapy AI Holdings Pty Ltd
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+"""Testing the surface distance metrics"""
+
+import numpy as np
+import pytest
+
+from rai.mask.convert import contours_to_mask
+from rai.mask.sparse import SparseMask
+
+from . import surface
+from ._testing import create_slice_aligned_dicom_files
+
+
+def test_concentric_circles():
+    """Concentric circles with radii 2 apart have every surface point 2
+    from the other surface, across contours, contour sequences, and
+    masks"""
+
+    theta = np.linspace(0, 2 * np.pi, 720, endpoint=False)
+    inner = np.stack([10 * np.sin(theta), 10 * np.cos(theta)], axis=-1)
+    outer = np.stack([12 * np.sin(theta), 12 * np.cos(theta)], axis=-1)
+
+    from_contours = surface.from_contours([inner], [outer], tolerance=2.5)
+    assert np.isclose(from_contours.hausdorff_95, 2, atol=0.01)
+    assert np.isclose(from_contours.mean_surface_distance, 2, atol=0.01)
+    assert from_contours.surface_dice == 1
+
+    assert surface.from_contours([inner], [outer], tolerance=1.5).surface_dice == 0
+
+    identical = surface.from_contours([inner], [inner])
+    assert identical.hausdorff_95 == 0
+    assert identical.mean_surface_distance == 0
+    assert identical.surface_dice == 1
+
+    ds_a, ds_b = create_slice_aligned_dicom_files(
+        [([list(map(tuple, inner))], [list(map(tuple, outer))])] * 3
+    )
+    from_dicom = surface.from_contour_sequence(
+        ds_a.ROIContourSequence[0].ContourSequence,
+        ds_b.ROIContourSequence[0].ContourSequence,
+        tolerance=2.5,
+    )
+    assert np.allclose(from_dicom, from_contours, atol=0.01)
+
+    grid = np.arange(-15, 15.25, 0.25)
+    mask_a = contours_to_mask(grid, grid, [inner], method="exact")
+    mask_b = contours_to_mask(grid, grid, [outer], method="exact")
+
+    # Masks are only able to represent the surfaces to within a pixel
+    from_masks = surface.from_masks(mask_a, mask_b, spacing=(0.25, 0.25), tolerance=2.5)
+    assert abs(from_masks.hausdorff_95 - 2) <= 0.25
+    assert abs(from_masks.mean_surface_distance - 2) <= 0.25
+    assert from_masks.surface_dice == 1
+
+    empty = np.zeros_like(mask_a)
+    assert surface.from_masks(mask_a, empty, spacing=(0.25, 0.25)).surface_dice == 0
+    assert np.isnan(surface.from_masks(empty, empty, spacing=(0.25, 0.25)).surface_dice)
+
+
+def test_sparse_masks(monkeypatch: pytest.MonkeyPatch):
+    """Sparse masks give the same surface distances as dense masks,
+    without ever being expanded into full masks"""
+
+    theta = np.linspace(0, 2 * np.pi, 720, endpoint=False)
+    circle = np.stack([np.sin(theta), np.cos(theta)], axis=-1)
+
+    grid = np.arange(-50, 50.25, 0.25)
+    mask_a = contours_to_mask(grid, grid, [10 * circle + [5, 0]], method="exact")
+    mask_b = contours_to_mask(grid, grid, [12 * circle], method="exact")
+    empty = np.zeros_like(mask_a)
+
+    expected = [
+        surface.from_masks(a, b, spacing=(0.25, 0.25))
+        for a, b in ((mask_a, mask_b), (mask_a, empty), (empty, empty))
+    ]
+
+    def _to_dense(_: SparseMask):
+        raise AssertionError("Sparse masks are not to be made dense")
+
+    monkeypatch.setattr(SparseMask, "to_dense", _to_dense)
+
+    sparse_a = SparseMask.from_dense(mask_a)
+    sparse_b = SparseMask.from_dense(mask_b)
+    sparse_empty = SparseMask.from_dense(empty)
+
+    for pairs, result in zip(
+        (
+            [(sparse_a, sparse_b), (sparse_a, mask_b), (mask_a, sparse_b)],
+            [(sparse_a, sparse_empty), (sparse_a, empty)],
+            [(sparse_empty, sparse_empty), (empty, sparse_empty)],
+        ),
+        expected,
+    ):
+        for a, b in pairs:
+            assert np.allclose(
+                surface.from_masks(a, b, spacing=(0.25, 0.25)),
+                result,
+                equal_nan=True,
+            )
@@ -0,0 +1,28 @@
+from typing import Any, Optional, Union
+
+import numpy as np
+from numpy.typing import ArrayLike, NDArray
+
+from .geometry.base import BaseGeometry
+
+GeometryArray = NDArray[np.object_]
+
+def area(geometry: GeometryArray) -> NDArray[np.float64]: ...
+def bounds(geometry: GeometryArray) -> NDArray[np.float64]: ...
+def get_coordinates(
+    geometry: Union[BaseGeometry, GeometryArray]
+) -> NDArray[np.float64]: ...
+def get_exterior_ring(geometry: GeometryArray) -> GeometryArray: ...
+def get_type_id(geometry: GeometryArray) -> NDArray[np.int_]: ...
+def intersection(a: GeometryArray, b: GeometryArray) -> GeometryArray: ...
+def is_empty(geometry: GeometryArray) -> NDArray[np.bool_]: ...
+def is_valid(geometry: GeometryArray) -> NDArray[np.bool_]: ...
+def linearrings(
+    coords: NDArray[np.float64], indices: Optional[ArrayLike] = ...
+) -> GeometryArray: ...
+def make_valid(geometry: GeometryArray) -> GeometryArray: ...
+def polygons(geometries: Any) -> GeometryArray: ...
+def simplify(
+    geometry: GeometryArray, tolerance: float, preserve_topology: bool = ...
+) -> GeometryArray: ...
+def union_all(geometries: GeometryArray, axis: Optional[int] = ...) -> Any: ...
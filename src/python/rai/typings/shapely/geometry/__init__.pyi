@@ -1,2 +1,4 @@
 # https://github.com/microsoft/pylance-release/issues/856#issuecomment-763793949
 from .polygon import Polygon as Polygon
+
+def box(minx: float, miny: float, maxx: float, maxy: float) -> Polygon: ...
@@ -1,6 +1,11 @@
 import numpy as np
 from numpy.typing import NDArray
 
+def polygon(
+    r: NDArray[np.float64],
+    c: NDArray[np.float64],
+    shape: tuple[int, int] = ...,
+) -> tuple[NDArray[np.intp], NDArray[np.intp]]: ...
 def polygon2mask(
     image_shape: tuple[int, int], polygon: NDArray[np.float64]
 ) -> NDArray[np.float64]: ...
@@ -18,4 +18,7 @@
 
 """AI assisted treatments accessible to all"""
 
+from .record import dicom_utilisation as dicom_utilisation
+from .record import dicom_utilisation_many as dicom_utilisation_many
+
 __version__ = "0.3.0-dev7"
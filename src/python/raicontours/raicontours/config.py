@@ -18,7 +18,7 @@
 """RAi contours model configuration"""
 
 import pathlib
-from typing import Union
+from typing import Optional, Sequence, Union
 
 from typing_extensions import TypedDict
 
@@ -135,3 +135,19 @@ def get_mask_level(cfg: Config, structure_name: StructureName):
         mask_level = cfg["mask_level"]
 
     return mask_level
+
+
+def get_mask_levels(
+    cfg: Config, structure_names: Optional[Sequence[StructureName]] = None
+):
+    """Determine the configuration mask level for each structure.
+
+    Defaults to the structures within cfg['structures'], in which case
+    the returned levels are in the same order as the model's output
+    masks.
+    """
+
+    if structure_names is None:
+        structure_names = cfg["structures"]
+
+    return [get_mask_level(cfg, structure_name) for structure_name in structure_names]
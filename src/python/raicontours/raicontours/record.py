@@ -14,38 +14,178 @@
 # You should have received a copy of the GNU Affero General Public License
 # along with this program.  If not, see <https://www.gnu.org/licenses/>.
 
-"""Model creation record utilities"""
-
-
+"""Model creation record utilities
+
+The training record is kept within ``training_record.json``, and also
+compiled into ``training_record.bin`` by `write_binary_record`. The
+binary record is a sorted array of fixed size records, each being a
+StudyInstanceUID null padded to the 64 character limit of a UID,
+followed by a single byte utilisation code. It is memory mapped and
+binary searched, so that it never needs to be parsed.
+"""
+
+import bisect
+import concurrent.futures
 import json
+import mmap
+import os
 from functools import lru_cache
-from typing import Set, Tuple
+from typing import Dict, List, Optional, Sequence, Set, Tuple, Union
 
 import pydicom
+import pydicom.filereader
+from pydicom.tag import BaseTag, Tag
 
 from raicontours._paths import HERE
 from raicontours.typing import UtilisationRecord
 
+JSON_RECORD_PATH = HERE / "training_record.json"
+BINARY_RECORD_PATH = HERE / "training_record.bin"
+
+UID_SIZE = 64
+RECORD_SIZE = UID_SIZE + 1
+
+_CODES: Dict[UtilisationRecord, bytes] = {
+    UtilisationRecord.TRAINING: b"T",
+    UtilisationRecord.VALIDATION: b"V",
+}
+_UTILISATIONS = {code: utilisation for utilisation, code in _CODES.items()}
+
+_STUDY_INSTANCE_UID = Tag("StudyInstanceUID")
+
 
 def dicom_utilisation(ds: pydicom.Dataset):
     """Determine the utilisation status of a given pydicom dataset"""
 
+    return _study_utilisation(ds.StudyInstanceUID)
+
+
+def dicom_utilisation_many(
+    datasets: Sequence[Union[str, "os.PathLike[str]", pydicom.Dataset]],
+    max_workers: Optional[int] = None,
+) -> List[UtilisationRecord]:
+    """Determine the utilisation status of many DICOM files at once, such
+    as when auditing a whole PACS export.
+
+    Only the StudyInstanceUID of each file is read, with reading stopped
+    as soon as it has been passed. Files are read across a thread pool.
+
+    Parameters
+    ----------
+    datasets : sequence of path-like or pydicom.Dataset
+        Either the paths of DICOM files, or already read datasets.
+    max_workers : int, optional
+        The number of threads used to read files, defaults to the
+        number of CPUs.
+
+    Returns
+    -------
+    list[UtilisationRecord]
+        The utilisation status of each file, in the order given.
+    """
+
+    if max_workers is None:
+        max_workers = os.cpu_count()
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+        study_uids = list(executor.map(_read_study_uid, datasets))
+
+    return [_study_utilisation(study_uid) for study_uid in study_uids]
+
+
+def write_binary_record():
+    """Compile ``training_record.json`` into ``training_record.bin``.
+
+    Needs to be run whenever the JSON record is changed.
+    """
+
     training, validation = _training_record()
 
-    study_uid = ds.StudyInstanceUID
+    records: Dict[bytes, bytes] = {}
+    for utilisation, study_uids in (
+        (UtilisationRecord.VALIDATION, validation),
+        (UtilisationRecord.TRAINING, training),
+    ):
+        for study_uid in study_uids:
+            records[_encode_uid(study_uid)] = _CODES[utilisation]
+
+    with open(BINARY_RECORD_PATH, "wb") as f:
+        for encoded_uid in sorted(records):
+            f.write(encoded_uid + records[encoded_uid])
+
+
+def _read_study_uid(dataset: Union[str, "os.PathLike[str]", pydicom.Dataset]) -> str:
+    if isinstance(dataset, pydicom.Dataset):
+        return dataset.StudyInstanceUID
 
-    if study_uid in training:
-        return UtilisationRecord.TRAINING
+    with open(dataset, "rb") as f:
+        partial = pydicom.filereader.read_partial(
+            f,
+            stop_when=_after_study_uid,
+            specific_tags=[_STUDY_INSTANCE_UID],
+        )
 
-    if study_uid in validation:
-        return UtilisationRecord.VALIDATION
+    return partial.StudyInstanceUID
 
-    return UtilisationRecord.NOT_USED
+
+def _after_study_uid(tag: BaseTag, *_):
+    return tag > _STUDY_INSTANCE_UID
+
+
+def _study_utilisation(study_uid: str) -> UtilisationRecord:
+    # UIDs are only ever ASCII, so any other value is not a recorded UID
+    try:
+        encoded_uid = _encode_uid(study_uid)
+    except UnicodeEncodeError:
+        return UtilisationRecord.NOT_USED
+
+    if len(encoded_uid) != UID_SIZE:
+        return UtilisationRecord.NOT_USED
+
+    records = _binary_record()
+    index = bisect.bisect_left(records, encoded_uid)
+    if index == len(records) or records[index] != encoded_uid:
+        return UtilisationRecord.NOT_USED
+
+    return _UTILISATIONS[records.code(index)]
+
+
+def _encode_uid(study_uid: str) -> bytes:
+    return study_uid.encode("ascii").ljust(UID_SIZE, b"\x00")
+
+
+class _BinaryRecord(Sequence[bytes]):
+    """The padded StudyInstanceUIDs of the memory mapped binary record,
+    as a sequence that is able to be binary searched."""
+
+    def __init__(self, mapped: mmap.mmap):
+        self._mmap = mapped
+
+    def __len__(self):
+        return len(self._mmap) // RECORD_SIZE
+
+    def __getitem__(self, index: int) -> bytes:  # type: ignore
+        start = index * RECORD_SIZE
+
+        return self._mmap[start : start + UID_SIZE]
+
+    def code(self, index: int) -> bytes:
+        """The utilisation code of the record at the given index."""
+
+        start = index * RECORD_SIZE + UID_SIZE
+
+        return self._mmap[start : start + 1]
+
+
+@lru_cache(maxsize=None)
+def _binary_record() -> _BinaryRecord:
+    with open(BINARY_RECORD_PATH, "rb") as f:
+        return _BinaryRecord(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ))
 
 
 @lru_cache(maxsize=None)
 def _training_record() -> Tuple[Set[str], Set[str]]:
-    with open(HERE / "training_record.json", encoding="utf8") as f:
+    with open(JSON_RECORD_PATH, encoding="utf8") as f:
         data = json.load(f)
 
     training: Set[str] = set(data["training"])
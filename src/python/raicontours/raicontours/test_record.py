@@ -0,0 +1,107 @@
+# RAi, machine learning solutions in radiotherapy
+# Copyright (C) 2021-2022 Radiotherapy AI Holdings Pty Ltd
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+"""Testing the training record lookups"""
+
+import json
+import pathlib
+
+import pydicom
+import pydicom.uid
+import pytest
+
+import raicontours
+from raicontours import record
+from raicontours.typing import UtilisationRecord
+
+
+def _json_record() -> tuple[list[str], list[str]]:
+    with open(record.JSON_RECORD_PATH, encoding="utf8") as f:
+        data = json.load(f)
+
+    return data["training"], data["validation"]
+
+
+def _dataset(study_uid: str) -> pydicom.Dataset:
+    dataset = pydicom.Dataset()
+    dataset.StudyInstanceUID = study_uid
+
+    return dataset
+
+
+# Invalid UIDs are looked up deliberately
+@pytest.mark.filterwarnings("ignore:Invalid value for VR UI")
+@pytest.mark.filterwarnings("ignore:The value length")
+def test_binary_record_matches_json():
+    """Test that the binary record has been compiled from the current
+    JSON record, by looking up every StudyInstanceUID within it"""
+
+    training, validation = _json_record()
+
+    record_count = record.BINARY_RECORD_PATH.stat().st_size // record.RECORD_SIZE
+    assert record_count == len(set(training) | set(validation))
+
+    for study_uid in training:
+        utilisation = raicontours.dicom_utilisation(_dataset(study_uid))
+        assert utilisation == UtilisationRecord.TRAINING
+
+    for study_uid in validation:
+        utilisation = raicontours.dicom_utilisation(_dataset(study_uid))
+        assert utilisation == UtilisationRecord.VALIDATION
+
+    for study_uid in ("1.2.3", "", "9" * 64, "1" * 65, "1.2.\u00e9"):
+        utilisation = raicontours.dicom_utilisation(_dataset(study_uid))
+        assert utilisation == UtilisationRecord.NOT_USED
+
+
+def test_dicom_utilisation_many(tmp_path: pathlib.Path):
+    """Test that the utilisation of files and datasets matches that of
+    fully read datasets"""
+
+    training, validation = _json_record()
+    study_uids = [min(training), min(validation), "1.2.3"]
+
+    paths: list[pathlib.Path] = []
+    for index, study_uid in enumerate(study_uids):
+        dataset = _dataset(study_uid)
+        dataset.PatientName = "Lewis^Clive Staples"
+        dataset.SeriesInstanceUID = f"1.2.3.{index}"
+        dataset.SOPInstanceUID = f"1.2.3.4.{index}"
+
+        file_meta = pydicom.dataset.FileMetaDataset()
+        file_meta.MediaStorageSOPClassUID = pydicom.uid.CTImageStorage
+        file_meta.MediaStorageSOPInstanceUID = dataset.SOPInstanceUID
+        file_meta.TransferSyntaxUID = pydicom.uid.ExplicitVRLittleEndian
+
+        dataset.file_meta = file_meta
+        dataset.preamble = b"\x00" * 128
+
+        path = tmp_path / f"{index}.dcm"
+        pydicom.dcmwrite(path, dataset)
+        paths.append(path)
+
+    expected = [
+        UtilisationRecord.TRAINING,
+        UtilisationRecord.VALIDATION,
+        UtilisationRecord.NOT_USED,
+    ]
+    assert [
+        raicontours.dicom_utilisation(pydicom.dcmread(path)) for path in paths
+    ] == expected
+
+    datasets = [paths[0], str(paths[1]), pydicom.dcmread(paths[2])]
+    for max_workers in (1, 2):
+        assert raicontours.dicom_utilisation_many(datasets, max_workers) == expected